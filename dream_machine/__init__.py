@@ -2,3 +2,6 @@
 import sys
 assert(sys.version_info.major >= 3)
 assert(sys.version_info.minor >= 6)
+
+
+__version__ = "0"
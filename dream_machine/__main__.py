@@ -15,13 +15,16 @@
 
 
 import sys
+import json
 from .syntax.parser import Parser
 from .syntax.grammar import validate, ValidationError
+from .syntax.cache import cached_validate
 from .syntax.constants import BackendAPI
 from .gndn import build as gndn_backend
 from .d3d12 import build as d3d12_backend
 from .opengl import build as opengl_backend
 from .webgl import build as webgl_backend
+from .opengl.live_user_vars import LiveUserVarLayout
 
 
 CPP_BACKENDS = \
@@ -41,19 +44,36 @@ def run_cpp_backend(env):
         outfile.write(str(program))
     with open("generated.h", "w", encoding="utf-8") as outfile:
         outfile.write(str(header))
+    if env.live_user_vars:
+        with open(f"{env.live_user_vars.path}.json", "w", encoding="utf-8") as outfile:
+            json.dump(LiveUserVarLayout(env).schema(), outfile, indent=4)
     user_sources = ["generated.cpp", "user_code.cpp"]
     backend.build(user_sources, *etc, out_path="generated.exe", debug=True)
 
 
 if __name__ == "__main__":
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("-")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("-")]
+    verbose = "-v" in flags or "--verbose" in flags
+    jobs = 1
+    for flag in flags:
+        if flag.startswith("--jobs="):
+            jobs = int(flag[len("--jobs="):])
     try:
-        src_path = sys.argv[1]
+        src_path = args[0]
     except IndexError:
         print("Missing source file path.")
         exit(1)
-    parser = Parser()
+    parser = Parser(keep_comments=False)
     parser.open(src_path)
-    env = validate(parser)
+    if "--no-cache" in flags:
+        env = validate(parser, jobs=jobs)
+    else:
+        env = cached_validate(parser, verbose=verbose, jobs=jobs)
+
+    if "--prune" in flags:
+        for node in env.prune():
+            print(f'Removed unused {type(node).__name__.lower()} "{node.name}"')
 
     if not env.backend:
         raise ValidationError("No backend specified.")
@@ -17,6 +17,9 @@
 
 
 #include <string>
+#include <cmath>
+#include <algorithm>
+#include <type_traits>
 
 
 inline void HaltAndCatchFire()
@@ -25,6 +28,56 @@ inline void HaltAndCatchFire()
 }
 
 
+// Helpers for arithmetic operators in generated size expressions.  These
+// match how the operators are constant folded when the expression is known.
+namespace Arithmetic
+{
+	inline int DivUpImpl(int Numerator, int Denominator)
+	{
+		int Quotient = Numerator / Denominator;
+		int Remainder = Numerator % Denominator;
+		return (Remainder != 0 && ((Remainder < 0) == (Denominator < 0))) ? Quotient + 1 : Quotient;
+	}
+
+	inline double DivUpImpl(double Numerator, double Denominator)
+	{
+		return std::ceil(Numerator / Denominator);
+	}
+
+	inline int ModImpl(int Numerator, int Denominator)
+	{
+		int Remainder = Numerator % Denominator;
+		return (Remainder != 0 && ((Remainder < 0) != (Denominator < 0))) ? Remainder + Denominator : Remainder;
+	}
+
+	inline double ModImpl(double Numerator, double Denominator)
+	{
+		return Numerator - Denominator * std::floor(Numerator / Denominator);
+	}
+
+	template<typename A, typename B, typename C>
+	inline typename std::common_type<A, B, C>::type Clamp(A Value, B Low, C High)
+	{
+		typedef typename std::common_type<A, B, C>::type T;
+		return std::min(std::max(T(Value), T(Low)), T(High));
+	}
+
+	template<typename A, typename B>
+	inline typename std::common_type<A, B>::type DivUp(A Numerator, B Denominator)
+	{
+		typedef typename std::common_type<A, B>::type T;
+		return DivUpImpl(T(Numerator), T(Denominator));
+	}
+
+	template<typename A, typename B>
+	inline typename std::common_type<A, B>::type Mod(A Numerator, B Denominator)
+	{
+		typedef typename std::common_type<A, B>::type T;
+		return ModImpl(T(Numerator), T(Denominator));
+	}
+}
+
+
 inline std::string DecodeBase64(const char* Encoded)
 {
 	uint16_t Acc = 0;
@@ -24,6 +24,12 @@ extern void UserSetupCallback(SDL_Window* Window);
 extern void UserFrameCallback(unsigned int FrameIndex, double StartTime, double DeltaTime);
 
 
+namespace UserVars
+{
+「user_var_definitions」
+}
+
+
 「globals」
 
 
@@ -78,6 +84,12 @@ void WindowResized()
 }
 
 
+void UpdateUserVars()
+{
+「user_vars_hook」
+}
+
+
 int main()
 {
 	SDL_SetMainReady();
@@ -120,6 +132,7 @@ int main()
 			const double StartTime = (double)StartTimeTicks / 1000.0;
 			const double DeltaTime = (double)DeltaTimeTicks / 1000.0;
 			UserFrameCallback(FrameIndex, StartTime, DeltaTime);
+			UpdateUserVars();
 			DrawFrame(FrameIndex, StartTime, DeltaTime);
 			「present」
 		}
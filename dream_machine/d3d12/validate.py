@@ -19,6 +19,8 @@ from ..syntax.abstract import *
 
 
 def validate(env:Program):
+    if env.live_user_vars:
+        env.live_user_vars.error("The D3D12 backend does not support live user vars yet.")
     for pipeline in env.pipelines.values():
         if not "cs" in pipeline.shaders:
             if not "vs" in pipeline.shaders:
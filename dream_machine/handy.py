@@ -74,3 +74,17 @@ def indent(text: str) -> str:
         else:
             new_lines.append("\t" + line)
     return "\n".join(new_lines)
+
+
+class FrozenDict(dict):
+    """
+    A dict which raises TypeError on any attempt to modify it.
+    """
+    def _frozen(self, *args, **kargs):
+        raise TypeError(f"{type(self).__name__} can't be modified")
+
+    __setitem__ = __delitem__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
@@ -0,0 +1,117 @@
+
+/*
+	Copyright 2020 Aeva Palecek
+
+	Licensed under the Apache License, Version 2.0 (the "License");
+	you may not use this file except in compliance with the License.
+	You may obtain a copy of the License at
+
+		http://www.apache.org/licenses/LICENSE-2.0
+
+	Unless required by applicable law or agreed to in writing, software
+	distributed under the License is distributed on an "AS IS" BASIS,
+	WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+	See the License for the specific language governing permissions and
+	limitations under the License.
+*/
+
+
+#include <iostream>
+#include "live_user_vars.h"
+
+#if _WIN32
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#endif
+
+
+namespace LiveUserVars
+{
+	static unsigned char* Mapped = nullptr;
+	static std::uint32_t MappedSize = 0;
+#if _WIN32
+	static HANDLE File = INVALID_HANDLE_VALUE;
+	static HANDLE Mapping = nullptr;
+#endif
+
+	unsigned char* Open(const char* Path, std::uint32_t Size, std::uint32_t Layout, bool& Fresh)
+	{
+		Close();
+#if _WIN32
+		File = CreateFileA(Path, GENERIC_READ | GENERIC_WRITE, FILE_SHARE_READ | FILE_SHARE_WRITE, nullptr, OPEN_ALWAYS, FILE_ATTRIBUTE_NORMAL, nullptr);
+		if (File == INVALID_HANDLE_VALUE)
+		{
+			std::cout << "Failed to open live user var block " << Path << "!\n";
+			return nullptr;
+		}
+		Mapping = CreateFileMappingA(File, nullptr, PAGE_READWRITE, 0, Size, nullptr);
+		if (Mapping)
+		{
+			Mapped = (unsigned char*)MapViewOfFile(Mapping, FILE_MAP_ALL_ACCESS, 0, 0, Size);
+		}
+#else
+		const int File = open(Path, O_RDWR | O_CREAT, 0644);
+		if (File == -1)
+		{
+			std::cout << "Failed to open live user var block " << Path << "!\n";
+			return nullptr;
+		}
+		if (ftruncate(File, Size) == 0)
+		{
+			void* View = mmap(nullptr, Size, PROT_READ | PROT_WRITE, MAP_SHARED, File, 0);
+			Mapped = View == MAP_FAILED ? nullptr : (unsigned char*)View;
+		}
+		close(File);
+#endif
+		if (!Mapped)
+		{
+			std::cout << "Failed to map live user var block " << Path << "!\n";
+			Close();
+			return nullptr;
+		}
+		MappedSize = Size;
+
+		Header* Block = (Header*)Mapped;
+		Fresh = Block->Magic != Magic || Block->Layout != Layout || Block->Size != Size || (Block->Version & 1) != 0;
+		if (Fresh)
+		{
+			std::memset(Mapped, 0, Size);
+			Block->Magic = Magic;
+			Block->Layout = Layout;
+			Block->Size = Size;
+			// Odd until the caller publishes the initial values.
+			Block->Version = 1;
+		}
+		return Mapped;
+	}
+
+	void Close()
+	{
+#if _WIN32
+		if (Mapped)
+		{
+			UnmapViewOfFile(Mapped);
+		}
+		if (Mapping)
+		{
+			CloseHandle(Mapping);
+			Mapping = nullptr;
+		}
+		if (File != INVALID_HANDLE_VALUE)
+		{
+			CloseHandle(File);
+			File = INVALID_HANDLE_VALUE;
+		}
+#else
+		if (Mapped)
+		{
+			munmap(Mapped, MappedSize);
+		}
+#endif
+		Mapped = nullptr;
+		MappedSize = 0;
+	}
+}
@@ -0,0 +1,75 @@
+
+/*
+	Copyright 2020 Aeva Palecek
+
+	Licensed under the Apache License, Version 2.0 (the "License");
+	you may not use this file except in compliance with the License.
+	You may obtain a copy of the License at
+
+		http://www.apache.org/licenses/LICENSE-2.0
+
+	Unless required by applicable law or agreed to in writing, software
+	distributed under the License is distributed on an "AS IS" BASIS,
+	WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+	See the License for the specific language governing permissions and
+	limitations under the License.
+*/
+
+
+#include <atomic>
+#include <cstdint>
+#include <cstring>
+
+
+// A block of shared memory that user vars are published in, so that external
+// tools can change them while the program runs.  The block starts with this
+// header, and the generated JSON schema lists where each user var is stored.
+// Writers make the version odd before changing any values, and even again
+// afterwards.  The program only reads the values when the version is even
+// and has changed since the last time they were read.
+namespace LiveUserVars
+{
+	const std::uint32_t Magic = 0x56554D44;
+
+	struct Header
+	{
+		std::uint32_t Magic;
+		std::uint32_t Layout;
+		std::uint32_t Size;
+		std::uint32_t Version;
+	};
+
+	// Maps the file at Path into memory.  If the file doesn't already hold a
+	// block with the same layout, it is cleared, and Fresh is set so that the
+	// caller knows to publish the initial values.  Returns nullptr on failure.
+	unsigned char* Open(const char* Path, std::uint32_t Size, std::uint32_t Layout, bool& Fresh);
+
+	void Close();
+
+	inline std::uint32_t LoadVersion(const unsigned char* Block)
+	{
+		const std::uint32_t Version = ((const volatile Header*)Block)->Version;
+		std::atomic_thread_fence(std::memory_order_acquire);
+		return Version;
+	}
+
+	inline void Publish(unsigned char* Block)
+	{
+		std::atomic_thread_fence(std::memory_order_release);
+		((volatile Header*)Block)->Version += 1;
+	}
+
+	template<typename T>
+	inline T Read(const unsigned char* Block, std::uint32_t Offset)
+	{
+		T Value;
+		std::memcpy(&Value, Block + Offset, sizeof(T));
+		return Value;
+	}
+
+	template<typename T>
+	inline void Write(unsigned char* Block, std::uint32_t Offset, T Value)
+	{
+		std::memcpy(Block + Offset, &Value, sizeof(T));
+	}
+}
@@ -18,7 +18,7 @@ from typing import *
 from ..expanders import SyntaxExpander
 from ..handy import *
 from ..syntax.grammar import UserVar, COMMON_VARS
-from ..syntax.arithmetic import UnfoldedExpression
+from ..syntax.arithmetic import UnfoldedExpression, SharedExpressions
 
 
 BINARY_REWRITE = \
@@ -30,46 +30,82 @@ BINARY_REWRITE = \
 }
 
 
+# functions which don't share the arithmetic operator's name
+CALL_REWRITE = \
+{
+    "floor" : "std::floor",
+    "ceil" : "std::ceil",
+    "pow" : "std::pow",
+    "log2" : "std::log2",
+    "clamp" : "Arithmetic::Clamp",
+    "div_up" : "Arithmetic::DivUp",
+    "mod" : "Arithmetic::Mod",
+}
+
+
 class BinaryExpander(SyntaxExpander):
     template = "(「lhs」 「op」 「rhs」)"
 
-    def __init__(self, cmd:str, args:list):
+    def __init__(self, cmd:str, args:list, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         self.op = BINARY_REWRITE[cmd]
         if len(args) == 2:
             print("args:", args)
-            self.lhs = solve_expression(args[0])
-            self.rhs = solve_expression(args[1])
+            self.lhs = solve_expression(args[0], shared)
+            self.rhs = solve_expression(args[1], shared)
         else:
             assert(len(args)) > 2
-            self.lhs = BinaryExpander(cmd, args[:-1])
-            self.rhs = solve_expression(args[-1])
+            self.lhs = BinaryExpander(cmd, args[:-1], shared)
+            self.rhs = solve_expression(args[-1], shared)
 
 
 class CallExpander(SyntaxExpander):
     template = "「cmd」(「args」)"
 
-    def __init__(self, cmd:str, args:list):
+    def __init__(self, cmd:str, args:list, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
-        self.cmd = cmd
-        self.args = ", ".join([str(solve_expression(a)) for a in args])
+        self.cmd = CALL_REWRITE.get(cmd, cmd)
+        self.args = ", ".join([str(solve_expression(a, shared)) for a in args])
 
 
 class ValueExpander(SyntaxExpander):
     template = "「wrapped」"
 
 
-def solve_expression(expr:Any) -> SyntaxExpander:
+def solve_unfolded(expr:UnfoldedExpression, shared:Optional[SharedExpressions] = None) -> SyntaxExpander:
+    if expr.cmd in BINARY_REWRITE:
+        return BinaryExpander(expr.cmd, expr.args, shared)
+    else:
+        return CallExpander(expr.cmd, expr.args, shared)
+
+
+def solve_expression(expr:Any, shared:Optional[SharedExpressions] = None) -> SyntaxExpander:
+    """
+    Returns an expander for the given folded or unfolded expression.  If
+    "shared" is provided, subexpressions which have been assigned to
+    temporaries are replaced with the temporary's name.
+    """
+    if shared is not None:
+        name = shared.name(expr)
+        if name is not None:
+            return ValueExpander(name)
     if type(expr) is str and expr not in COMMON_VARS:
         expr = f'UserVars::{expr}'
     if type(expr) in (int, float, str):
         return ValueExpander(expr)
     else:
-        expr = CAST(UnfoldedExpression, expr)
-        if expr.cmd in BINARY_REWRITE:
-            return BinaryExpander(expr.cmd, expr.args)
-        else:
-            return CallExpander(expr.cmd, expr.args)
+        return solve_unfolded(CAST(UnfoldedExpression, expr), shared)
+
+
+class SharedTemporary(SyntaxExpander):
+    template = "const auto 「name:str」 = 「value」;"
+
+
+def solve_temporaries(shared:SharedExpressions) -> List[SyntaxExpander]:
+    """
+    Returns the definitions for each temporary in "shared", in order.
+    """
+    return [SharedTemporary(name=name, value=solve_unfolded(expr, shared)) for (name, expr) in shared.temporaries]
 
 
 class ExternUserVar(SyntaxExpander):
@@ -79,3 +115,11 @@ class ExternUserVar(SyntaxExpander):
         self.type = user_var.ctype
         self.name = user_var.name
         self.value = solve_expression(user_var.value)
+
+
+class UserVarDeclaration(SyntaxExpander):
+    template = "extern 「type」 「name」;"
+    def __init__(self, user_var:UserVar):
+        SyntaxExpander.__init__(self)
+        self.type = user_var.ctype
+        self.name = user_var.name
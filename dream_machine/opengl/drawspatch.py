@@ -14,8 +14,10 @@
 # limitations under the License.
 
 
+from typing import *
 from ..expanders import SyntaxExpander
 from .shaders import ShaderProgram, ChangeProgram
+from .cpp_expressions import *
 
 
 class ColorClear(SyntaxExpander):
@@ -55,6 +57,39 @@ class Dispatch(SyntaxExpander):
     template = "glDispatchCompute(「x」, 「y」, 「z」);"
 
 
+class DispatchGroupHandles(SyntaxExpander):
+    template = "GLuint DispatchGroups[「count」][3] = { 0 };"
+
+
+class CachedDispatch(SyntaxExpander):
+    template = "glDispatchCompute(DispatchGroups[「index:int」][0], DispatchGroups[「index:int」][1], DispatchGroups[「index:int」][2]);"
+
+
+class DispatchGroupCount(SyntaxExpander):
+    template = "DispatchGroups[「index:int」][「axis:int」] = (GLuint)(「value」);"
+
+
+class ResizeDispatchGroups(SyntaxExpander):
+    """
+    Recomputes the cached group counts for dispatches which depend on the
+    screen size or user variables.
+    """
+    template = """
+{
+「wrapped」
+}
+""".strip()
+    indent = ("wrapped",)
+
+    def __init__(self, groups:List[List[Any]]):
+        SyntaxExpander.__init__(self)
+        shared = SharedExpressions([count for counts in groups for count in counts], "DispatchExpr")
+        self.wrapped:List[SyntaxExpander] = solve_temporaries(shared)
+        for index, counts in enumerate(groups):
+            for axis, count in enumerate(counts):
+                self.wrapped.append(DispatchGroupCount(index=index, axis=axis, value=solve_expression(count, shared)))
+
+
 class Drawspatch(SyntaxExpander):
     template = """
 {
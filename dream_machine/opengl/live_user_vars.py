@@ -0,0 +1,180 @@
+﻿
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+
+import json
+import zlib
+from typing import *
+from ..handy import indent
+from ..expanders import SyntaxExpander
+from ..syntax.grammar import Program, UserVar
+
+
+# must match LiveUserVars::Magic in live_user_vars.h
+LIVE_USER_VAR_MAGIC = 0x56554D44
+
+
+# byte offsets of the fields in LiveUserVars::Header
+LIVE_USER_VAR_HEADER = \
+{
+    "magic" : 0,
+    "layout" : 4,
+    "size" : 8,
+    "version" : 12,
+}
+
+
+# ctype -> (C++ storage type, schema type, size in bytes)
+LIVE_USER_VAR_TYPES = \
+{
+    "float" : ("float", "float32", 4),
+    "double" : ("double", "float64", 8),
+    "int" : ("std::int32_t", "int32", 4),
+    "bool" : ("std::int32_t", "bool32", 4),
+}
+
+
+class LiveUserVarLayout:
+    """
+    Where each user var is stored in the live user var block.  Vars are laid
+    out in declaration order after the header, aligned to their size.  The
+    layout number is a checksum of the layout, which lets the runtime and
+    external tools tell whether a block was written by a different build.
+    """
+    def __init__(self, env:Program):
+        self.path = env.live_user_vars.path
+        self.fields:List[Tuple[UserVar, int]] = []
+        offset = len(LIVE_USER_VAR_HEADER) * 4
+        for user_var in env.user_vars.values():
+            size = LIVE_USER_VAR_TYPES[user_var.ctype][2]
+            offset = -(-offset // size) * size
+            self.fields.append((user_var, offset))
+            offset += size
+        self.size = -(-offset // 8) * 8
+        described = [(v.name, LIVE_USER_VAR_TYPES[v.ctype][1], offset) for (v, offset) in self.fields]
+        self.layout = zlib.crc32(json.dumps([self.size, described]).encode("utf-8"))
+
+    def schema(self) -> Dict[str, Any]:
+        """
+        Returns the JSON schema which external tools use to find the user vars
+        in the block.  Writers must make the version odd before changing any
+        values, and even again afterwards.
+        """
+        user_vars:Dict[str, Any] = {}
+        for user_var, offset in self.fields:
+            field:Dict[str, Any] = {"type" : LIVE_USER_VAR_TYPES[user_var.ctype][1], "offset" : offset}
+            if type(user_var.value) in (int, float):
+                field["default"] = user_var.value
+            if user_var.specialized:
+                field["values"] = list(user_var.variants)
+            user_vars[user_var.name] = field
+        return \
+        {
+            "magic" : LIVE_USER_VAR_MAGIC,
+            "layout" : self.layout,
+            "size" : self.size,
+            "header" : LIVE_USER_VAR_HEADER,
+            "user_vars" : user_vars,
+        }
+
+
+class LiveUserVarHandles(SyntaxExpander):
+    template = """
+namespace LiveUserVars
+{
+	unsigned char* Block = nullptr;
+	std::uint32_t Version = 0;
+}
+""".strip()
+
+
+class WriteLiveUserVar(SyntaxExpander):
+    template = "LiveUserVars::Write<「storage:str」>(LiveUserVars::Block, 「offset:int」, UserVars::「name:str」);"
+
+
+class ReadLiveUserVar(SyntaxExpander):
+    template = "const 「storage:str」 Live「name:str」 = LiveUserVars::Read<「storage:str」>(LiveUserVars::Block, 「offset:int」);"
+
+
+class AssignLiveUserVar(SyntaxExpander):
+    template = "UserVars::「name:str」 = 「value:str」;"
+
+
+class OpenLiveUserVars(SyntaxExpander):
+    """
+    Maps the live user var block, and publishes the user vars' initial values
+    unless the block already holds values from an earlier run of this build.
+    """
+    template = """
+{
+	bool Fresh = false;
+	LiveUserVars::Block = LiveUserVars::Open(「path:str」, 「size:int」, 「layout:int」u, Fresh);
+	if (LiveUserVars::Block && Fresh)
+	{
+「publish」
+		LiveUserVars::Publish(LiveUserVars::Block);
+		LiveUserVars::Version = LiveUserVars::LoadVersion(LiveUserVars::Block);
+	}
+}
+""".strip()
+    indent = ("publish",)
+
+    def __init__(self, layout:LiveUserVarLayout):
+        SyntaxExpander.__init__(self)
+        self.path = json.dumps(layout.path)
+        self.size = layout.size
+        self.layout = layout.layout
+        writes = [WriteLiveUserVar(storage=LIVE_USER_VAR_TYPES[v.ctype][0], offset=offset, name=v.name) for (v, offset) in layout.fields]
+        # nested one level deeper than the indent applies
+        self.publish = indent("\n".join(map(str, writes)))
+
+
+class PollLiveUserVars(SyntaxExpander):
+    """
+    Checks the live user var block's version once per frame, and only reads
+    the user vars when it has changed.  Values are copied out first, and only
+    applied if no writer started changing them in the meantime.
+    """
+    template = """
+if (LiveUserVars::Block)
+{
+	const std::uint32_t BlockVersion = LiveUserVars::LoadVersion(LiveUserVars::Block);
+	if (BlockVersion != LiveUserVars::Version && (BlockVersion & 1) == 0)
+	{
+「reads」
+		if (LiveUserVars::LoadVersion(LiveUserVars::Block) == BlockVersion)
+		{
+			LiveUserVars::Version = BlockVersion;
+「assigns」
+		}
+	}
+}
+""".strip()
+    indent = ("reads", "assigns")
+
+    def __init__(self, layout:LiveUserVarLayout):
+        SyntaxExpander.__init__(self)
+        reads:List[SyntaxExpander] = []
+        assigns:List[SyntaxExpander] = []
+        for user_var, offset in layout.fields:
+            storage = LIVE_USER_VAR_TYPES[user_var.ctype][0]
+            reads.append(ReadLiveUserVar(storage=storage, name=user_var.name, offset=offset))
+            value = f"Live{user_var.name} != 0" if user_var.ctype == "bool" else f"Live{user_var.name}"
+            assigns.append(AssignLiveUserVar(name=user_var.name, value=value))
+        # nested one and two levels deeper than the indent applies
+        self.reads = indent("\n".join(map(str, reads)))
+        self.assigns = indent(indent("\n".join(map(str, assigns))))
@@ -15,7 +15,10 @@
 
 
 from .textures import *
-from ..syntax.grammar import Pipeline, PipelineOutput
+from .drawspatch import DispatchGroupCount
+from .specialization import SelectVariant
+from ..syntax.grammar import Pipeline, PipelineOutput, UserVar, COMMON_VARS
+from ..syntax.arithmetic import expression_vars
 
 
 class FrameBufferHandles(SyntaxExpander):
@@ -47,12 +50,12 @@ class FrameBufferAttachment(SyntaxExpander):
 
 class DepthAttachment(FrameBufferAttachment):
     def __init__(self, pipeline:Pipeline, mip:int = 0):
-        FrameBufferAttachment.__init__(self, pipeline, CAST(PipelineOutput, pipeline.depth_target), "GL_DEPTH_ATTACHMENT", mip)
+        FrameBufferAttachment.__init__(self, pipeline, CAST(PipelineOutput, pipeline.layout.depth_target), "GL_DEPTH_ATTACHMENT", mip)
 
 
 class ColorAttachment(FrameBufferAttachment):
     def __init__(self, pipeline:Pipeline, output:PipelineOutput, mip:int = 0):
-        assert(output in pipeline.color_targets)
+        assert(output in pipeline.layout.color_attachments)
         FrameBufferAttachment.__init__(self, pipeline, output, f"GL_COLOR_ATTACHMENT{str(output.color_index)}", mip)
 
 
@@ -73,9 +76,9 @@ class CreateFrameBuffer(SyntaxExpander):
         SyntaxExpander.__init__(self)
         self.handle = pipeline.index
         self.expanders:List[SyntaxExpander] = []
-        for color_target in pipeline.color_targets:
+        for color_target in pipeline.layout.color_targets:
             self.expanders.append(ColorAttachment(pipeline, color_target))
-        if pipeline.depth_target:
+        if pipeline.layout.depth_target:
             self.expanders.append(DepthAttachment(pipeline))
         self.expanders.append(FramebufferLabel(handle=pipeline.index, name=pipeline.name))
 
@@ -108,6 +111,10 @@ class SetupFrameBuffers(SyntaxExpander):
 
 
 class ResizeFrameBuffers(SyntaxExpander):
+    """
+    Reallocates the textures with dimensions that depend on the screen size,
+    and rebuilds the framebuffers which use them.
+    """
     template = """
 「wrapped」
 """.strip()
@@ -116,11 +123,133 @@ class ResizeFrameBuffers(SyntaxExpander):
         SyntaxExpander.__init__(self)
         self.wrapped:List[SyntaxExpander] = []
 
-        for texture in env.all_target_textures:
-            self.wrapped.append(ResizeTexture(texture))
+        textures, pipelines = env.variables.affected(COMMON_VARS)
+        shared = shared_dimensions(textures)
+        self.wrapped += solve_temporaries(shared)
+        for texture in textures:
+            self.wrapped.append(ResizeTexture(texture, shared))
             if texture.clear:
                 self.wrapped.append(ClearTexture(texture))
 
-        for pipeline in env.pipelines.values():
-            if not pipeline.uses_backbuffer:
-                self.wrapped.append(RebuildFrameBuffer(pipeline))
+        for pipeline in pipelines:
+            self.wrapped.append(RebuildFrameBuffer(pipeline))
+
+
+class UserVarCache(SyntaxExpander):
+    template = """
+namespace UserVarCache
+{
+「cached」
+}
+""".strip()
+    indent = ("cached",)
+
+    def __init__(self, user_vars:List[UserVar]):
+        SyntaxExpander.__init__(self)
+        self.cached = [f"{v.ctype} {v.name} = UserVars::{v.name};" for v in user_vars]
+
+
+class UserVarDirtyFlag(SyntaxExpander):
+    template = "const bool 「name:str」IsDirty = UserVars::「name:str」 != UserVarCache::「name:str」;"
+
+
+class UpdateUserVarCache(SyntaxExpander):
+    template = "UserVarCache::「name:str」 = UserVars::「name:str」;"
+
+
+def dirty_condition(names:Iterable[str]) -> str:
+    return " || ".join([f"{name}IsDirty" for name in names])
+
+
+class WhenDirty(SyntaxExpander):
+    template = """
+if (「condition:str」)
+{
+「wrapped」
+}
+""".strip()
+    indent = ("wrapped",)
+
+    def __init__(self, names:Iterable[str], wrapped:List[SyntaxExpander]):
+        SyntaxExpander.__init__(self)
+        self.condition = dirty_condition(names)
+        self.wrapped = wrapped
+
+
+def tracked_user_vars(env:Program, groups:List[List[Any]], specialized:List[UserVar] = []) -> List[str]:
+    """
+    Returns the names of the user vars which texture dimensions or the cached
+    dispatch group counts depend on, along with the specialized user vars
+    which pick shader program variants.
+    """
+    names = set(env.variables.user_vars) | {v.name for v in specialized}
+    for counts in groups:
+        for count in counts:
+            names |= expression_vars(count)
+    return sorted(names.difference(COMMON_VARS))
+
+
+class UpdateUserVars(SyntaxExpander):
+    """
+    Compares each tracked user var against the value it had when the
+    resources which depend on it were last allocated, and only reallocates
+    the textures, framebuffers, and dispatch group counts that use the vars
+    which have changed.  Specialized user vars switch the program variants
+    that use them.
+    """
+    template = """
+「flags」
+if (「condition:str」)
+{
+「wrapped」
+}
+""".strip()
+    indent = ("wrapped",)
+
+    def __init__(self, env:Program, groups:List[List[Any]], specialized:List[UserVar] = []):
+        SyntaxExpander.__init__(self)
+        names = tracked_user_vars(env, groups, specialized)
+        self.flags:List[SyntaxExpander] = [UserVarDirtyFlag(name=name) for name in names]
+        self.condition = dirty_condition(names)
+
+        dirty = lambda uses: [name for name in names if name in uses]
+        textures, pipelines = env.variables.affected(names)
+        # (index, counts, tracked vars used) for each cached dispatch
+        dispatches:List[Tuple[int, List[Any], List[str]]] = []
+        for index, counts in enumerate(groups):
+            uses = dirty(set().union(*map(expression_vars, counts)))
+            if uses:
+                dispatches.append((index, counts, uses))
+        shared = SharedExpressions([d.value for t in textures for d in t.dimensions.values()] + [c for d in dispatches for c in d[1]])
+        self.wrapped:List[SyntaxExpander] = solve_temporaries(shared)
+
+        for texture in textures:
+            resize:List[SyntaxExpander] = [ResizeTexture(texture, shared)]
+            if texture.clear:
+                resize.append(ClearTexture(texture))
+            self.wrapped += self.when_dirty(dirty(env.variables.texture_vars[texture]), resize)
+
+        for pipeline in pipelines:
+            self.wrapped += self.when_dirty(dirty(env.variables.pipeline_vars[pipeline]), [RebuildFrameBuffer(pipeline)])
+
+        for index, counts, uses in dispatches:
+            recount:List[SyntaxExpander] = \
+            [
+                DispatchGroupCount(index=index, axis=axis, value=solve_expression(count, shared))
+                for (axis, count) in enumerate(counts)
+            ]
+            self.wrapped += self.when_dirty(uses, recount)
+
+        for user_var in specialized:
+            self.wrapped += self.when_dirty([user_var.name], [SelectVariant(user_var)])
+
+        self.wrapped += [UpdateUserVarCache(name=name) for name in names]
+
+    def when_dirty(self, names:List[str], wrapped:List[SyntaxExpander]) -> List[SyntaxExpander]:
+        """
+        Guards the wrapped expanders with a dirty check, unless it is the same
+        as the check which is already around them.
+        """
+        if dirty_condition(names) == self.condition:
+            return wrapped
+        return [WhenDirty(names, wrapped)]
@@ -15,6 +15,7 @@
 
 
 import os
+import re
 from base64 import b64encode
 from hashlib import md5
 from ..handy import *
@@ -63,6 +64,27 @@ class ChangeProgram(SyntaxExpander):
     template = "glUseProgram(ShaderPrograms[「index」]);"
 
 
+GLSL_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+LOCAL_SIZE = re.compile(r'\blocal_size_([xyz])\s*=\s*([^\s,)]+)')
+
+
+def compute_local_size(path:str) -> Optional[Tuple[int, int, int]]:
+    """
+    Reads the work group size from the layout qualifiers in a compute shader's
+    source.  Axes which aren't specified are 1.  Returns None if any of them
+    isn't a literal number, as then the size can't be known until the shader
+    is compiled.
+    """
+    source = GLSL_COMMENT.sub("", external(path))
+    size = {"x" : 1, "y" : 1, "z" : 1}
+    for axis, value in LOCAL_SIZE.findall(source):
+        try:
+            size[axis] = int(value.rstrip("uU"), 0)
+        except ValueError:
+            return None
+    return (size["x"], size["y"], size["z"])
+
+
 class ShaderStage:
     """
     Immutable data corresponding roughly to the parameters for the OpenGL API
@@ -15,6 +15,7 @@
 
 
 from copy import copy
+from weakref import WeakKeyDictionary
 from ..handy import *
 from ..syntax.grammar import *
 from ..expanders import *
@@ -30,37 +31,88 @@ from .glsl_types import *
 from .glsl_interfaces import *
 from .cpp_interfaces import *
 from .cpp_expressions import *
+from .specialization import *
+from .live_user_vars import *
 
 
-def solve_struct(struct:Struct, env:Program) -> StructType:
+def sort_structs(env:Program) -> List[Struct]:
     """
-    Attempt to solve a struct's layout.  When the struct references other
-    structs, this will simply recurse.  If the maximum recursion depth is
-    reached, then throw a validation error.
+    Returns the program's structs ordered so that every struct comes after the
+    structs its members use.  Circular references between structs raise a
+    validation error naming the structs involved.
     """
-    members = {}
-    for member in struct.members:
-        if member.type in glsl_builtins:
-            members[member.name] = glsl_builtins[member.type]
-        else:
-            assert(member.type in env.structs)
-            try:
-                members[member.name] = solve_struct(env.structs[member.type], env)
-            except RecursionError:
-                struct.error(f'Circular reference w/ other structs via member "{member.name}".')
-        if member.array is not None:
-            number = CAST(TokenNumber, member.array).value
-            members[member.name] = ArrayType(members[member.name], number)
+    order:List[Struct] = []
+    # struct name -> True once sorted, or False while its members are visited
+    sorted_names:Dict[str, bool] = {}
+    for root in env.structs.values():
+        if root.name in sorted_names:
+            continue
+        sorted_names[root.name] = False
+        stack = [(root, iter(root.members))]
+        while stack:
+            struct, members = stack[-1]
+            for member in members:
+                if member.type in glsl_builtins:
+                    continue
+                nested = CAST(Struct, env.lookup(member.type).struct)
+                state = sorted_names.get(nested.name)
+                if state is None:
+                    sorted_names[nested.name] = False
+                    stack.append((nested, iter(nested.members)))
+                    break
+                elif state is False:
+                    names = [s.name for (s, ignore) in stack]
+                    cycle = " -> ".join(names[names.index(nested.name):] + [nested.name])
+                    struct.error(f'Circular reference w/ other structs via member "{member.name}": {cycle}')
+            else:
+                stack.pop()
+                sorted_names[struct.name] = True
+                order.append(struct)
+    return order
+
+
+# program -> struct name -> solved layout
+SOLVED_STRUCTS:MutableMapping[Program, Dict[str, StructType]] = WeakKeyDictionary()
+
+
+def solve_structs(env:Program) -> Dict[str, StructType]:
+    """
+    Solve the layout of every struct in the program, in declaration order.
+    Each struct is solved once, after the structs it uses, and the layouts are
+    kept for as long as the program is so that every backend can share them.
+    """
+    solved = SOLVED_STRUCTS.get(env)
+    if solved is None:
+        solved = {}
+        for struct in sort_structs(env):
+            members:Dict[str, GlslType] = {}
+            for member in struct.members:
+                if member.type in glsl_builtins:
+                    members[member.name] = glsl_builtins[member.type]
+                else:
+                    members[member.name] = solved[member.type]
+                if member.array is not None:
+                    number = CAST(TokenNumber, member.array).value
+                    members[member.name] = ArrayType(members[member.name], number)
+            solved[struct.name] = StructType(struct.name, **members)
+        SOLVED_STRUCTS[env] = solved
+    return {name : solved[name] for name in env.structs}
 
-    return StructType(struct.name, **members)
+
+def solve_struct(struct:Struct, env:Program) -> StructType:
+    """
+    Returns the solved layout of a single struct.
+    """
+    return solve_structs(env)[struct.name]
 
 
-def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[ShaderHandles, List[SyntaxExpander]]:
+def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[ShaderHandles, List[SyntaxExpander], ProgramVariants]:
     """
     This function returns a ShaderHandles expander (which should go in the
-    generated program's global scope), and a list of CompileShader and
+    generated program's global scope), a list of CompileShader and
     LinkShaders expanders (which produce code that should be called after the
-    OpenGL context is initialized, but before the shaders are to be used).
+    OpenGL context is initialized, but before the shaders are to be used),
+    and the program variants which each pipeline may switch between.
     """
 
     def solve_shader_compilation(shaders: List[ShaderStage]):
@@ -74,49 +126,75 @@ def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[Sha
             links.append(LinkShaders(program.name, index, shader_handles))
         return links
 
-    def solve_shader_stage(pipeline:Pipeline, stage:str) -> ShaderStage:
+    def solve_shader_stage(pipeline:Pipeline, stage:str, defines:List[SyntaxExpander]) -> ShaderStage:
         shader = pipeline.shaders[stage]
         stage = {
             "vs" : "vertex",
             "fs" : "fragment",
             "cs" : "compute",
         }[stage]
+        layout = pipeline.layout
         structs:List[SyntaxExpander] = [GlslStruct(solved_structs[use.struct]) for use in pipeline.structs]
-        uniforms:List[SyntaxExpander] = [UniformInterface(solved_structs[u.struct], u) for u in pipeline.uniforms]
-        textures:List[SyntaxExpander] = [TextureInterface(t) for t in pipeline.textures]
-        images:List[SyntaxExpander] = [ImageInterface(s) for s in pipeline.sideputs]
+        uniforms:List[SyntaxExpander] = [UniformInterface(solved_structs[u.struct], u) for u in layout.uniforms]
+        textures:List[SyntaxExpander] = [TextureInterface(t) for t in layout.textures]
+        images:List[SyntaxExpander] = [ImageInterface(s) for s in layout.images]
         targets:List[SyntaxExpander] = []
         if stage == "fragment":
             if pipeline.uses_backbuffer:
                 targets = [TargetInterface(None)]
             else:
-                targets = [TargetInterface(c) for c in pipeline.color_targets]
-        return ShaderStage(stage, shader.path, structs + uniforms + textures + images + targets)
+                targets = [TargetInterface(c) for c in layout.color_targets]
+        return ShaderStage(stage, shader.path, defines + structs + uniforms + textures + images + targets)
+
+    def solve_pipeline_stages(pipeline:Pipeline, defines:Dict[str, List[SyntaxExpander]]) -> List[ShaderStage]:
+        return [solve_shader_stage(pipeline, stage, defines[stage]) for stage in pipeline.shaders]
 
+    variants = ProgramVariants(env, solve_pipeline_stages)
     shaders:List[ShaderStage] = []
     programs:List[ShaderProgram] = []
-    for pipeline in env.pipelines.values():
-        stages:List[ShaderStage] = []
-        for stage in pipeline.shaders:
-            stages.append(solve_shader_stage(pipeline, stage))
-        programs.append(ShaderProgram(pipeline.name, stages))
+    for pipeline, label, stages in variants.programs:
+        programs.append(ShaderProgram(label, stages))
         shaders += stages
 
     shaders = dedupe(shaders)
     compiles: List[SyntaxExpander] = solve_shader_compilation(shaders)
     links: List[SyntaxExpander] = solve_shader_linking(shaders, programs)
-    return ShaderHandles(shader_count = len(shaders), program_count=len(programs)), compiles + links
+    return ShaderHandles(shader_count = len(shaders), program_count=len(programs)), compiles + links, variants
 
 
-def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], Union[SyntaxExpander, str]]:
+def solve_dispatch_groups(env:Program) -> Dict[RendererDispatch, List[ExpressionTree]]:
     """
+    Returns the group counts along each axis for every dispatch in the
+    program's renderers.
+    """
+    groups:Dict[RendererDispatch, List[ExpressionTree]] = {}
+    for renderer in env.renderers:
+        for event in renderer.children:
+            if type(event) is RendererDispatch:
+                event = cast(RendererDispatch, event)
+                local_size:Optional[Tuple[int, int, int]] = (1, 1, 1)
+                if event.texture_name is not None:
+                    path = event.pipeline.shaders["cs"].path
+                    local_size = compute_local_size(path)
+                    if local_size is None:
+                        event.error(f'Can\'t dispatch over texture "{event.texture_name}", because the local size in "{path}" isn\'t a constant.')
+                groups[event] = event.group_counts(cast(Tuple[int, int, int], local_size))
+    return groups
+
+
+def solve_renderers(env:Program, groups:Dict[RendererDispatch, List[ExpressionTree]], cached:List[RendererDispatch], variants:ProgramVariants) -> Tuple[List[SyntaxExpander], Union[SyntaxExpander, str]]:
+    """
+    Dispatches listed in "cached" read their group counts from the
+    DispatchGroups array, which is filled out when the window is resized.
+    The rest have constant group counts, which are inlined.  Pipelines with
+    specialized shaders look up which of their program variants to use.
     """
 
     def solve_draw(event:RendererDraw) -> SyntaxExpander:
         pipeline = event.pipeline
         setup:List[SyntaxExpander] = \
         [
-            ChangeProgram(pipeline.index),
+            ChangeProgram(variants.program_index(pipeline, "SpecializedVars::")),
         ]
 
         if pipeline.uses_backbuffer:
@@ -124,10 +202,11 @@ def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], Union[SyntaxExpa
         else:
             setup.append(BindFrameBuffer(pipeline))
 
-        setup += [BindUniformBuffer(u) for u in pipeline.uniforms]
-        setup += [BindTexture(t) for t in pipeline.textures]
-        setup += [BindSampler(t) for t in pipeline.textures]
-        setup += [BindTextureImage(s) for s in pipeline.sideputs]
+        layout = pipeline.layout
+        setup += [BindUniformBuffer(u) for u in layout.uniforms]
+        setup += [BindTexture(t) for t in layout.textures]
+        setup += [BindSampler(t) for t in layout.textures]
+        setup += [BindTextureImage(s) for s in layout.images]
         setup += \
         [
             Capability(flag.flag, flag.value())
@@ -142,12 +221,13 @@ def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], Union[SyntaxExpa
         pipeline = event.pipeline
         setup:List[SyntaxExpander] = \
         [
-            ChangeProgram(pipeline.index),
+            ChangeProgram(variants.program_index(pipeline, "SpecializedVars::")),
         ]
-        setup += [BindUniformBuffer(u) for u in pipeline.uniforms]
-        setup += [BindTexture(t) for t in pipeline.textures]
-        setup += [BindSampler(t) for t in pipeline.textures]
-        setup += [BindTextureImage(s) for s in pipeline.sideputs]
+        layout = pipeline.layout
+        setup += [BindUniformBuffer(u) for u in layout.uniforms]
+        setup += [BindTexture(t) for t in layout.textures]
+        setup += [BindSampler(t) for t in layout.textures]
+        setup += [BindTextureImage(s) for s in layout.images]
         setup += \
         [
             Capability(flag.flag, flag.value())
@@ -156,7 +236,7 @@ def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], Union[SyntaxExpa
         return Drawspatch(
             name = pipeline.name,
             setup = setup,
-            draw = Dispatch(**dict(zip("xyz", event.size))))
+            draw = CachedDispatch(cached.index(event)) if event in cached else Dispatch(**dict(zip("xyz", groups[event]))))
 
     def solve_renderer(renderer:Renderer) -> SyntaxExpander:
         calls:List[SyntaxExpander] = [
@@ -196,10 +276,11 @@ def solve(env:Program) -> SyntaxExpander:
     """
 
     # structs
-    solved_structs:Dict[str,StructType] = {k:solve_struct(v, env) for (k,v) in env.structs.items()}
+    solved_structs:Dict[str,StructType] = solve_structs(env)
 
     # expanders for shaders
-    shader_handles, build_shaders = solve_shaders(env, solved_structs)
+    shader_handles, build_shaders, variants = solve_shaders(env, solved_structs)
+    specialized = variants.specialized
 
     # expanders for struct definitions
     structs:List[SyntaxExpander] = []
@@ -223,6 +304,33 @@ def solve(env:Program) -> SyntaxExpander:
     if env.buffers:
         globals.append(BufferHandles(len(env.buffers)))
 
+    # program variants for the specialized user vars' current values
+    if specialized:
+        globals.append(ProgramVariantTable(variants))
+        globals.append(SpecializedVarIndices(specialized))
+
+    # dispatches with group counts that can only be known at runtime
+    groups = solve_dispatch_groups(env)
+    cached:List[RendererDispatch] = \
+    [
+        event for (event, counts) in groups.items()
+        if [count for count in counts if type(count) not in (int, float)]
+    ]
+    if cached:
+        globals.append(DispatchGroupHandles(len(cached)))
+    cached_groups = [groups[event] for event in cached]
+
+    # user vars which external tools may change while the program runs
+    live_layout:Optional[LiveUserVarLayout] = None
+    if env.live_user_vars:
+        live_layout = LiveUserVarLayout(env)
+        globals.append(LiveUserVarHandles())
+
+    # user vars which resources need to be reallocated for when they change
+    tracked = tracked_user_vars(env, cached_groups, specialized)
+    if tracked:
+        globals.append(UserVarCache([env.user_vars[name] for name in tracked]))
+
     # expanders for buffer uploaders
     upload_actions:List[SyntaxExpander] = [BufferUploadAction(s) for s in solved_structs.values()]
     upload_decls:List[SyntaxExpander] = [BufferUploadDecl(b, solved_structs) for b in env.buffers.values()]
@@ -230,6 +338,7 @@ def solve(env:Program) -> SyntaxExpander:
 
     # user-defined variables
     user_vars:List[SyntaxExpander] = [ExternUserVar(v) for v in env.user_vars.values()]
+    user_var_decls:List[SyntaxExpander] = [UserVarDeclaration(v) for v in env.user_vars.values()]
 
     # expanders for generated code which is called after GL is initialized before rendering starts
     setup:List[SyntaxExpander] = \
@@ -250,13 +359,25 @@ def solve(env:Program) -> SyntaxExpander:
     if env.buffers:
         setup.append(SetupBuffers(env, solved_structs))
 
+    if live_layout:
+        setup.append(OpenLiveUserVars(live_layout))
+
     # expanders for the window resized event
     reallocate:List[SyntaxExpander] = []
     if env.pipelines:
         reallocate.append(ResizeFrameBuffers(env))
+    if cached:
+        reallocate.append(ResizeDispatchGroups(cached_groups))
+
+    # expanders for when user vars are changed at run time
+    update_user_vars:List[SyntaxExpander] = []
+    if live_layout:
+        update_user_vars.append(PollLiveUserVars(live_layout))
+    if tracked:
+        update_user_vars.append(UpdateUserVars(env, cached_groups, specialized))
 
     # expanders defining the available renderers
-    renderers, switch = solve_renderers(env)
+    renderers, switch = solve_renderers(env, groups, cached, variants)
 
     # emit the generated program
     program = GeneratedMain()
@@ -270,14 +391,20 @@ def solve(env:Program) -> SyntaxExpander:
     program.upload_type_handlers = upload_actions
     program.initial_setup_hook = setup
     program.resize_hook = reallocate
+    program.user_vars_hook = update_user_vars
     program.renderers = renderers
     program.draw_frame_hook = switch
+    if live_layout:
+        program.teardown = "LiveUserVars::Close();"
 
     dependencies:List[str] = ["opengl_util"]
     if len([t for t in env.textures.values() if t.src]):
         dependencies.append("images")
+    if live_layout:
+        dependencies.append("live_user_vars")
     header = GeneratedHeader(dependencies)
     header.struct_declarations = structs
+    header.user_var_declarations = user_var_decls
     header.uploader_declarations = upload_decls
 
     extensions = \
@@ -0,0 +1,224 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import re
+import itertools
+from hashlib import sha256
+from typing import *
+from ..expanders import SyntaxExpander, external
+from ..syntax.grammar import Pipeline, Program, UserVar
+from .shaders import GLSL_COMMENT
+
+
+Combination = Tuple[Union[int, float], ...]
+
+
+class ShaderDefine(SyntaxExpander):
+    template = "#define 「name:str」 「value:str」"
+
+
+def define_value(user_var:UserVar, value:Union[int, float]) -> str:
+    """
+    Returns the GLSL literal for one of a specialized user var's values.
+    """
+    if user_var.ctype == "bool":
+        return "true" if value else "false"
+    elif user_var.ctype in ("float", "double"):
+        return repr(float(value))
+    else:
+        return str(int(value))
+
+
+class PipelineVariants:
+    """
+    Finds the specialized user vars which a pipeline's shaders use, and every
+    combination of their values that the pipeline needs to be built with.
+    Combinations are ordered so that the variant for a given set of values is
+    found by adding up each var's value index times its stride.
+    """
+    def __init__(self, env:Program, pipeline:Pipeline):
+        self.pipeline = pipeline
+        sources = {stage : GLSL_COMMENT.sub("", external(shader.path)) for (stage, shader) in pipeline.shaders.items()}
+        uses = lambda user_var, source: re.search(rf'\b{user_var.name}\b', source) is not None
+        specialized = [user_var for user_var in env.user_vars.values() if user_var.specialized]
+        # stage -> specialized user vars which that stage's shader uses
+        self.stage_vars:Dict[str, List[UserVar]] = \
+        {
+            stage : [user_var for user_var in specialized if uses(user_var, source)]
+            for (stage, source) in sources.items()
+        }
+        self.user_vars:List[UserVar] = [v for v in specialized if [s for s in self.stage_vars.values() if v in s]]
+        self.combinations:List[Combination] = list(itertools.product(*[v.variants for v in self.user_vars]))
+        self.strides:List[int] = []
+        stride = 1
+        for user_var in reversed(self.user_vars):
+            self.strides.insert(0, stride)
+            stride *= len(user_var.variants)
+
+    def defines(self, combination:Combination) -> Dict[str, List[SyntaxExpander]]:
+        """
+        Returns the defines for each stage's shader, which only include the
+        vars that the shader uses so that the other stages can be shared.
+        """
+        values = dict(zip([v.name for v in self.user_vars], combination))
+        return \
+        {
+            stage : [ShaderDefine(name=v.name, value=define_value(v, values[v.name])) for v in user_vars]
+            for (stage, user_vars) in self.stage_vars.items()
+        }
+
+    def label(self, combination:Combination) -> str:
+        if not self.user_vars:
+            return self.pipeline.name
+        values = ", ".join([f"{v.name}={value}" for (v, value) in zip(self.user_vars, combination)])
+        return f"{self.pipeline.name} ({values})"
+
+    def selector(self, prefix:str) -> str:
+        """
+        Returns an expression for the index of the current variant, given the
+        prefix used to access each var's current value index.
+        """
+        return " + ".join([f"{prefix}{v.name} * {stride}" for (v, stride) in zip(self.user_vars, self.strides)])
+
+
+def content_hash(encoded_stages:Iterable[str]) -> str:
+    """
+    Hash of a program's shader stages, so that variants which turn out to be
+    identical are only compiled and linked once.
+    """
+    digest = sha256()
+    for encoded in sorted(encoded_stages):
+        digest.update(encoded.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def specialized_user_vars(variants:Iterable[PipelineVariants]) -> List[UserVar]:
+    """
+    Returns the specialized user vars which any of the pipelines use.
+    """
+    found:Dict[str, UserVar] = {}
+    for pipeline_variants in variants:
+        for user_var in pipeline_variants.user_vars:
+            found[user_var.name] = user_var
+    return [found[name] for name in sorted(found)]
+
+
+class ProgramVariants:
+    """
+    Builds every variant of every pipeline's shaders, and assigns each of them
+    a linked program.  Variants are cached by the content hash of their shader
+    stages, so identical variants share a program.  "build" is the backend's
+    function for creating a pipeline's shader stages with the given defines
+    for each stage, and the stages must convert to strings that identify their contents.
+    """
+    def __init__(self, env:Program, build:Callable[[Pipeline, Dict[str, List[SyntaxExpander]]], List[Any]]):
+        self.pipelines:Dict[str, PipelineVariants] = {}
+        # (pipeline, label, stages) for each program
+        self.programs:List[Tuple[Pipeline, str, List[Any]]] = []
+        # program index for each variant, with each pipeline's variants next to each other
+        self.table:List[int] = []
+        self.offsets:Dict[str, int] = {}
+        cache:Dict[str, int] = {}
+        for pipeline in env.pipelines.values():
+            variants = PipelineVariants(env, pipeline)
+            self.pipelines[pipeline.name] = variants
+            self.offsets[pipeline.name] = len(self.table)
+            for combination in variants.combinations:
+                stages = build(pipeline, variants.defines(combination))
+                key = content_hash(map(str, stages))
+                index = cache.get(key)
+                if index is None:
+                    index = cache[key] = len(self.programs)
+                    self.programs.append((pipeline, variants.label(combination), stages))
+                self.table.append(index)
+
+    @property
+    def specialized(self) -> List[UserVar]:
+        return specialized_user_vars(self.pipelines.values())
+
+    def program_index(self, pipeline:Pipeline, prefix:str) -> str:
+        """
+        Returns an expression for the index of the program the pipeline should
+        currently use, given the prefix used to access each specialized var's
+        current value index.
+        """
+        variants = self.pipelines[pipeline.name]
+        offset = self.offsets[pipeline.name]
+        if not variants.user_vars:
+            return str(self.table[offset])
+        return f"ProgramVariants[{offset} + {variants.selector(prefix)}]"
+
+    def pipeline_programs(self, pipeline:Pipeline) -> List[int]:
+        """
+        Returns the index of every program the pipeline may use, in order.
+        """
+        offset = self.offsets[pipeline.name]
+        count = len(self.pipelines[pipeline.name].combinations)
+        return list(dict.fromkeys(self.table[offset : offset + count]))
+
+
+class ProgramVariantTable(SyntaxExpander):
+    template = "const int ProgramVariants[「count:int」] = { 「indices:str」 };"
+
+    def __init__(self, variants:ProgramVariants):
+        SyntaxExpander.__init__(self)
+        self.count = len(variants.table)
+        self.indices = ", ".join(map(str, variants.table))
+
+
+class SpecializedVarIndices(SyntaxExpander):
+    """
+    The index of the current value of each specialized user var, which picks
+    the program variant that each pipeline uses.
+    """
+    template = """
+namespace SpecializedVars
+{
+「indices」
+}
+""".strip()
+    indent = ("indices",)
+
+    def __init__(self, user_vars:List[UserVar]):
+        SyntaxExpander.__init__(self)
+        self.indices = [f"int {v.name} = {v.variants.index(v.value)};" for v in user_vars]
+
+
+class SelectVariant(SyntaxExpander):
+    """
+    Finds the index of a specialized user var's new value.  Values which the
+    var wasn't specialized for keep the previous variant.
+    """
+    template = """
+{
+	const 「ctype:str」 Variants[「count:int」] = { 「values:str」 };
+	for (int Index = 0; Index < 「count:int」; ++Index)
+	{
+		if (UserVars::「name:str」 == Variants[Index])
+		{
+			SpecializedVars::「name:str」 = Index;
+		}
+	}
+}
+""".strip()
+
+    def __init__(self, user_var:UserVar):
+        SyntaxExpander.__init__(self)
+        self.ctype = user_var.ctype
+        self.count = len(user_var.variants)
+        self.values = ", ".join([define_value(user_var, value) for value in user_var.variants])
+        self.name = user_var.name
@@ -18,7 +18,7 @@ from ..handy import *
 from ..syntax.tokens import *
 from ..syntax.parser import Parser
 from ..syntax.grammar import GrammarError
-from ..syntax.arithmetic import fold, UnfoldedExpression
+from ..syntax.arithmetic import fold, UnfoldedExpression, SharedExpressions
 from .cpp_expressions import *
 
 
@@ -30,10 +30,27 @@ def case(source:str):
     def error(hint:str, token:Token, ErrorType=GrammarError):
         message = p.message(hint, *token.pos(), *token.pos())
         raise ErrorType(message)
-    return solve_expression(fold(tokens[0], error))
+    return fold(tokens[0], error)
 
 
 def test_basic():
     src = "(div 6 4 2 fnord 5 2)"
-    fnord = case(src)
+    fnord = solve_expression(case(src))
     assert(str(fnord) == "(0.75 / (UserVars::fnord * 10))")
+
+
+def test_temporaries():
+    width = case("(max (mul ScreenWidth fnord) 1)")
+    height = case("(mul fnord ScreenWidth)")
+    shared = SharedExpressions([width, height])
+    assert([str(t) for t in solve_temporaries(shared)] == ["const auto SharedExpr0 = (ScreenWidth * UserVars::fnord);"])
+    assert(str(solve_expression(width, shared)) == "max(SharedExpr0, 1)")
+    assert(str(solve_expression(height, shared)) == "SharedExpr0")
+    assert(str(solve_expression(height)) == "(UserVars::fnord * ScreenWidth)")
+
+
+def test_calls():
+    fnord = solve_expression(case("(div_up (mul ScreenWidth fnord) 16)"))
+    assert(str(fnord) == "Arithmetic::DivUp((ScreenWidth * UserVars::fnord), 16)")
+    fnord = solve_expression(case("(floor (log2 ScreenWidth))"))
+    assert(str(fnord) == "std::floor(std::log2(ScreenWidth))")
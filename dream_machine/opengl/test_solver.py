@@ -0,0 +1,214 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import re
+import tempfile
+from base64 import b64decode
+from ..handy import *
+from ..syntax.parser import Parser
+from ..syntax.grammar import validate, ValidationError
+from .shaders import compute_local_size
+from .live_user_vars import LiveUserVarLayout
+from .solver import solve, solve_structs, sort_structs
+
+
+def run(source:str):
+    p = Parser()
+    p.reset(source)
+    return validate(p)
+
+
+def test_solve_structs():
+    src = """
+(struct Outer (Thing Middle) (Things array 2 Inner))
+(struct Middle (Thing Inner) (Meep float))
+(struct Inner (Fnord vec4))
+"""
+    env = run(src)
+    assert([s.name for s in sort_structs(env)] == ["Inner", "Middle", "Outer"])
+    solved = solve_structs(env)
+    assert(list(solved) == ["Outer", "Middle", "Inner"])
+    assert(solved["Middle"].members["Thing"] is solved["Inner"])
+    assert(solved["Outer"].members["Thing"] is solved["Middle"])
+    assert(solved["Outer"].words == solved["Middle"].words + 2 * solved["Inner"].words)
+    # layouts are only solved once per program
+    assert(solve_structs(env)["Inner"] is solved["Inner"])
+
+
+def test_struct_cycle():
+    src = """
+(struct Fnord (Thing Meep))
+(struct Meep (Thing Moop))
+(struct Moop (Thing Fnord))
+"""
+    env = run(src)
+    try:
+        solve_structs(env)
+        assert(False)
+    except ValidationError as error:
+        assert("Fnord -> Meep -> Moop -> Fnord" in str(error))
+
+
+COMPUTE_SHADER = """
+// layout(local_size_x = 3) in;
+layout(local_size_x = 16, local_size_y = 4) in;
+void main() {}
+"""
+
+
+def test_dispatch_groups():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sim.cs.glsl")
+        with open(path, "w") as shader:
+            shader.write(COMPUTE_SHADER)
+        assert(compute_local_size(path) == (16, 4, 1))
+        src = f"""
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Fixed ColorFormat (width 1000) (height 100))
+(texture Screen ColorFormat (width ScreenWidth) (height ScreenHeight))
+(pipeline Sim (cs "{path}") (side Fixed) (side Screen))
+(renderer Fnord
+    (dispatch_over Sim Fixed)
+    (dispatch_over Sim Screen))
+"""
+        program = str(solve(run(src))[0])
+    # constant group counts are inlined
+    assert("glDispatchCompute(63, 25, 1);" in program)
+    # the rest are cached, and only recomputed when the window is resized
+    assert("GLuint DispatchGroups[1][3] = { 0 };" in program)
+    assert("glDispatchCompute(DispatchGroups[0][0], DispatchGroups[0][1], DispatchGroups[0][2]);" in program)
+    resized = program[program.index("void WindowResized"):]
+    assert("DispatchGroups[0][0] = (GLuint)(Arithmetic::DivUp(ScreenWidth, 16));" in resized)
+    assert("DispatchGroups[0][1] = (GLuint)(Arithmetic::DivUp(ScreenHeight, 4));" in resized)
+
+
+def test_update_user_vars():
+    with tempfile.TemporaryDirectory() as tmp:
+        for stage in ("vs", "fs"):
+            with open(os.path.join(tmp, f"splat.{stage}.glsl"), "w") as shader:
+                shader.write("void main() {}\n")
+        src = """
+(uservar int Scale 2)
+(uservar int Unused 3)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Screen ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture Tiny ColorFormat (width Scale) (height Scale))
+(texture Fixed ColorFormat (width 256) (height 256))
+(pipeline A (vs "{vs}") (fs "{fs}") (out Screen))
+(pipeline B (vs "{vs}") (fs "{fs}") (out Tiny))
+(pipeline C (vs "{vs}") (fs "{fs}") (out Fixed))
+""".format(vs=os.path.join(tmp, "splat.vs.glsl"), fs=os.path.join(tmp, "splat.fs.glsl"))
+        program, header = [str(part) for part in solve(run(src))[:2]]
+    assert("extern int Scale;" in header and "extern int Unused;" in header)
+    assert("extern int Scale = 2;" in program)
+    assert("int Scale = UserVars::Scale;" in program)
+    assert("UserVarCache::Unused" not in program)
+
+    resized = program[program.index("void WindowResized"):program.index("void UpdateUserVars")]
+    assert('"Screen"' in resized and '"A"' in resized)
+    for name in ('"Tiny"', '"Fixed"', '"B"', '"C"'):
+        assert(name not in resized)
+
+    updated = program[program.index("void UpdateUserVars"):program.index("int main")]
+    assert("const bool ScaleIsDirty = UserVars::Scale != UserVarCache::Scale;" in updated)
+    # everything already depends on Scale, so it is only checked once
+    assert(updated.count("if (ScaleIsDirty)") == 1)
+    assert('"Tiny"' in updated and '"B"' in updated)
+    for name in ('"Screen"', '"Fixed"', '"A"', '"C"'):
+        assert(name not in updated)
+    assert("UserVarCache::Scale = UserVars::Scale;" in updated)
+
+
+def test_specialized_user_vars():
+    with tempfile.TemporaryDirectory() as tmp:
+        shaders = \
+        {
+            "splat.vs.glsl" : "#version 420\n「interfaces」\nvoid main() {}\n",
+            "plain.fs.glsl" : "#version 420\n「interfaces」\n// Quality isn't used here\nvoid main() {}\n",
+            "lit.fs.glsl" : "#version 420\n「interfaces」\nvoid main() { if (Quality > 1 && Shadows) {} }\n",
+        }
+        for name, source in shaders.items():
+            with open(os.path.join(tmp, name), "w") as shader:
+                shader.write(source)
+        path = lambda name: os.path.join(tmp, name)
+        src = f"""
+(specialize int Quality 1 0 1 2)
+(specialize bool Shadows 1 0 1)
+(specialize int Unused 0 0 1)
+(pipeline Lit (vs "{path("splat.vs.glsl")}") (fs "{path("lit.fs.glsl")}"))
+(pipeline Plain (vs "{path("splat.vs.glsl")}") (fs "{path("plain.fs.glsl")}"))
+(pipeline Copy (vs "{path("splat.vs.glsl")}") (fs "{path("plain.fs.glsl")}"))
+(renderer Draw (draw Lit 3) (draw Plain 3) (draw Copy 3))
+"""
+        program = str(solve(run(src))[0])
+
+    # six variants of Lit, and one program which Plain and Copy share.
+    # only Lit's fragment shader is specialized, so its vertex shader is shared.
+    assert("GLuint Shaders[8] = { 0 };" in program)
+    assert("GLuint ShaderPrograms[7] = { 0 };" in program)
+    assert("const int ProgramVariants[8] = { 0, 1, 2, 3, 4, 5, 6, 6 };" in program)
+    assert('"Lit (Quality=2, Shadows=0)"' in program)
+    assert(program.count("glUseProgram(ShaderPrograms[ProgramVariants[0 + SpecializedVars::Quality * 2 + SpecializedVars::Shadows * 1]]);") == 1)
+    assert(program.count("glUseProgram(ShaderPrograms[6]);") == 2)
+    assert("int Quality = 1;" in program and "int Shadows = 1;" in program)
+    assert("SpecializedVars::Unused" not in program)
+
+    updated = program[program.index("void UpdateUserVars"):program.index("int main")]
+    assert("const int Variants[3] = { 0, 1, 2 };" in updated)
+    assert("const bool Variants[2] = { false, true };" in updated)
+    assert("SpecializedVars::Quality = Index;" in updated)
+    assert("UserVarCache::Shadows = UserVars::Shadows;" in updated)
+
+    sources = [b64decode(encoded).decode() for encoded in re.findall(r'"([A-Za-z0-9+/=]{16,})"', program)]
+    assert(len(sources) == 8)
+    assert(len([s for s in sources if "#define Quality 2\n#define Shadows false" in s]) == 1)
+    assert(len([s for s in sources if "#define" not in s]) == 2)
+
+
+def test_live_user_vars():
+    src = """
+(live_user_vars "tweaks.bin")
+(uservar int Scale 2)
+(uservar double Exposure 1.5)
+(uservar bool Fancy 1)
+(uservar float Blend (mul 2 ScreenWidth))
+"""
+    env = run(src)
+    layout = LiveUserVarLayout(env)
+    schema = layout.schema()
+    assert(schema["size"] == 40 and schema["layout"] == layout.layout)
+    assert(schema["header"]["version"] == 12)
+    assert([(name, field["type"], field["offset"]) for (name, field) in schema["user_vars"].items()] == \
+           [("Scale", "int32", 16), ("Exposure", "float64", 24), ("Fancy", "bool32", 32), ("Blend", "float32", 36)])
+    assert(schema["user_vars"]["Exposure"]["default"] == 1.5)
+    assert("default" not in schema["user_vars"]["Blend"])
+    assert(LiveUserVarLayout(run(src.replace("(uservar bool Fancy 1)", ""))).layout != layout.layout)
+
+    program, header, dependencies = solve(env)[:3]
+    program = str(program)
+    assert("live_user_vars" in dependencies and '#include "live_user_vars.h"' in str(header))
+    assert(f'LiveUserVars::Open("tweaks.bin", 40, {layout.layout}u, Fresh);' in program)
+    assert("LiveUserVars::Write<double>(LiveUserVars::Block, 24, UserVars::Exposure);" in program)
+    updated = program[program.index("void UpdateUserVars"):program.index("int main")]
+    assert("const std::int32_t LiveFancy = LiveUserVars::Read<std::int32_t>(LiveUserVars::Block, 32);" in updated)
+    assert("UserVars::Fancy = LiveFancy != 0;" in updated)
+    assert("LiveUserVars::Close();" in program)
+
+    program = str(solve(run(src.replace('(live_user_vars "tweaks.bin")', "")))[0])
+    assert("LiveUserVars" not in program)
@@ -17,10 +17,11 @@
 from typing import *
 from enum import IntEnum
 from ..expanders import SyntaxExpander
-from .cpp_expressions import solve_expression
+from .cpp_expressions import solve_expression, solve_temporaries
 from ..handy import CAST
 from ..syntax.grammar import Texture, Format, TextureDimension, PipelineInput, PipelineSideput, Program
 from ..syntax.constants import TextureType, TextureFormats
+from ..syntax.arithmetic import SharedExpressions
 
 
 class InternalFormats(IntEnum):
@@ -141,14 +142,14 @@ class Texture2DSetup(SyntaxExpander):
 }
 """.strip()
 
-    def __init__(self, texture:Texture):
+    def __init__(self, texture:Texture, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         assert(texture.format.target == TextureType.TEXTURE_2D)
         self.name = texture.name
         self.handle = texture.handle
         self.format = GLFormat(texture.format)
-        self.width = solve_expression(texture.width)
-        self.height = solve_expression(texture.height)
+        self.width = solve_expression(texture.width, shared)
+        self.height = solve_expression(texture.height, shared)
 
 
 class Texture3DSetup(SyntaxExpander):
@@ -161,15 +162,15 @@ class Texture3DSetup(SyntaxExpander):
 }
 """.strip()
 
-    def __init__(self, texture:Texture):
+    def __init__(self, texture:Texture, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         assert(texture.format.target == TextureType.TEXTURE_3D)
         self.name = texture.name
         self.handle = texture.handle
         self.format = GLFormat(texture.format)
-        self.width = solve_expression(texture.width)
-        self.height = solve_expression(texture.height)
-        self.depth = solve_expression(texture.depth)
+        self.width = solve_expression(texture.width, shared)
+        self.height = solve_expression(texture.height, shared)
+        self.depth = solve_expression(texture.depth, shared)
 
 
 class ResizeTexture2D(Texture2DSetup):
@@ -196,12 +197,19 @@ class ResizeTexture3D(Texture3DSetup):
 """.strip()
 
 
-def ResizeTexture(texture:Texture) -> SyntaxExpander:
+def ResizeTexture(texture:Texture, shared:Optional[SharedExpressions] = None) -> SyntaxExpander:
     if texture.format.target == TextureType.TEXTURE_2D:
-        return ResizeTexture2D(texture)
+        return ResizeTexture2D(texture, shared)
     else:
         assert(texture.format.target == TextureType.TEXTURE_3D)
-        return ResizeTexture3D(texture)
+        return ResizeTexture3D(texture, shared)
+
+
+def shared_dimensions(textures:Iterable[Texture]) -> SharedExpressions:
+    """
+    Finds the size expressions which are repeated among the given textures.
+    """
+    return SharedExpressions([d.value for t in textures for d in t.dimensions.values()])
 
 
 class BindTexture(SyntaxExpander):
@@ -229,18 +237,19 @@ class SetupTextures(SyntaxExpander):
 
     def __init__(self, env:Program):
         SyntaxExpander.__init__(self)
-        self.wrapped:List[SyntaxExpander] = []
+        shared = shared_dimensions(env.textures.values())
+        self.wrapped:List[SyntaxExpander] = solve_temporaries(shared)
         for texture in env.textures.values():
             if texture.src:
                 if texture.format.target != TextureType.TEXTURE_2D:
                     texture.format.error(f'Textures loaded must use a TEXTURE_2D format."')
                 self.wrapped.append(PngTextureSetup(texture))
             elif texture.format.target == TextureType.TEXTURE_2D:
-                self.wrapped.append(Texture2DSetup(texture))
+                self.wrapped.append(Texture2DSetup(texture, shared))
                 if texture.clear:
                     self.wrapped.append(ClearTexture(texture))
             elif texture.format.target == TextureType.TEXTURE_3D:
-                self.wrapped.append(Texture3DSetup(texture))
+                self.wrapped.append(Texture3DSetup(texture, shared))
             else:
                 texture.format.error(f'Texture type not supported by the OpenGL backend: "{texture.format.target.name}"')
 
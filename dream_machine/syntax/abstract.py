@@ -22,7 +22,7 @@ from ..handy import *
 from .tokens import *
 from .parser import Parser
 from .constants import *
-from .arithmetic import fold, FoldedExpression, UnfoldedExpression
+from .arithmetic import fold, expression_vars, FoldedExpression, UnfoldedExpression
 from ..opengl.glsl_types import glsl_builtins
 
 
@@ -48,6 +48,76 @@ SCALAR_CTYPE_NAMES = \
 )
 
 
+class Symbol:
+    """
+    Everything in a program which has been declared with a given name.  Each
+    kind of declaration gets its own attribute, which is None when the name
+    isn't used for that kind.
+    """
+    __slots__ = ("name", "user_var", "struct", "buffer", "format", "sampler", "texture", "pipeline", "renderer")
+    KINDS = __slots__[1:]
+
+    def __init__(self, name:str):
+        self.name = name
+        for kind in self.KINDS:
+            setattr(self, kind, None)
+
+    @property
+    def kinds(self) -> List[str]:
+        return [kind for kind in self.KINDS if getattr(self, kind) is not None]
+
+    def __repr__(self):
+        return f'<Symbol {self.name} {" ".join(self.kinds)}>'
+
+
+# returned when looking up names which haven't been declared
+UNDECLARED = Symbol("")
+
+
+def frozen_handle(resource:Syntax) -> int:
+    """
+    Returns the dense handle Program.freeze assigned to a sampler, buffer,
+    texture, or pipeline.
+    """
+    handle = resource._handle
+    assert handle is not None, f"{resource!r} has no handle, because the program hasn't been frozen yet"
+    return handle
+
+
+class ChildPlan:
+    """
+    Describes where a Syntax node files its children, for one list of child
+    types.  Plans are shared by every node built with the same child types,
+    so populating and visiting a node doesn't need to inspect each type or
+    attribute again.
+    """
+    def __init__(self, child_types:Tuple[Type[Syntax], ...]):
+        self.types = dedupe(list(child_types))
+        # child type -> bucket index
+        self.buckets = {match : index for (index, match) in enumerate(self.types)}
+        # (attribute, primary key, is many) for each bucket
+        self.targets = [(cast(str, match.many or match.one), match.primary, match.many is not None) for match in self.types]
+
+        # (attribute, kind) in visiting order, where the kind is "dict",
+        # "list", or "one"
+        kinds:Dict[str, str] = {}
+        for attr, primary, many in self.targets:
+            kinds[attr] = ("dict" if primary else "list") if many else "one"
+        self.keys = dedupe([cast(str, match.many or match.one) for match in child_types])
+        self.visit = [(key, kinds[key]) for key in self.keys]
+
+
+CHILD_PLANS:Dict[Tuple[Type[Syntax], ...], ChildPlan] = {}
+
+
+def child_plan(child_types:List[Type[Syntax]]) -> ChildPlan:
+    key = tuple(child_types)
+    plan = CHILD_PLANS.get(key)
+    if plan is None:
+        plan = CHILD_PLANS[key] = ChildPlan(key)
+    return plan
+
+
 class Syntax:
     """
     Base class for abstract syntax objects, to be filled out by grammar Rule
@@ -64,11 +134,25 @@ class Syntax:
     a primary key for dictionary lookups within a graph parent.
 
     Syntax classes are meant to be created by Rule classes upon successful
-    validaiton.
+    validaiton.  Each subclass lists its attributes in "__slots__", including
+    the attributes its children are placed in.
     """
+    __slots__ = ("tokens", "children", "child_types", "_plan", "_env", "_parent", "error_callback", "__weakref__")
     one:Optional[str] = None
     many:Optional[str] = None
     primary:Optional[str] = None
+    frozen = False
+    _handle:Optional[int] = None
+
+    # every slot name in the class hierarchy, filled in by __init_subclass__
+    _state_names:Tuple[str, ...] = __slots__[:-1]
+
+    def __init_subclass__(cls, **kargs):
+        super().__init_subclass__(**kargs)
+        names:List[str] = []
+        for base in reversed(cls.__mro__):
+            names += [n for n in base.__dict__.get("__slots__", ()) if n != "__weakref__"]
+        cls._state_names = tuple(dedupe(names))
 
     def __init__(self, tokens:Optional[TokenList], children:List[Syntax], child_types:List[Type[Syntax]], extra_types:Optional[List[Type[Syntax]]] = None):
         assert((type(self.one) is str and self.many is None) or (type(self.many) is str and self.one is None))
@@ -77,7 +161,7 @@ class Syntax:
         self.child_types = child_types
         if extra_types:
             self.child_types += extra_types
-        self._keys = dedupe([cast(str, c.many or c.one) for c in child_types])
+        self._plan = child_plan(self.child_types)
         self._env:Optional[ReferenceType] = None
         self._parent:Optional[ReferenceType] = None
         self.error_callback:Optional[ErrorCallback] = None
@@ -85,6 +169,24 @@ class Syntax:
             child.parent = self
         self.populate(self.children)
 
+    def __getstate__(self):
+        # weak references can't be pickled, so store what they refer to
+        state = {}
+        for name in self._state_names:
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        state["_env"] = self._env() if self._env is not None else None
+        state["_parent"] = self._parent() if self._parent is not None else None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._env = ref(state["_env"]) if state["_env"] is not None else None
+        self._parent = ref(state["_parent"]) if state["_parent"] is not None else None
+
     @property
     def env(self) -> Program:
         reference = cast(ReferenceType, self._env)
@@ -109,25 +211,41 @@ class Syntax:
         from subclasses.
         """
         error_callback = cast(ErrorCallback, self.error_callback)
-        error_callback(hint, token or CAST(TokenList, self.tokens))
+        error_callback(hint, token or CAST(TokenList, self.tokens), node=self)
+
+    def lineage(self) -> Iterator[Syntax]:
+        """
+        Yields this node, and then each of its parents in turn.
+        """
+        node:Optional[Syntax] = self
+        while node is not None:
+            yield node
+            node = node._parent() if node._parent is not None else None
 
     def populate(self, all_children:List[Syntax]):
-        for match in self.child_types:
-            children = [c for c in all_children if type(c) == match]
-            if match.many is not None:
-                if match.primary:
-                    setattr(self, match.many, {getattr(c, match.primary) : c for c in children})
+        if self.frozen:
+            raise TypeError("Can't repopulate a frozen program")
+        plan = self._plan
+        buckets:List[List[Syntax]] = [[] for match in plan.types]
+        for child in all_children:
+            index = plan.buckets.get(type(child))
+            if index is not None:
+                buckets[index].append(child)
+        for (attr, primary, many), children in zip(plan.targets, buckets):
+            if many:
+                if primary:
+                    setattr(self, attr, {getattr(c, primary) : c for c in children})
                 else:
-                    setattr(self, match.many, children)
+                    setattr(self, attr, children)
             else:
-                assert(match.one is not None)
-                child = children[-1] if len(children) else None
-                setattr(self, match.one, child)
+                setattr(self, attr, children[-1] if children else None)
 
     def append_child(self, new_child:Syntax):
         """
         Add a new child to this node and match dicts/lists.
         """
+        if self.frozen:
+            raise TypeError(f"Can't add {new_child!r}, because the program has been frozen")
         for match in self.child_types:
             if type(new_child) == match:
                 assert(match.many is not None)
@@ -142,6 +260,22 @@ class Syntax:
                     group.append(new_child)
                 self.children.append(new_child)
 
+    def clone(self) -> Syntax:
+        """
+        Returns a copy of this node and its children which hasn't been attached
+        to a Program yet.  This lets validated syntax be reused for forms which
+        haven't changed without running the grammar rules again.
+        """
+        twin = copy(self)
+        twin.children = [child.clone() for child in self.children]
+        twin._env = None
+        twin._parent = None
+        twin.error_callback = None
+        for child in twin.children:
+            child.parent = twin
+        twin.populate(twin.children)
+        return twin
+
     def subset(self, subset_name:str) -> Union[List[Syntax], Dict[str,Syntax], Syntax]:
         subset = getattr(self, subset_name)
         if is_mapping(subset):
@@ -154,8 +288,15 @@ class Syntax:
             return [subset]
 
     def dispatch(self, method_name, *args, **kargs):
-        for attr in self._keys:
-            for child in self.subset(attr):
+        for attr, kind in self._plan.visit:
+            group = getattr(self, attr)
+            if kind == "dict":
+                group = group.values()
+            elif kind == "one":
+                if group is None:
+                    continue
+                group = (group,)
+            for child in group:
                 getattr(child, method_name)(*args, **kargs)
 
     def set_env(self, env, error_callback:ErrorCallback):
@@ -171,7 +312,7 @@ class Syntax:
 
     def report(self):
         msg = ""
-        for key in self._keys:
+        for key in self._plan.keys:
             msg += f".{key}:\n"
             subset = getattr(self, key)
             if is_mapping(subset):
@@ -192,6 +333,7 @@ class ArithmeticExpression(Syntax):
     """
     This wraps the result from the function "fold" in the arithmetic module.
     """
+    __slots__ = ("expr",)
     one = "expr"
 
     def __init__(self, expr:ExpressionTree, *args, **kargs):
@@ -199,9 +341,10 @@ class ArithmeticExpression(Syntax):
         self.expr = expr
 
     def validate(self, expr:Optional[Any]=None):
-        expr = expr or self.expr
+        if expr is None:
+            expr = self.expr
         if type(expr) is str:
-            if not expr in COMMON_VARS and not expr in self.env.user_vars:
+            if not expr in COMMON_VARS and not self.env.lookup(expr).user_var:
                 self.error(f'Unknown variable "{expr}"', self.tokens)
         elif type(expr) is UnfoldedExpression:
             expr = cast(UnfoldedExpression, expr)
@@ -215,7 +358,13 @@ class UserVar(Syntax):
     """
     This represents a user-defined variable, which may be used in expressions, and
     may be changed by user code at run time.
+
+    User vars declared with "specialize" instead of "uservar" also list every
+    value they may be set to.  Shaders which use them are built once for each
+    of those values with the var defined as a constant, and the matching build
+    is used at run time.
     """
+    __slots__ = ("ctype", "name", "variants", "expr")
     many = "user_vars"
     primary = "name"
     expr:ArithmeticExpression
@@ -223,14 +372,26 @@ class UserVar(Syntax):
     def __init__(self, *args, **kargs):
         Syntax.__init__(self, *args, **kargs)
         uservar, self.ctype, self.name = map(str, cast(TokenList, self.tokens[:3]))
+        self.variants:Tuple[Union[int, float], ...] = tuple([t.value for t in cast(TokenList, self.tokens)[4:]])
 
     @property
     def value(self) -> ExpressionTree:
         return self.expr.expr
 
+    @property
+    def specialized(self) -> bool:
+        return len(self.variants) > 0
+
     def validate(self):
         if self.ctype not in SCALAR_CTYPE_NAMES:
             self.error(f'Invalid scalar ctype: "{self.ctype}"')
+        if self.specialized:
+            if len(set(self.variants)) != len(self.variants):
+                self.error(f'Specialized user var "{self.name}" lists the same value more than once.')
+            if self.ctype in ("int", "bool") and [v for v in self.variants if type(v) is not int]:
+                self.error(f'Specialized user var "{self.name}" has a non-integer value, but its type is "{self.ctype}".')
+            if self.value not in self.variants:
+                self.error(f'The initial value of specialized user var "{self.name}" must be one of its listed values.')
 
 
 class Struct(Syntax):
@@ -238,6 +399,7 @@ class Struct(Syntax):
     This represents a struct type definition, which may be used to generate GLSL
     structs, GLSL uniform blocks, C++ structs, and C++ side buffer upload functions.
     """
+    __slots__ = ("name", "referenced", "members")
     many = "structs"
     primary = "name"
     members:List[StructMember]
@@ -247,6 +409,11 @@ class Struct(Syntax):
         struct, self.name = map(str, cast(TokenList, self.tokens)[:2])
         self.referenced:List[str] = []
 
+    def clone(self) -> Syntax:
+        twin = cast(Struct, Syntax.clone(self))
+        twin.referenced = []
+        return twin
+
     def validate(self):
         Syntax.validate(self)
         if self.name in glsl_builtins:
@@ -260,7 +427,7 @@ class Struct(Syntax):
                 names.append(member.name)
             if member.type == self.name:
                 member.error(f"Struct members can't use the type of the struct it belongs to.")
-            if member.type in self.env.structs and member.type not in self.referenced:
+            if self.env.lookup(member.type).struct and member.type not in self.referenced:
                 self.referenced.append(member.type)
 
     def __repr__(self):
@@ -271,6 +438,7 @@ class StructMember(Syntax):
     """
     Describes a single member variable within a Struct.
     """
+    __slots__ = ("name", "array", "type")
     many = "members"
 
     def __init__(self, *args, **kargs):
@@ -286,7 +454,7 @@ class StructMember(Syntax):
 
     def validate(self):
         Syntax.validate(self)
-        if self.type not in glsl_builtins and self.type not in self.env.structs:
+        if self.type not in glsl_builtins and not self.env.lookup(self.type).struct:
             self.error(f'Undefined type name: "{self.type}"')
         if self.array is not None:
             number = CAST(TokenNumber, self.array)
@@ -304,6 +472,7 @@ class Sampler(Syntax):
     This describes a sampler object.  There will be one sampler created for each
     instance of this class.
     """
+    __slots__ = ("name", "_handle", "filters")
     many = "samplers"
     primary = "name"
     filters:Dict[str,SamplerFilter]
@@ -311,10 +480,11 @@ class Sampler(Syntax):
     def __init__(self, *args, **kargs):
         Syntax.__init__(self, *args, **kargs)
         sampler, self.name = map(str, cast(TokenList, self.tokens)[:2])
+        self._handle = None
 
     @property
     def handle(self) -> int:
-        return list(self.env.samplers.keys()).index(self.name)
+        return frozen_handle(self)
 
     def validate(self):
         Syntax.validate(self)
@@ -331,6 +501,7 @@ class SamplerFilter(Syntax):
     """
     Sampler filter parameters.
     """
+    __slots__ = ("name", "value_str")
     many = "filters"
     primary = "name"
 
@@ -357,6 +528,7 @@ class Format(Syntax):
     for determining what to allocate.  This is also used to map from texture
     instances to samplers.
     """
+    __slots__ = ("name", "target_str", "format_str", "_sampler")
     many = "formats"
     primary = "name"
 
@@ -366,7 +538,7 @@ class Format(Syntax):
 
     @property
     def sampler(self) -> Sampler:
-        return CAST(Sampler, self.env.samplers.get(self._sampler))
+        return CAST(Sampler, self.env.lookup(self._sampler).sampler)
 
     @property
     def target(self) -> TextureType:
@@ -386,18 +558,43 @@ class Format(Syntax):
         Syntax.validate(self)
         if self.sampler is None:
             self.error(f'Unknown sampler: "{self._sampler}"')
-        if self.name in self.env.structs:
+        if self.env.lookup(self.name).struct:
             self.error(f'There cannot be a format named "{self.name}", because there is already a struct of the same name.')
 
     def __repr__(self):
         return f'<Format {self.name} {self.target} {self.format} {self.sampler}>'
 
 
+class BindingLayout:
+    """
+    The binding points used by a pipeline: uniform buffer slots, texture
+    units, image units, and color attachments, each numbered in declaration
+    order, along with the depth attachment if there is one.  This is built
+    once per pipeline after the program is frozen.
+    """
+    def __init__(self, pipeline:Pipeline):
+        self.uniforms = tuple([i for i in pipeline.inputs if i.is_uniform])
+        self.textures = tuple([i for i in pipeline.inputs if i.is_texture])
+        self.images = tuple(pipeline.sideputs)
+        self.color_targets = tuple([o for o in pipeline.outputs if o.is_color])
+        depth_targets = [o for o in pipeline.outputs if o.is_depth]
+        self.depth_target = depth_targets[0] if len(depth_targets) == 1 else None
+
+        self.uniform_slots = {binding : slot for (slot, binding) in enumerate(self.uniforms)}
+        self.texture_units = {binding : unit for (unit, binding) in enumerate(self.textures)}
+        self.image_units = {binding : unit for (unit, binding) in enumerate(self.images)}
+        self.color_attachments = {binding : index for (index, binding) in enumerate(self.color_targets)}
+
+    def __repr__(self):
+        return f'<BindingLayout {len(self.uniforms)} uniforms, {len(self.textures)} textures, {len(self.images)} images, {len(self.color_targets)} color targets>'
+
+
 class Pipeline(Syntax):
     """
     This represents the pipeline state needed for a draw call.
     This specifies shaders, data interfaces, and fixed function state.
     """
+    __slots__ = ("name", "requires_flip", "_layout", "_handle", "structs", "shaders", "inputs", "outputs", "sideputs", "flags", "copies")
     many = "pipelines"
     primary = "name"
     structs:List[PipelineUse]
@@ -411,6 +608,14 @@ class Pipeline(Syntax):
         Syntax.__init__(self, *args, **kargs)
         pipeline, self.name = map(str, cast(TokenList, self.tokens)[:2])
         self.requires_flip:List[Texture] = []
+        self._layout:Optional[BindingLayout] = None
+        self._handle = None
+
+    def clone(self) -> Syntax:
+        twin = cast(Pipeline, Syntax.clone(self))
+        twin.requires_flip = []
+        twin._layout = None
+        return twin
 
     def rewrite(self):
         Syntax.rewrite(self)
@@ -428,9 +633,10 @@ class Pipeline(Syntax):
         self.populate(new_children)
 
         # create shadow targets where needed
-        input_textures = (i.texture for i in self.textures if i.texture)
-        input_handles = [t.handle for t in input_textures]
-        shadowed_targets = tuple([o for o in self.outputs if o.handle in input_handles])
+        # the symbol table isn't built until the program is frozen
+        input_textures = (self.env.textures.get(i.resource_name) for i in self.inputs)
+        input_names = set([t.name for t in input_textures if t])
+        shadowed_targets = tuple([o for o in self.outputs if o.texture.name in input_names])
         for target in shadowed_targets:
             self.requires_flip.append(target.texture)
             target.texture.create_shadow_target()
@@ -451,21 +657,32 @@ class Pipeline(Syntax):
 
     @property
     def index(self) -> int:
-        return list(self.env.pipelines.values()).index(self)
+        return frozen_handle(self)
+
+    @property
+    def layout(self) -> BindingLayout:
+        """
+        Returns the pipeline's binding layout.  Backends should use this for
+        all binding point assignments.
+        """
+        if self._layout is None:
+            assert(self.env.frozen)
+            self._layout = BindingLayout(self)
+        return self._layout
 
     @property
     def uniforms(self) -> Tuple[PipelineInput, ...]:
         """
         Returns the pipeline's uniform inputs.
         """
-        return tuple([i for i in self.inputs if i.is_uniform])
+        return self.layout.uniforms
 
     @property
     def textures(self) -> Tuple[PipelineInput, ...]:
         """
         Returns the pipeline's texture inputs.
         """
-        return tuple([i for i in self.inputs if i.is_texture])
+        return self.layout.textures
 
     @property
     def all_target_textures(self) -> List[Texture]:
@@ -475,15 +692,11 @@ class Pipeline(Syntax):
 
     @property
     def color_targets(self) -> Tuple[PipelineOutput, ...]:
-        return tuple([i for i in self.outputs if i.is_color])
+        return self.layout.color_targets
 
     @property
     def depth_target(self) -> Optional[PipelineOutput]:
-        targets = [i for i in self.outputs if i.is_depth]
-        if len(targets) == 1:
-            return targets[0]
-        else:
-            return None
+        return self.layout.depth_target
 
     @property
     def uses_backbuffer(self) -> bool:
@@ -517,6 +730,7 @@ class PipelineShader(Syntax):
     """
     A path to a shader to be used by a pipeline.
     """
+    __slots__ = ("type", "path")
     many = "shaders"
     primary = "type"
 
@@ -533,6 +747,7 @@ class PipelineUse(Syntax):
     Indicates that a given struct should be present in the GLSL sources used
     by the pipeline.
     """
+    __slots__ = ("struct",)
     many = "structs"
 
     def __init__(self, *args, **kargs):
@@ -541,7 +756,7 @@ class PipelineUse(Syntax):
 
     def validate(self):
         Syntax.validate(self)
-        if self.struct not in self.env.structs:
+        if not self.env.lookup(self.struct).struct:
             self.error(f'Unknown struct "{self.struct}"')
 
     def __repr__(self):
@@ -552,6 +767,7 @@ class PipelineFlag(Syntax):
     """
     Fixed function state.
     """
+    __slots__ = ("flag", "state")
     many = "flags"
     primary = "flag"
 
@@ -571,6 +787,7 @@ class PipelineCopy(Syntax):
     This copies in all of the commands from another pipeline.  Commands are
     taken in order, and the last command of a given type is the one that is used.
     """
+    __slots__ = ("target",)
     many = "copies"
 
     def __init__(self, *args, **kargs):
@@ -579,7 +796,7 @@ class PipelineCopy(Syntax):
 
     def validate(self):
         Syntax.validate(self)
-        if self.target not in self.env.pipelines:
+        if not self.env.lookup(self.target).pipeline:
             self.error(f'Unknown pipeline copy target: "{self.target}"')
 
     def __repr__(self):
@@ -590,6 +807,7 @@ class PipelineInput(Syntax):
     """
     A buffer or texture input for a pipeline.
     """
+    __slots__ = ("resource_name",)
     many = "inputs"
 
     def __init__(self, *args, **kargs):
@@ -602,15 +820,15 @@ class PipelineInput(Syntax):
 
     @property
     def is_texture(self) -> bool:
-        return self.resource_name in self.env.textures
+        return self.env.lookup(self.resource_name).texture is not None
 
     @property
     def is_uniform(self) -> bool:
-        return self.resource_name in self.env.buffers
+        return self.env.lookup(self.resource_name).buffer is not None
 
     @property
     def texture(self) -> Optional[Texture]:
-        return self.env.textures.get(self.resource_name)
+        return self.env.lookup(self.resource_name).texture
 
     @property
     def format(self) -> Format:
@@ -618,7 +836,7 @@ class PipelineInput(Syntax):
 
     @property
     def buffer(self) -> Optional[Buffer]:
-        return self.env.buffers.get(self.resource_name)
+        return self.env.lookup(self.resource_name).buffer
 
     @property
     def struct(self) -> str:
@@ -627,12 +845,12 @@ class PipelineInput(Syntax):
     @property
     def uniform_index(self) -> int:
         assert(self.is_uniform)
-        return cast(Pipeline, self.parent).uniforms.index(self)
+        return cast(Pipeline, self.parent).layout.uniform_slots[self]
 
     @property
     def texture_index(self) -> int:
         assert(self.is_texture)
-        return cast(Pipeline, self.parent).textures.index(self)
+        return cast(Pipeline, self.parent).layout.texture_units[self]
 
     def validate(self):
         Syntax.validate(self)
@@ -650,6 +868,7 @@ class PipelineOutput(Syntax):
     """
     A render target output for a pipeline.
     """
+    __slots__ = ("resource_name",)
     many = "outputs"
 
     def __init__(self, *args, **kargs):
@@ -679,7 +898,7 @@ class PipelineOutput(Syntax):
     @property
     def color_index(self) -> int:
         assert(self.is_color)
-        return cast(Pipeline, self.parent).color_targets.index(self)
+        return cast(Pipeline, self.parent).layout.color_attachments[self]
 
     def validate(self):
         Syntax.validate(self)
@@ -700,6 +919,7 @@ class PipelineSideput(Syntax):
     """
     A UAV (D3D) or Image (OpenGL).
     """
+    __slots__ = ("resource_name",)
 
     many = "sideputs"
 
@@ -709,7 +929,7 @@ class PipelineSideput(Syntax):
 
     @property
     def texture(self) -> Optional[Texture]:
-        return self.env.textures.get(self.resource_name)
+        return self.env.lookup(self.resource_name).texture
 
     @property
     def format(self) -> Format:
@@ -717,7 +937,7 @@ class PipelineSideput(Syntax):
 
     @property
     def binding_index(self) -> int:
-        return cast(Pipeline, self.parent).sideputs.index(self)
+        return cast(Pipeline, self.parent).layout.image_units[self]
 
     def validate(self):
         Syntax.validate(self)
@@ -733,22 +953,25 @@ class Buffer(Syntax):
     This corresponds to a buffer object, and is used for binding and upload
     machinery.
     """
+    __slots__ = ("name", "struct", "_handle")
     many = "buffers"
     primary = "name"
 
     def __init__(self, *args, **kargs):
         Syntax.__init__(self, *args, **kargs)
         buffer, self.name, self.struct = map(str, cast(TokenList, self.tokens))
+        self._handle = None
 
     @property
     def handle(self) -> int:
-        return list(self.env.buffers.keys()).index(self.name)
+        return frozen_handle(self)
 
     def validate(self):
         Syntax.validate(self)
-        if self.name in self.env.samplers:
+        symbol = self.env.lookup(self.name)
+        if symbol.sampler:
             self.error(f'Buffer cannot be named "{self.name}", because there is already a sampler of the same name.')
-        if self.struct not in self.env.structs:
+        if not self.env.lookup(self.struct).struct:
             self.error(f'Unknown struct: "{self.struct}"')
 
     def __repr__(self):
@@ -760,6 +983,7 @@ class Texture(Syntax):
     This corresponds to a texture object, and is used for binding and upload
     machinery.
     """
+    __slots__ = ("name", "_format", "shadow_texture", "copies_from", "_handle", "src", "clear", "dimensions")
     many = "textures"
     primary = "name"
     src:TextureSrc
@@ -771,6 +995,7 @@ class Texture(Syntax):
         buffer, self.name, self._format = map(str, cast(TokenList, self.tokens[:3]))
         self.shadow_texture:Optional[Texture] = None
         self.copies_from:Optional[str] = None
+        self._handle = None
 
     def new_shadow_name(self):
         assert(self.shadow_texture != None)
@@ -793,11 +1018,11 @@ class Texture(Syntax):
 
     @property
     def format(self) -> Format:
-        return self.env.formats[self._format]
+        return self.env.lookup(self._format).format
 
     @property
     def handle(self) -> int:
-        return list(self.env.textures.keys()).index(self.name)
+        return frozen_handle(self)
 
     @property
     def sampler(self) -> Sampler:
@@ -820,12 +1045,13 @@ class Texture(Syntax):
 
     def validate(self):
         Syntax.validate(self)
-        if self.name in self.env.samplers:
+        symbol = self.env.lookup(self.name)
+        if symbol.sampler:
             self.error(f'Texture cannot be named "{self.name}", because there is already a sampler of the same name.')
-        if self.name in self.env.buffers:
+        if symbol.buffer:
             self.error(f'Texture cannot be named "{self.name}", because there is already a buffer of the same name.')
         if not self.format:
-            self.error(f'Unknown format: "{self.format}"')
+            self.error(f'Unknown format: "{self._format}"')
 
         has_width = self.width is not None
         has_height = self.height is not None
@@ -858,6 +1084,7 @@ class TextureSrc(Syntax):
     Command for loading the image from a file.  If this is set, the dimensions
     of the image should not also be provided as they will be determined at run time.
     """
+    __slots__ = ("path",)
     one = "src"
 
     def __init__(self, *args, **kargs):
@@ -875,6 +1102,7 @@ class TextureClearColor(Syntax):
     """
     Optional clear color.
     """
+    __slots__ = ("channels",)
     one = "clear"
 
     def __init__(self, *args, **kargs):
@@ -886,6 +1114,7 @@ class TextureDimension(Syntax):
     """
     Intended to be subclassed.
     """
+    __slots__ = ("name", "expr")
     many = "dimensions"
     primary = "name"
     expr:ArithmeticExpression
@@ -908,6 +1137,7 @@ class Renderer(Syntax):
     specification for what is to be rendered in a given frame.  Only one
     renderer is used per frame, but the renderer can be changed between frames.
     """
+    __slots__ = ("name", "updates", "draws", "dispatches", "texture_swaps", "regen_framebuffers", "next_renderer")
     many = "renderers"
 
     def __init__(self, *args, **kargs):
@@ -951,6 +1181,7 @@ class RendererUpdate(Syntax):
     """
     This specifies that a given handle should be updated with user data.
     """
+    __slots__ = ("resource",)
     many = "updates"
 
     def __init__(self, *args, **kargs):
@@ -959,16 +1190,17 @@ class RendererUpdate(Syntax):
 
     def validate(self):
         Syntax.validate(self)
-        if self.resource not in self.env.textures and self.resource not in self.env.buffers:
+        symbol = self.env.lookup(self.resource)
+        if not symbol.texture and not symbol.buffer:
             self.error(f'Unknown texture or buffer: "{self.resource}"')
 
     @property
     def texture(self) -> Optional[Texture]:
-        return self.env.textures.get(self.resource)
+        return self.env.lookup(self.resource).texture
 
     @property
     def buffer(self) -> Optional[Buffer]:
-        return self.env.buffers.get(self.resource)
+        return self.env.lookup(self.resource).buffer
 
     def __repr__(self):
         return f'<RendererUpdate {self.resource}>'
@@ -978,6 +1210,7 @@ class RendererDraw(Syntax):
     """
     A draw call.
     """
+    __slots__ = ("pipeline_name", "vertices", "expr")
     many = "draws"
 
     def __init__(self, *args, **kargs):
@@ -989,12 +1222,12 @@ class RendererDraw(Syntax):
         Syntax.validate(self)
 
         # verify that the referenced pipeline exists
-        if self.pipeline_name not in self.env.pipelines:
-            self.error(f'Unknown pipeline: "{self.pipeline}"')
+        if not self.env.lookup(self.pipeline_name).pipeline:
+            self.error(f'Unknown pipeline: "{self.pipeline_name}"')
 
     @property
     def pipeline(self) -> Pipeline:
-        return self.env.pipelines[self.pipeline_name]
+        return CAST(Pipeline, self.env.lookup(self.pipeline_name).pipeline)
 
     def __repr__(self):
         return f'<RendererDraw {self.pipeline_name}>'
@@ -1005,6 +1238,7 @@ class RendererTextureSwap(Syntax):
     Represents when the texture handles for a double buffered texture should be swapped.
     This is not controlled directly by the user, but rather is populated automatically.
     """
+    __slots__ = ("texture",)
     many = "texture_swaps"
 
     def __init__(self, texture:Texture):
@@ -1018,6 +1252,7 @@ class RendererRegenFrameBuffer(Syntax):
     Might only be applicable to the OpenGL and WebGL backends.
     This is not controlled directly by the user, but rather is populated automatically.
     """
+    __slots__ = ("pipeline",)
     many = "regen_framebuffers"
 
     def __init__(self, pipeline:Pipeline):
@@ -1029,6 +1264,7 @@ class RendererNext(Syntax):
     """
     A command to switch to a different renderer after the current one finishes.
     """
+    __slots__ = ("name",)
     one = "next_renderer"
 
     def __init__(self, *args, **kargs):
@@ -1039,26 +1275,69 @@ class RendererNext(Syntax):
         Syntax.validate(self)
 
         # verify that such a renderer exists
-        if len([r for r in self.env.renderers if r.name == self.name]) == 0:
+        if not self.env.lookup(self.name).renderer:
             self.error(f'Unknown renderer: "{self.name}"')
 
 
 class RendererDispatch(Syntax):
     """
+    A compute dispatch.  The group counts are either given directly as
+    arithmetic expressions, or with "dispatch_over", derived from a texture's
+    dimensions and the compute shader's local size so that every texel is
+    covered exactly once.
     """
+    __slots__ = ("pipeline_name", "texture_name", "counts", "expr")
     many = "dispatches"
 
     def __init__(self, *args, **kargs):
         Syntax.__init__(self, *args, **kargs)
-        draw, self.pipeline_name = map(str, cast(TokenList, self.tokens)[:2])
-        self.size = [t.value for t in cast(TokenList, self.tokens[2:5])]
+        cmd, self.pipeline_name = map(str, cast(TokenList, self.tokens)[:2])
+        if cmd == "dispatch_over":
+            self.texture_name:Optional[str] = str(cast(TokenList, self.tokens)[2])
+            self.counts:List[ExpressionTree] = []
+        else:
+            self.texture_name = None
+            self.counts = [cast(ArithmeticExpression, c).expr for c in self.children if type(c) is ArithmeticExpression]
 
     def validate(self):
         Syntax.validate(self)
+        pipeline = self.env.lookup(self.pipeline_name).pipeline
+        if not pipeline:
+            self.error(f'Unknown pipeline: "{self.pipeline_name}"')
+        elif "cs" not in pipeline.shaders:
+            self.error(f'Pipeline "{self.pipeline_name}" can\'t be dispatched, because it doesn\'t have a compute shader.')
+        if self.texture_name is not None:
+            texture = self.texture
+            if not texture:
+                self.error(f'Unknown texture: "{self.texture_name}"')
+            elif texture.width is None:
+                self.error(f'Can\'t dispatch over texture "{self.texture_name}", because its dimensions aren\'t known.')
 
     @property
     def pipeline(self) -> Pipeline:
-        return self.env.pipelines[self.pipeline_name]
+        return CAST(Pipeline, self.env.lookup(self.pipeline_name).pipeline)
+
+    @property
+    def texture(self) -> Optional[Texture]:
+        if self.texture_name is None:
+            return None
+        return self.env.lookup(self.texture_name).texture
+
+    def group_counts(self, local_size:Tuple[int, int, int] = (1, 1, 1)) -> List[ExpressionTree]:
+        """
+        Returns the number of groups to dispatch along each axis, given the
+        compute shader's local size.
+        """
+        if self.texture_name is None:
+            return list(self.counts)
+        texture = CAST(Texture, self.texture)
+        error = lambda hint, token: self.error(hint)
+        counts:List[ExpressionTree] = []
+        for extent, local in zip((texture.width, texture.height, texture.depth), local_size):
+            if extent is None:
+                extent = 1
+            counts.append(UnfoldedExpression(self.tokens, error, "div_up", [extent, local]).fold())
+        return counts
 
     def __repr__(self):
         return f'<RendererDispatch {self.pipeline_name}>'
@@ -1068,6 +1347,7 @@ class Backend(Syntax):
     """
     The rendering API to generate code for.
     """
+    __slots__ = ("api",)
     one = "backend"
 
     def __init__(self, *args, **kargs):
@@ -1081,12 +1361,298 @@ class Backend(Syntax):
             self.error("Invalid backend API")
 
 
+class LiveUserVars(Syntax):
+    """
+    Names a file which the generated program shares its user vars through,
+    so that they may be changed by other programs while it runs.  The layout
+    of the file is described by a JSON schema written next to it.
+    """
+    __slots__ = ("path",)
+    one = "live_user_vars"
+
+    def __init__(self, *args, **kargs):
+        Syntax.__init__(self, *args, **kargs)
+        ignore, self.path = map(str, cast(TokenList, self.tokens))
+
+    def validate(self):
+        Syntax.validate(self)
+        if not self.path:
+            self.error("The live user var block needs a file path.")
+
+
+class Include(Syntax):
+    """
+    Names another source file, whose forms are validated as if they had been
+    written in place of this one.
+    """
+    __slots__ = ("path", "resolved")
+    many = "includes"
+
+    def __init__(self, *args, **kargs):
+        Syntax.__init__(self, *args, **kargs)
+        ignore, self.path = map(str, cast(TokenList, self.tokens))
+        self.resolved:Optional[str] = None
+
+    def __repr__(self):
+        return f'<Include "{self.path}">'
+
+
+# declarations which Program.prune may remove
+PRUNABLE = (Struct, Buffer, Format, Sampler, Texture, Pipeline)
+
+
+class Backbuffer:
+    """
+    Stands in for the backbuffer in the dependency graph, so that draws to it
+    keep their program order.
+    """
+    def __reduce__(self):
+        return "BACKBUFFER"
+
+    def __repr__(self):
+        return "<Backbuffer>"
+
+
+BACKBUFFER = Backbuffer()
+
+
+Step = Union[RendererUpdate, RendererDraw, RendererDispatch]
+Resource = Union[Texture, Buffer, Backbuffer]
+
+
+class DependencyGraph:
+    """
+    Records which renderer steps read and write which textures and buffers,
+    and which earlier steps each step must wait on because of it.  Steps
+    depend on each other only within a renderer, and only on steps that come
+    before them, so the graph is always acyclic.  This is built once after
+    the program is frozen.
+    """
+    def __init__(self, env:Program):
+        # step -> resources accessed
+        self.reads:Dict[Step, Tuple[Resource, ...]] = {}
+        self.writes:Dict[Step, Tuple[Resource, ...]] = {}
+        # resource -> steps accessing it, in program order
+        self.readers:Dict[Resource, List[Step]] = {}
+        self.writers:Dict[Resource, List[Step]] = {}
+        # step -> steps it must wait on, and steps which must wait on it
+        self.depends_on:Dict[Step, Tuple[Step, ...]] = {}
+        self.dependents:Dict[Step, List[Step]] = {}
+        # renderer name -> steps in program order
+        self.steps:Dict[str, Tuple[Step, ...]] = {}
+        self._levels:Dict[str, Tuple[Tuple[Step, ...], ...]] = {}
+        self._orders:Dict[str, Tuple[Step, ...]] = {}
+
+        for renderer in env.renderers:
+            steps = tuple([cast(Step, e) for e in renderer.children if type(e) in (RendererUpdate, RendererDraw, RendererDispatch)])
+            self.steps[renderer.name] = steps
+            last_writer:Dict[Resource, Step] = {}
+            recent_readers:Dict[Resource, List[Step]] = {}
+            for step in steps:
+                reads, writes = self.accesses(step)
+                self.reads[step] = reads
+                self.writes[step] = writes
+                self.dependents[step] = []
+
+                depends_on:List[Step] = []
+                for resource in reads:
+                    self.readers.setdefault(resource, []).append(step)
+                    # read after write
+                    if resource in last_writer:
+                        depends_on.append(last_writer[resource])
+                for resource in writes:
+                    self.writers.setdefault(resource, []).append(step)
+                    # write after write
+                    if resource in last_writer:
+                        depends_on.append(last_writer[resource])
+                    # write after read
+                    depends_on += recent_readers.get(resource, [])
+
+                depends_on = [d for d in dict.fromkeys(depends_on) if d is not step]
+                self.depends_on[step] = tuple(depends_on)
+                for dependency in depends_on:
+                    self.dependents[dependency].append(step)
+
+                for resource in writes:
+                    last_writer[resource] = step
+                    recent_readers[resource] = []
+                for resource in reads:
+                    if resource not in writes:
+                        recent_readers.setdefault(resource, []).append(step)
+
+    @staticmethod
+    def accesses(step:Step) -> Tuple[Tuple[Resource, ...], Tuple[Resource, ...]]:
+        """
+        Returns the resources the step reads, and the resources it writes.
+        Images are both read and written, draws without targets write to
+        BACKBUFFER, and dispatches over a texture read it.
+        """
+        if type(step) is RendererUpdate:
+            update = cast(RendererUpdate, step)
+            return (), (cast(Resource, update.texture or update.buffer),)
+        pipeline = cast(Union[RendererDraw, RendererDispatch], step).pipeline
+        reads:List[Resource] = [cast(Resource, i.texture or i.buffer) for i in pipeline.inputs]
+        writes:List[Resource] = [o.texture for o in pipeline.outputs]
+        if type(step) is RendererDraw and pipeline.uses_backbuffer:
+            writes.append(BACKBUFFER)
+        for sideput in pipeline.sideputs:
+            image = CAST(Texture, sideput.texture)
+            reads.append(image)
+            writes.append(image)
+        if type(step) is RendererDispatch and cast(RendererDispatch, step).texture_name is not None:
+            reads.append(CAST(Texture, cast(RendererDispatch, step).texture))
+        return tuple(dict.fromkeys(reads)), tuple(dict.fromkeys(writes))
+
+    def levels(self, renderer:str) -> Tuple[Tuple[Step, ...], ...]:
+        """
+        Returns the named renderer's steps grouped so that each step depends
+        only on steps in earlier groups.  Steps within a group don't depend on
+        each other, and keep their program order.
+        """
+        levels = self._levels.get(renderer)
+        if levels is None:
+            depth:Dict[Step, int] = {}
+            grouped:List[List[Step]] = []
+            for step in self.steps[renderer]:
+                level = max([depth[d] + 1 for d in self.depends_on[step]], default=0)
+                depth[step] = level
+                if level == len(grouped):
+                    grouped.append([])
+                grouped[level].append(step)
+            levels = self._levels[renderer] = tuple([tuple(group) for group in grouped])
+        return levels
+
+    def order(self, renderer:str) -> Tuple[Step, ...]:
+        """
+        Returns the named renderer's steps in a topological order, with
+        independent steps next to each other.
+        """
+        order = self._orders.get(renderer)
+        if order is None:
+            order = self._orders[renderer] = tuple([step for level in self.levels(renderer) for step in level])
+        return order
+
+    def __repr__(self):
+        return f'<DependencyGraph {len(self.depends_on)} steps, {len(set(self.readers) | set(self.writers))} resources>'
+
+
+class VariableDependencies:
+    """
+    Records which textures have dimensions that use each variable, which is
+    either one of the COMMON_VARS or a user var, and which pipelines'
+    framebuffers have to be rebuilt when those textures are reallocated.
+    This is built once after the program is frozen.
+    """
+    def __init__(self, env:Program):
+        # texture or pipeline -> variable names, in sorted order
+        self.texture_vars:Dict[Texture, Tuple[str, ...]] = {}
+        self.pipeline_vars:Dict[Pipeline, Tuple[str, ...]] = {}
+        # variable name -> textures or pipelines, in program order
+        self.textures:Dict[str, List[Texture]] = {}
+        self.pipelines:Dict[str, List[Pipeline]] = {}
+
+        for texture in env.textures.values():
+            names:Set[str] = set()
+            for dimension in texture.dimensions.values():
+                names |= expression_vars(dimension.value)
+            if names:
+                self.texture_vars[texture] = tuple(sorted(names))
+                for name in self.texture_vars[texture]:
+                    self.textures.setdefault(name, []).append(texture)
+
+        for pipeline in env.pipelines.values():
+            if pipeline.uses_backbuffer:
+                continue
+            names = set()
+            for texture in pipeline.all_target_textures:
+                names.update(self.texture_vars.get(texture, ()))
+            if names:
+                self.pipeline_vars[pipeline] = tuple(sorted(names))
+                for name in self.pipeline_vars[pipeline]:
+                    self.pipelines.setdefault(name, []).append(pipeline)
+
+    def affected(self, names:Iterable[str]) -> Tuple[List[Texture], List[Pipeline]]:
+        """
+        Returns the textures which need to be reallocated and the pipelines
+        which need their framebuffers rebuilt when any of the named variables
+        change, in program order.
+        """
+        names = set(names)
+        textures = [t for (t, uses) in self.texture_vars.items() if names.intersection(uses)]
+        pipelines = [p for (p, uses) in self.pipeline_vars.items() if names.intersection(uses)]
+        return textures, pipelines
+
+    @property
+    def user_vars(self) -> List[str]:
+        """
+        Returns the names of the user vars which the program's textures use.
+        """
+        return sorted([name for name in self.textures if name not in COMMON_VARS])
+
+    def __repr__(self):
+        return f'<VariableDependencies {len(self.textures)} variables, {len(self.texture_vars)} textures>'
+
+
+def nested_state(root:Syntax) -> List[Union[TokenList, UnfoldedExpression]]:
+    """
+    Returns every token list and unfolded expression in the syntax graph, with
+    each one coming after the ones nested in it.
+    """
+    order:List[Union[TokenList, UnfoldedExpression]] = []
+    seen:Set[int] = set()
+    seen_nodes:Set[int] = set()
+
+    def nested(item:Any) -> List[Any]:
+        if type(item) is TokenList:
+            return [t for t in item.tokens if type(t) is TokenList]
+        elif type(item) is UnfoldedExpression:
+            return [arg for arg in item.args if type(arg) is UnfoldedExpression]
+        return [value for value in item if type(value) in (TokenList, UnfoldedExpression)]
+
+    nodes:List[Syntax] = [root]
+    while nodes:
+        node = nodes.pop()
+        if id(node) in seen_nodes:
+            continue
+        seen_nodes.add(id(node))
+        nodes += node.children
+        for attr, kind in node._plan.visit:
+            group = getattr(node, attr)
+            if kind == "dict":
+                nodes += group.values()
+            elif kind == "one":
+                if group is not None:
+                    nodes.append(group)
+            else:
+                nodes += group
+        roots:List[Any] = []
+        for name in node._state_names:
+            value = getattr(node, name, None)
+            if type(value) in (TokenList, UnfoldedExpression):
+                roots.append(value)
+            elif type(value) in (list, tuple):
+                roots += nested(value)
+        stack:List[Tuple[Any, bool]] = [(root, False) for root in roots]
+        while stack:
+            item, expanded = stack.pop()
+            if expanded:
+                order.append(item)
+            elif id(item) not in seen:
+                seen.add(id(item))
+                stack.append((item, True))
+                stack += [(n, False) for n in nested(item)]
+    return order
+
+
 class Program(Syntax):
     """
     This is the syntax graph root, and represents everything within your program.
     """
+    __slots__ = ("frozen", "symbols", "_dependencies", "_variables", "backend", "live_user_vars", "includes", "user_vars", "structs", "buffers", "formats", "samplers", "textures", "pipelines", "renderers")
     many = "programs"
     backend:Backend
+    live_user_vars:LiveUserVars
+    includes:List[Include]
     user_vars:Dict[str,UserVar]
     structs:Dict[str,Struct]
     buffers:Dict[str,Buffer]
@@ -1106,9 +1672,183 @@ class Program(Syntax):
         return [self.textures[t] for t in texture_names]
 
     def __init__(self, error_handler:ErrorCallback, *args, **kargs):
+        self.frozen = False
+        self._dependencies:Optional[DependencyGraph] = None
+        self._variables:Optional[VariableDependencies] = None
         Syntax.__init__(self, None, *args, **kargs)
         self.set_env(self, error_handler)
         self.rewrite()
+        self.freeze()
         self.validate()
         for renderer in self.renderers:
             renderer.solve_implicit_steps()
+
+    def __getstate__(self):
+        # Pickling recurses once for each level of nesting, so the token lists
+        # and unfolded expressions are saved first, innermost first.  Each one
+        # then only refers to ones which have already been saved.
+        return {"_nested" : nested_state(self), **Syntax.__getstate__(self)}
+
+    def __setstate__(self, state):
+        state = dict(state)
+        del state["_nested"]
+        Syntax.__setstate__(self, state)
+
+    def freeze(self):
+        """
+        Assign each sampler, buffer, texture, and pipeline a dense handle in
+        declaration order, and build the symbol table.  Nothing may be added to
+        the program afterwards, since that would invalidate both.
+        """
+        for group in ("samplers", "buffers", "textures", "pipelines"):
+            resources = getattr(self, group)
+            for handle, resource in enumerate(resources.values()):
+                resource._handle = handle
+            setattr(self, group, FrozenDict(resources))
+
+        symbols:Dict[str, Symbol] = {}
+        def declare(kind:str, node:Syntax):
+            name = getattr(node, "name")
+            symbol = symbols.get(name)
+            if symbol is None:
+                symbol = symbols[name] = Symbol(name)
+            setattr(symbol, kind, node)
+        for kind, group in (("user_var", "user_vars"), ("struct", "structs"), ("buffer", "buffers"),
+                            ("format", "formats"), ("sampler", "samplers"), ("texture", "textures"),
+                            ("pipeline", "pipelines")):
+            for node in getattr(self, group).values():
+                declare(kind, node)
+        for renderer in self.renderers:
+            declare("renderer", renderer)
+        self.symbols = FrozenDict(symbols)
+        self.frozen = True
+
+    def lookup(self, name:str) -> Symbol:
+        """
+        Returns everything declared with the given name.  Names which haven't
+        been declared return a Symbol with all of its kinds set to None.  This
+        is only available once the program has been frozen.
+        """
+        assert(self.frozen)
+        return self.symbols.get(name, UNDECLARED)
+
+    def replace(self, children:List[Syntax], rebuilt:List[Syntax]):
+        """
+        Replace the program's top-level syntax with "children".  The ones in
+        "rebuilt" haven't been attached to a program yet, and are the only ones
+        which are rewritten and validated.  The rest must already belong to
+        this program, and nothing they depend on may have changed.
+        """
+        self.frozen = False
+        self._dependencies = None
+        self._variables = None
+        for child in rebuilt:
+            child.parent = self
+        self.children = children
+        self.populate(children)
+        error_callback = cast(ErrorCallback, self.error_callback)
+        for child in rebuilt:
+            child.set_env(self, error_callback)
+
+        fresh = set(rebuilt)
+        def dispatch(method_name:str):
+            # like Syntax.dispatch, but only for the rebuilt children
+            for attr, kind in self._plan.visit:
+                group = getattr(self, attr)
+                if kind == "dict":
+                    group = group.values()
+                elif kind == "one":
+                    group = (group,)
+                for child in group:
+                    if child in fresh:
+                        getattr(child, method_name)()
+        dispatch("rewrite")
+        self.freeze()
+        dispatch("validate")
+        for renderer in self.renderers:
+            if renderer in fresh:
+                renderer.solve_implicit_steps()
+
+    def prune(self) -> List[Syntax]:
+        """
+        Remove the structs, buffers, formats, samplers, textures, and pipelines
+        which none of the renderers use, either directly or through something
+        else that they use, and return what was removed in declaration order.
+        User vars are always kept, since user code may set them.  Programs
+        without renderers are left alone.
+        """
+        assert(self.frozen)
+        if not self.renderers:
+            return []
+
+        pipelines:List[Pipeline] = []
+        textures:List[Texture] = []
+        buffers:List[Buffer] = []
+        for renderer in self.renderers:
+            for update in renderer.updates:
+                if update.texture:
+                    textures.append(update.texture)
+                if update.buffer:
+                    buffers.append(update.buffer)
+            pipelines += [step.pipeline for step in renderer.draws]
+            pipelines += [step.pipeline for step in renderer.dispatches]
+            textures += [CAST(Texture, step.texture) for step in renderer.dispatches if step.texture_name is not None]
+
+        struct_names:List[str] = []
+        for pipeline in pipelines:
+            for binding in pipeline.inputs:
+                if binding.texture:
+                    textures.append(binding.texture)
+                if binding.buffer:
+                    buffers.append(binding.buffer)
+            textures += pipeline.all_target_textures
+            textures += [cast(Texture, s.texture) for s in pipeline.sideputs]
+            struct_names += [use.struct for use in pipeline.structs]
+        struct_names += [buffer.struct for buffer in buffers]
+
+        # structs may contain other structs
+        structs:Dict[str, Struct] = {}
+        while struct_names:
+            name = struct_names.pop()
+            if name not in structs:
+                struct = self.structs[name]
+                structs[name] = struct
+                struct_names += struct.referenced
+
+        formats = [texture.format for texture in textures]
+        samplers = [format.sampler for format in formats]
+
+        reachable = set(pipelines + textures + buffers + formats + samplers + list(structs.values()))
+        removed = [child for child in self.children if type(child) in PRUNABLE and child not in reachable]
+        if removed:
+            for group in ("structs", "buffers", "formats", "samplers", "textures", "pipelines"):
+                setattr(self, group, FrozenDict({name : node for (name, node) in getattr(self, group).items() if node in reachable}))
+            pruned = set(removed)
+            self.children = [child for child in self.children if child not in pruned]
+            self._dependencies = None
+            self._variables = None
+            self.freeze()
+        return removed
+
+    @property
+    def dependencies(self) -> DependencyGraph:
+        """
+        Returns the graph of which renderer steps read and write which
+        resources.  Backends should use this for anything that depends on
+        the order resources are accessed in.
+        """
+        if self._dependencies is None:
+            assert(self.frozen)
+            self._dependencies = DependencyGraph(self)
+        return self._dependencies
+
+    @property
+    def variables(self) -> VariableDependencies:
+        """
+        Returns which textures and framebuffers depend on each variable, so
+        backends only need to reallocate the ones affected by a change.
+        """
+        if self._variables is None:
+            assert(self.frozen)
+            self._variables = VariableDependencies(self)
+        return self._variables
@@ -32,6 +32,14 @@ def binary_op(fn:BinaryOperator) -> BinaryOperator:
     return fn
 
 
+def fixed_op(arity:int) -> Callable[[Callable], Callable]:
+    def tag(fn:Callable) -> Callable:
+        setattr(fn, "tag", "fixed")
+        setattr(fn, "arity", arity)
+        return fn
+    return tag
+
+
 class ArithmeticError(Exception):
     pass
 
@@ -40,6 +48,24 @@ def is_even(n:Union[int, float]) -> bool:
     return (n % 2) == 0
 
 
+def is_number(value:Any) -> bool:
+    return type(value) in (int, float)
+
+
+# operators whose arguments can be reordered and regrouped freely
+COMMUTATIVE_OPS = ("add", "mul", "min", "max")
+
+
+# argument values which can be dropped after the first argument
+IDENTITY_ARGS = \
+{
+    "add" : 0,
+    "sub" : 0,
+    "mul" : 1,
+    "div" : 1,
+}
+
+
 class UnfoldedExpression:
     """
     Represents a (potentially foldable) unfolded arithmetic expression, which
@@ -52,9 +78,18 @@ class UnfoldedExpression:
         self.args = args
         self.rewrite()
 
+    def __getstate__(self):
+        # the error callback is only used while folding, and may be a closure
+        state = self.__dict__.copy()
+        state["_error"] = None
+        return state
+
     def __repr__(self):
         return f'<UnfoldedExpression ({self.cmd} {" ".join(map(repr, self.args))})>'
 
+    def error(self, hint:str):
+        self._error(hint, self._token)
+
     def rewrite(self):
         if self.cmd == "mad":
             # Rewrites mads in the form of (add (mul a b) (mul c d) e) to make
@@ -67,8 +102,8 @@ class UnfoldedExpression:
             self.args = [UnfoldedExpression(self._token, self._error, "mul", pair).fold() for pair in zip(evens, odds)] + [last]
             self.cmd = "add"
 
-        if self.cmd == "div" and len(self.args) > 2:
-            # Rewrites divs in the form of (div num num (mul pivot etc etc etc))
+        if self.cmd in ("sub", "div") and len(self.args) > 2:
+            # Rewrites subs and divs in the form of (div num num (mul pivot etc etc etc))
             # so everything can be folded instead of just the beginning.
             pivot = 0
             for arg in self.args:
@@ -79,12 +114,24 @@ class UnfoldedExpression:
             pivot = max(pivot, 1)
             keep = self.args[:pivot]
             rewrite = self.args[pivot:]
-            if rewrite:
-                self.args = keep + [UnfoldedExpression(self._token, self._error, "mul", rewrite).fold()]
+            if len(rewrite) > 1:
+                inverse = "add" if self.cmd == "sub" else "mul"
+                self.args = keep + [UnfoldedExpression(self._token, self._error, inverse, rewrite).fold()]
+
+        if self.cmd in COMMUTATIVE_OPS:
+            # Splices in the arguments of nested expressions using the same
+            # operator, so (add (add a 1) 2) can be folded into (add a 3).
+            flattened = []
+            for arg in self.args:
+                if type(arg) is UnfoldedExpression and arg.cmd == self.cmd:
+                    flattened += arg.args
+                else:
+                    flattened.append(arg)
+            self.args = flattened
 
     def fold_binary_op(self, fn):
         if len(self.args) < 2:
-            self.error(f'Arithmetic operation "{self.cmd}" expects at least {min_args} parameters, got {len(self.args)}.')
+            self.error(f'Arithmetic operation "{self.cmd}" expects at least 2 parameters, got {len(self.args)}.')
         new_args = []
         acc = None
         for arg in self.args:
@@ -104,16 +151,33 @@ class UnfoldedExpression:
             if acc is not None:
                 new_args.append(acc)
             self.args = new_args
-            return self
+            return self.simplify()
         else:
             assert(acc is not None)
             return acc
 
+    def simplify(self):
+        """
+        Drops arguments which don't change the result, like adding zero or
+        multiplying by one, and collapses multiplying by zero.  Returns what is
+        left, which may no longer be an UnfoldedExpression.
+        """
+        if self.cmd == "mul" and 0 in [a for a in self.args if is_number(a)]:
+            return 0
+        identity = IDENTITY_ARGS.get(self.cmd)
+        if identity is not None:
+            first = 0 if self.cmd in COMMUTATIVE_OPS else 1
+            self.args = self.args[:first] + [a for a in self.args[first:] if not (is_number(a) and a == identity)]
+        if len(self.args) == 1:
+            return self.args[0]
+        return self
+
     def fold_fixed_op(self, fn):
+        self.fixed(getattr(fn, "arity"))
         if [i for i in self.args if not type(i) in (int, float)]:
             return self
         else:
-            return fn()
+            return fn(*self.args)
 
     def fold(self):
         try:
@@ -126,7 +190,7 @@ class UnfoldedExpression:
             return self.fold_fixed_op(fn)
 
     def fixed(self, expected):
-        if len(self.args) < expected:
+        if len(self.args) != expected:
             self.error(f'Arithmetic operation "{self.cmd}" expects exactly {expected} parameters, got {len(self.args)}.')
 
     @binary_op
@@ -153,47 +217,206 @@ class UnfoldedExpression:
     def op_max(self, a:Number, b:Number) -> Number:
         return max(a, b)
 
-    def op_sin(self):
-        self.fixed(1)
-        return math.sin(*self.args)
-
-    def op_cos(self):
-        self.fixed(1)
-        return math.cos(*self.args)
-
-    def op_tan(self):
-        self.fixed(1)
-        return math.tan(*self.args)
+    @fixed_op(1)
+    def op_sin(self, a:Number) -> Number:
+        return math.sin(a)
+
+    @fixed_op(1)
+    def op_cos(self, a:Number) -> Number:
+        return math.cos(a)
+
+    @fixed_op(1)
+    def op_tan(self, a:Number) -> Number:
+        return math.tan(a)
+
+    @fixed_op(1)
+    def op_floor(self, a:Number) -> int:
+        return math.floor(a)
+
+    @fixed_op(1)
+    def op_ceil(self, a:Number) -> int:
+        return math.ceil(a)
+
+    @fixed_op(2)
+    def op_pow(self, a:Number, b:Number) -> Number:
+        return a ** b
+
+    @fixed_op(1)
+    def op_log2(self, a:Number) -> float:
+        if a <= 0:
+            self.error(f'Arithmetic operation "{self.cmd}" expects a positive parameter, got {a}.')
+        return math.log2(a)
+
+    @fixed_op(3)
+    def op_clamp(self, a:Number, low:Number, high:Number) -> Number:
+        return min(max(a, low), high)
+
+    @fixed_op(2)
+    def op_div_up(self, a:Number, b:Number) -> Number:
+        """
+        Division rounded up, such as for the number of groups needed to cover a
+        number of items.
+        """
+        if b == 0:
+            self.error(f'Arithmetic operation "{self.cmd}" divides by zero.')
+        if type(a) is int and type(b) is int:
+            return -(-a // b)
+        return math.ceil(a / b)
+
+    @fixed_op(2)
+    def op_mod(self, a:Number, b:Number) -> Number:
+        """
+        The remainder has the same sign as the divisor.
+        """
+        if b == 0:
+            self.error(f'Arithmetic operation "{self.cmd}" divides by zero.')
+        return a % b
 
 
 def fold(token:Token, error:ErrorCallback) -> Union[FoldedExpression, UnfoldedExpression]:
     """
-    Recursively attempts to fold an arithmetic expression represented by a tree of tokens.
+    Attempts to fold an arithmetic expression represented by a tree of tokens.
     Returns either a numeric value, a string, or an UnfoldedExpression instance.
+    The tree is walked with an explicit stack, so deeply nested expressions
+    don't run into the recursion limit.
     """
 
-    if type(token) is TokenNumber:
-        return cast(TokenNumber, token).value
-
-    elif type(token) is TokenWord:
-        name = str(token)
-        if name == "pi":
-            return math.pi
+    def fold_atom(token:Token) -> FoldedExpression:
+        if type(token) is TokenNumber:
+            return cast(TokenNumber, token).value
+        elif type(token) is TokenWord:
+            name = str(token)
+            if name == "pi":
+                return math.pi
+            else:
+                return name
         else:
-            return name
-
-    elif type(token) is TokenList:
-        tokens = cast(TokenList, token)
-        if tokens.is_nil():
-            error("TokenList is empty.", tokens)
-
-        cmd = cast(Token, tokens[0])
-        if type(cmd) is not TokenWord:
-            error("Expected TokenWord", cmd)
-        args = [fold(t, error) for t in cast(Tuple[Token], tokens[1:])]
-        expr = UnfoldedExpression(token, error, str(cmd), args)
-        return expr.fold()
-
-    else:
-        error("Expected TokenNumber, TokenWord, or TokenList.", token)
-        return ""
+            error("Expected TokenNumber, TokenWord, or TokenList.", token)
+            return ""
+
+    if type(token) is not TokenList:
+        return fold_atom(token)
+
+    # each frame is a list of tokens, and the folded values of its arguments so far
+    stack:List[Tuple[TokenList, List[Any]]] = []
+    folded:Any = None
+    pending:Optional[TokenList] = cast(TokenList, token)
+    while True:
+        if pending is not None:
+            tokens = pending
+            pending = None
+            if tokens.is_nil():
+                error("TokenList is empty.", tokens)
+            cmd = cast(Token, tokens[0])
+            if type(cmd) is not TokenWord:
+                error("Expected TokenWord", cmd)
+            stack.append((tokens, []))
+        else:
+            tokens, args = stack[-1]
+            args.append(folded)
+
+        tokens, args = stack[-1]
+        while len(args) + 1 < len(tokens):
+            arg = cast(Token, tokens[len(args) + 1])
+            if type(arg) is TokenList:
+                pending = cast(TokenList, arg)
+                break
+            args.append(fold_atom(arg))
+        if pending is not None:
+            continue
+
+        stack.pop()
+        folded = UnfoldedExpression(tokens, error, str(tokens[0]), args).fold()
+        if not stack:
+            return folded
+
+
+def expression_key(expr:Any, keys:Optional[Dict[int, str]] = None) -> str:
+    """
+    Returns a string which is the same for equivalent expressions, treating the
+    arguments of commutative operators as unordered.  Keys for unfolded
+    expressions are saved in "keys" by id, if provided.
+    """
+    if keys is None:
+        keys = {}
+    if type(expr) is not UnfoldedExpression:
+        return repr(expr)
+    stack = [expr]
+    while stack:
+        top = stack[-1]
+        if id(top) in keys:
+            stack.pop()
+            continue
+        missing = [a for a in top.args if type(a) is UnfoldedExpression and id(a) not in keys]
+        if missing:
+            stack += missing
+            continue
+        stack.pop()
+        arg_keys = [keys[id(a)] if type(a) is UnfoldedExpression else repr(a) for a in top.args]
+        if top.cmd in COMMUTATIVE_OPS:
+            arg_keys.sort()
+        keys[id(top)] = f'({top.cmd} {" ".join(arg_keys)})'
+    return keys[id(expr)]
+
+
+def expression_vars(expr:Any) -> Set[str]:
+    """
+    Returns the names of the variables used by an expression.
+    """
+    found:Set[str] = set()
+    stack = [expr]
+    while stack:
+        top = stack.pop()
+        if type(top) is str:
+            found.add(top)
+        elif type(top) is UnfoldedExpression:
+            stack += top.args
+    return found
+
+
+class SharedExpressions:
+    """
+    Finds the unfolded subexpressions which appear more than once among a group
+    of expressions, so that backends can compute each of them once in a
+    temporary variable.  Subexpressions are only counted outside of other
+    repeated subexpressions.
+    """
+    def __init__(self, exprs:Iterable[Any], prefix:str = "SharedExpr"):
+        self._keys:Dict[int, str] = {}
+        counts:Dict[str, int] = {}
+        firsts:Dict[str, UnfoldedExpression] = {}
+        # first occurrences, with each coming after its own subexpressions
+        order:List[str] = []
+        for expr in exprs:
+            if type(expr) is not UnfoldedExpression:
+                continue
+            stack:List[Tuple[UnfoldedExpression, bool]] = [(expr, False)]
+            while stack:
+                node, visited = stack.pop()
+                key = expression_key(node, self._keys)
+                if visited:
+                    order.append(key)
+                    continue
+                counts[key] = counts.get(key, 0) + 1
+                if counts[key] == 1:
+                    firsts[key] = node
+                    stack.append((node, True))
+                    stack += [(a, False) for a in reversed(node.args) if type(a) is UnfoldedExpression]
+
+        # the temporary variable name for each shared key
+        self.names:Dict[str, str] = {}
+        # (name, expression) for each temporary, in the order they should be defined
+        self.temporaries:List[Tuple[str, UnfoldedExpression]] = []
+        for key in order:
+            if counts[key] > 1:
+                name = f"{prefix}{len(self.temporaries)}"
+                self.names[key] = name
+                self.temporaries.append((name, firsts[key]))
+
+    def name(self, expr:Any) -> Optional[str]:
+        """
+        Returns the temporary holding the given expression, if there is one.
+        """
+        if type(expr) is not UnfoldedExpression or not self.names:
+            return None
+        return self.names.get(expression_key(expr, self._keys))
@@ -0,0 +1,91 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys
+import time
+from typing import *
+from .parser import Parser
+
+
+SAMPLE_FORMS = """
+; generated texture {index}
+(texture Texture{index} ColorFormat
+	(width (mul ScreenWidth 0.5))
+	(height (div ScreenHeight 2)))
+(pipeline Pipeline{index}
+	(vs "shaders/splat.vs.glsl")
+	(fs 'shaders/fnord{index}.fs.glsl')
+	(in WindowParams)
+	(out Texture{index}))
+"""
+
+
+DEFAULT_SIZES = \
+(
+    10 * 1024,
+    100 * 1024,
+    1024 * 1024,
+    10 * 1024 * 1024,
+)
+
+
+def synthesize(size:int) -> str:
+    """
+    Generate a syntactically valid program that is at least "size" bytes long.
+    """
+    chunks:List[str] = []
+    length = 0
+    index = 0
+    while length < size:
+        chunk = SAMPLE_FORMS.format(index=index)
+        chunks.append(chunk)
+        length += len(chunk)
+        index += 1
+    return "".join(chunks)
+
+
+def measure(source:str, method:str = "parse") -> float:
+    """
+    Returns how many seconds it takes to tokenize the provided source with
+    the named Parser method.
+    """
+    parser = Parser()
+    parser.reset(source)
+    start = time.perf_counter()
+    getattr(parser, method)()
+    return time.perf_counter() - start
+
+
+def run(sizes:Sequence[int] = DEFAULT_SIZES):
+    """
+    Print the parse time for each input size.  The time per KiB column should
+    stay roughly flat as the input grows if parsing is linear.  The last
+    column compares against the character-at-a-time parser.
+    """
+    print(f"{'bytes':>12} {'seconds':>10} {'us/KiB':>10} {'by char':>10}")
+    for size in sizes:
+        source = synthesize(size)
+        elapsed = measure(source)
+        by_char = measure(source, "parse_by_char")
+        per_kib = elapsed * 1000000 / (len(source) / 1024)
+        print(f"{len(source):>12} {elapsed:>10.3f} {per_kib:>10.1f} {by_char / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run([int(arg) for arg in sys.argv[1:]])
+    else:
+        run()
@@ -0,0 +1,108 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys
+import time
+import tracemalloc
+from typing import *
+from .parser import Parser
+from .grammar import *
+
+
+PROLOGUE = """
+(backend OpenGL)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Texture0 ColorFormat (width ScreenWidth) (height ScreenHeight))
+"""
+
+
+UNIT_FORMS = """
+(texture Texture{next} ColorFormat
+    (width (mul ScreenWidth 0.5))
+    (height ScreenHeight))
+(pipeline Pipeline{index}
+    (vs "splat.vs.glsl")
+    (fs "fnord.fs.glsl")
+    (in Texture{index})
+    (out Texture{next}))
+"""
+
+
+# syntax nodes created for each unit, counting the draw call added to the renderer
+UNIT_NODES = 12
+
+
+def synthesize(nodes:int) -> str:
+    """
+    Generate a valid program which will have at least "nodes" syntax objects.
+    """
+    units = nodes // UNIT_NODES + 1
+    forms = [PROLOGUE]
+    draws = []
+    for index in range(units):
+        forms.append(UNIT_FORMS.format(index=index, next=index + 1))
+        draws.append(f"    (draw Pipeline{index} 3)")
+    forms.append("(renderer SomeRenderer\n" + "\n".join(draws) + ")\n")
+    return "".join(forms)
+
+
+def count(node:Syntax) -> int:
+    return 1 + sum([count(child) for child in node.children])
+
+
+def measure(source:str, trace:bool = False) -> Tuple[int, float, float, int]:
+    """
+    Returns the node count, the seconds spent in the grammar, the seconds
+    spent building the Program, and the peak memory use in bytes if "trace"
+    is set.  Tracing memory slows everything down, so the times are only
+    useful when it isn't.
+    """
+    parser = Parser(keep_comments=False)
+    parser.reset(source)
+    forms = parser.parse()
+    def error_handler(hint:str, token:Token, ErrorType=GrammarError, **kargs):
+        raise ErrorType(parser.message(hint, *token.pos(), *token.pos()))
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    children = [cast(Syntax, GRAMMAR.validate(form, error_handler)) for form in forms]
+    middle = time.perf_counter()
+    env = Program(error_handler, children, GRAMMAR.constructors())
+    stop = time.perf_counter()
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return count(env), middle - start, stop - middle, peak
+
+
+def run(nodes:int = 100000):
+    source = synthesize(nodes)
+    nodes, grammar, program, ignore = measure(source)
+    ignore, ignore, ignore, peak = measure(source, trace=True)
+    print(f"{nodes} nodes")
+    print(f"grammar: {grammar:.3f}s")
+    print(f"program: {program:.3f}s")
+    print(f"peak memory: {peak / (1024 * 1024):.1f} MiB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
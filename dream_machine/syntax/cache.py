@@ -0,0 +1,111 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import glob
+import pickle
+from hashlib import sha256
+from typing import *
+from .. import __version__
+from .grammar import *
+
+
+CACHE_DIR = ".dream_machine_cache"
+
+
+_fingerprint:Optional[str] = None
+
+
+def fingerprint() -> str:
+    """
+    Hash of the dream_machine version and the syntax package's sources, so
+    cached programs are dropped whenever the code that built them changes.
+    """
+    global _fingerprint
+    if _fingerprint is None:
+        digest = sha256(__version__.encode("utf-8"))
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+            with open(path, "rb") as src:
+                digest.update(src.read())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+# number of characters hashed at a time, so sources are never read whole
+CHUNK_SIZE = 65536
+
+
+def cache_path(parser:Parser, cache_dir:str = CACHE_DIR) -> str:
+    digest = sha256(fingerprint().encode("utf-8"))
+    digest.update(str(parser.keep_comments).encode("utf-8"))
+    # includes and error messages are resolved against the source's location
+    digest.update(os.path.abspath(parser.path).encode("utf-8") if parser.path else b"")
+    digest.update(b"\0")
+    for chunk in parser.read_chunks(CHUNK_SIZE):
+        digest.update(chunk.encode("utf-8"))
+    return os.path.join(cache_dir, digest.hexdigest() + ".pickle")
+
+
+def includes_unchanged(digests:Dict[str, str]) -> bool:
+    """
+    Check that every file included by a cached program still has the same
+    contents.
+    """
+    for path, digest in digests.items():
+        found = sha256()
+        try:
+            with open(path, "r") as src:
+                chunk = src.read(CHUNK_SIZE)
+                while chunk:
+                    found.update(chunk.encode("utf-8"))
+                    chunk = src.read(CHUNK_SIZE)
+        except OSError:
+            return False
+        if found.hexdigest() != digest:
+            return False
+    return True
+
+
+def cached_validate(parser:Parser, cache_dir:str = CACHE_DIR, verbose:bool = False, jobs:int = 1) -> Program:
+    """
+    Like grammar.validate, but the validated program is saved under
+    "cache_dir", keyed by a hash of the source text.  If the source and the
+    files it includes haven't changed since the last run, the saved program
+    is loaded instead.
+    """
+    path = cache_path(parser, cache_dir)
+    if os.path.isfile(path):
+        try:
+            with open(path, "rb") as cached:
+                digests, env = pickle.load(cached)
+            if includes_unchanged(digests):
+                if verbose:
+                    print(f"Syntax cache hit for \"{parser.path}\": {path}")
+                return env
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+            # truncated or from an incompatible build, so just replace it
+            if verbose:
+                print(f"Syntax cache entry \"{path}\" is unreadable, replacing it: {error!r}")
+    if verbose:
+        print(f"Syntax cache miss for \"{parser.path}\": {path}")
+    loader = IncludeLoader(parser, jobs)
+    env = validate(parser, loader)
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = f"{path}.{os.getpid()}"
+    with open(partial, "wb") as cached:
+        pickle.dump((loader.digests, env), cached, pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, path)
+    return env
@@ -115,3 +115,67 @@ DEPTH_TEXTURE_FORMATS = \
 
 
 COLOR_TEXTURE_FORMATS = [f for f in TextureFormats if f not in DEPTH_TEXTURE_FORMATS]
+
+
+# the number of bits used to store one texel of each format
+TEXEL_BITS = \
+{
+    TextureFormats.RGBA_32_FLOAT : 128,
+    TextureFormats.RGBA_32_UINT : 128,
+    TextureFormats.RGBA_32_SINT : 128,
+
+    TextureFormats.RGB_32_FLOAT : 96,
+    TextureFormats.RGB_32_UINT : 96,
+    TextureFormats.RGB_32_SINT : 96,
+
+    TextureFormats.RGBA_16_FLOAT : 64,
+    TextureFormats.RGBA_16_UNORM : 64,
+    TextureFormats.RGBA_16_UINT : 64,
+    TextureFormats.RGBA_16_SNORM : 64,
+    TextureFormats.RGBA_16_SINT : 64,
+
+    TextureFormats.RG_32_FLOAT : 64,
+    TextureFormats.RG_32_UINT : 64,
+    TextureFormats.RG_32_SINT : 64,
+
+    TextureFormats.RGB_10_A_2_UNORM : 32,
+    TextureFormats.RGB_10_A_2_UINT : 32,
+
+    TextureFormats.RG_11_B_10_FLOAT : 32,
+
+    TextureFormats.RGBA_8_UNORM : 32,
+    TextureFormats.RGBA_8_UNORM_SRGB : 32,
+    TextureFormats.RGBA_8_UINT : 32,
+    TextureFormats.RGBA_8_SNORM : 32,
+    TextureFormats.RGBA_8_SINT : 32,
+
+    TextureFormats.RG_16_FLOAT : 32,
+    TextureFormats.RG_16_UNORM : 32,
+    TextureFormats.RG_16_UINT : 32,
+    TextureFormats.RG_16_SNORM : 32,
+    TextureFormats.RG_16_SINT : 32,
+
+    TextureFormats.D_32_FLOAT : 32,
+    TextureFormats.R_32_FLOAT : 32,
+    TextureFormats.R_32_UINT : 32,
+    TextureFormats.R_32_SINT : 32,
+
+    TextureFormats.RG_8_UNORM : 16,
+    TextureFormats.RG_8_UINT : 16,
+    TextureFormats.RG_8_SNORM : 16,
+    TextureFormats.RG_8_SINT : 16,
+
+    TextureFormats.R_16_FLOAT : 16,
+    TextureFormats.D_16_UNORM : 16,
+    TextureFormats.R_16_UNORM : 16,
+    TextureFormats.R_16_UINT : 16,
+    TextureFormats.R_16_SNORM : 16,
+    TextureFormats.R_16_SINT : 16,
+
+    TextureFormats.R_8_UNORM : 8,
+    TextureFormats.R_8_UINT : 8,
+    TextureFormats.R_8_SNORM : 8,
+    TextureFormats.R_8_SINT : 8,
+    TextureFormats.A_8_UNORM : 8,
+    TextureFormats.R_1_UNORM : 1,
+}
@@ -0,0 +1,131 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from hashlib import sha256
+from typing import *
+from .tokens import *
+from .abstract import Syntax
+
+
+# each step is the name of the group a node is in, and its key within that group
+Identity = Tuple[Tuple[str, Any], ...]
+
+
+def atom(token:Token) -> Tuple[str, Any]:
+    if type(token) is TokenWord:
+        return ("word", cast(TokenWord, token).word)
+    elif type(token) is TokenNumber:
+        return ("number", cast(TokenNumber, token).value)
+    elif type(token) is TokenString:
+        return ("string", cast(TokenString, token).text)
+    assert(False)
+
+
+def children(node:Syntax) -> Iterator[Tuple[str, Any, Syntax]]:
+    """
+    Yields the group, key, and node of each child as they were placed after the
+    program was rewritten, so copied pipeline commands and shadow targets are
+    included.  Implicit renderer steps aren't, since they only follow from
+    other nodes.  Children are keyed by their primary key, or their name, or
+    else their position in the group.
+    """
+    for attr, kind in node._plan.visit:
+        group = getattr(node, attr)
+        if kind == "dict":
+            for key, child in group.items():
+                yield attr, key, child
+        elif kind == "one":
+            if group is not None and group.tokens is not None:
+                yield attr, None, group
+        else:
+            seen:Set[Any] = set()
+            index = 0
+            for child in group:
+                if child.tokens is None:
+                    continue
+                key = getattr(child, "name", index)
+                if key in seen:
+                    key = (key, index)
+                seen.add(key)
+                index += 1
+                yield attr, key, child
+
+
+class SyntaxDiff:
+    """
+    The semantic differences between two syntax graphs, usually two versions of
+    the same program.  Formatting and comments are ignored.  Each difference is
+    reported as the path of group names and keys leading to the node, which
+    stays the same between versions.  When a node is modified, the differences
+    within it are reported as well.
+    """
+    def __init__(self, old:Syntax, new:Syntax):
+        self.added:List[Identity] = []
+        self.removed:List[Identity] = []
+        self.modified:List[Identity] = []
+        self._digests:Dict[int, str] = {}
+        self.compare(old, new, ())
+
+    def digest(self, node:Syntax) -> str:
+        """
+        Hash of the node's tokens and children, ignoring comments and where the
+        tokens were in the source.
+        """
+        found = self._digests.get(id(node))
+        if found is None:
+            placed = list(children(node))
+            child_tokens = set([id(child.tokens) for (attr, key, child) in placed])
+            def walk(token:Token) -> Any:
+                if type(token) is TokenList:
+                    if id(token) in child_tokens:
+                        return None
+                    return tuple([walk(t) for t in cast(TokenList, token).tokens if type(t) is not TokenComment])
+                return atom(token)
+            own = walk(node.tokens) if node.tokens is not None else None
+            placed_digests = [(attr, key, self.digest(child)) for (attr, key, child) in placed]
+            found = sha256(repr((type(node).__name__, own, placed_digests)).encode("utf-8")).hexdigest()
+            self._digests[id(node)] = found
+        return found
+
+    def compare(self, old:Syntax, new:Syntax, path:Identity):
+        old_children = {(attr, key) : child for (attr, key, child) in children(old)}
+        new_children = {(attr, key) : child for (attr, key, child) in children(new)}
+        for step, child in old_children.items():
+            if step not in new_children:
+                self.removed.append(path + (step,))
+        for step, child in new_children.items():
+            if step not in old_children:
+                self.added.append(path + (step,))
+            elif type(child) is not type(old_children[step]):
+                self.removed.append(path + (step,))
+                self.added.append(path + (step,))
+            elif self.digest(child) != self.digest(old_children[step]):
+                self.modified.append(path + (step,))
+                self.compare(old_children[step], child, path + (step,))
+
+    def changed(self, group:str) -> List[Any]:
+        """
+        Returns the keys of the top level nodes in the named group, such as
+        "pipelines" or "user_vars", which were added, removed, or modified.
+        """
+        found = [path[0][1] for path in self.added + self.removed + self.modified if path[0][0] == group]
+        return list(dict.fromkeys(found))
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def __repr__(self):
+        return f'<SyntaxDiff {len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified>'
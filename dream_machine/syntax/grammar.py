@@ -14,7 +14,12 @@
 # limitations under the License.
 
 
+import os
 import re
+import itertools
+from collections import deque
+from hashlib import sha256
+from concurrent.futures import ProcessPoolExecutor
 from .abstract import *
 from .rules import *
 
@@ -26,6 +31,13 @@ def MatchSplat(pattern, fnord=False):
 META_BACKEND_RULE = \
     ListRule(Backend, Exactly("backend"), WordRule("name"))
 
+META_LIVE_USER_VARS_RULE = \
+    ListRule(LiveUserVars, Exactly("live_user_vars"), StringRule("path"))
+
+
+INCLUDE_RULE = \
+    ListRule(Include, Exactly("include"), StringRule("source path"))
+
 
 STRUCT_MEMBER_ARRAY_RULE = \
     ListRule(StructMember, WordRule("name"), Exactly("array"), NumberRule("array size"), WordRule("type"))
@@ -46,6 +58,10 @@ FORMAT_RULE = \
 USER_VAR_RULE = \
     ListRule(UserVar, Exactly("uservar"), WordRule("ctype"), WordRule("name"), ArithmeticRule("value"))
 
+SPECIALIZED_USER_VAR_RULE = \
+    ListRule(UserVar, Exactly("specialize"), WordRule("ctype"), WordRule("name"), ArithmeticRule("value"),
+             SPLAT = NumberRule("specialized value"))
+
 
 SAMPLER_MIN_RULE = ListRule(SamplerFilter, Exactly("min"), WordRule("opengl filter enum"))
 
@@ -104,16 +120,21 @@ RENDERER_DRAW_RULE = ListRule(RendererDraw, Exactly("draw"), WordRule("pipeline
 
 RENDERER_DISPATCH_RULE = ListRule(RendererDispatch, Exactly("dispatch"), WordRule("pipeline name"), ArithmeticRule("x"), ArithmeticRule("y"), ArithmeticRule("z"))
 
+RENDERER_DISPATCH_OVER_RULE = ListRule(RendererDispatch, Exactly("dispatch_over"), WordRule("pipeline name"), WordRule("texture name"))
+
 RENDERER_NEXT_RULE = ListRule(RendererNext, Exactly("next"), WordRule("renderer name"))
 
 RENDERER_RULE = \
     ListRule(Renderer, Exactly("renderer"), WordRule("renderer name"),
-             SPLAT = MatchSplat(r'RENDERER_[A-Z]+?_RULE'))
+             SPLAT = MatchSplat(r'RENDERER_[A-Z_]+?_RULE'))
 
 
 GRAMMAR = MatchRule(
     META_BACKEND_RULE,
+    META_LIVE_USER_VARS_RULE,
+    INCLUDE_RULE,
     USER_VAR_RULE,
+    SPECIALIZED_USER_VAR_RULE,
     STRUCT_RULE,
     BUFFER_RULE,
     FORMAT_RULE,
@@ -131,24 +152,403 @@ class ValidationError(Exception):
     pass
 
 
-def validate(parser:Parser):
+def parse_include(path:str, raw:str, keep_comments:bool) -> Tuple[Token, ...]:
     """
-    Validate the program's tokens against the grammar tree, and then return the
-    abstract syntax tree.
+    Tokenize an included source file.  This runs on IncludeLoader's process pool.
     """
+    parser = Parser(keep_comments)
+    parser.open(path)
+    parser.reset(raw)
+    return parser.parse()
 
+
+class FormError(Exception):
+    """
+    Carries a grammar error out of validate_chunk, so that it can be reported
+    with the right source file once it reaches the main process.
+    """
+    def __init__(self, hint:str, token:Token):
+        Exception.__init__(self, hint, token)
+        self.hint = hint
+        self.token = token
+
+
+def validate_chunk(forms:Sequence[Token]) -> Tuple[List[Optional[Syntax]], Optional[FormError]]:
+    """
+    Validate a run of top-level forms.  This runs on IncludeLoader's process
+    pool.  Returns the syntax for each form up to the first error, and the
+    error if there was one.
+    """
     def error_handler(hint:str, token:Token, ErrorType=GrammarError):
-        message = parser.message(hint, *token.pos(), *token.pos())
-        raise ErrorType(message)
+        raise FormError(hint, token)
+
+    validated:List[Optional[Syntax]] = []
+    try:
+        for token in forms:
+            if type(token) is TokenComment:
+                validated.append(None)
+            else:
+                validated.append(GRAMMAR.validate(token, error_handler))
+    except FormError as error:
+        return validated, error
+    return validated, None
 
-    def validation_error(hint:str, token:Token):
-        error_handler(hint, token, ValidationError)
 
-    tokens = parser.parse()
+class IncludeLoader:
+    """
+    Validates top-level forms, and expands include forms into the forms of the
+    files they name.
+
+    Included paths are relative to the including file, and each file is only
+    included once.  An include which names a file that is still being expanded
+    is reported as a cycle.  When "jobs" is more than one and a file includes
+    several others, they are tokenized concurrently on a process pool.  The
+    tokens of the last "token_cache_size" included files are cached by a hash
+    of their contents, so revalidating with the same loader doesn't parse
+    unchanged files again.
+
+    When "jobs" is more than one, sources with more than "chunk_size"
+    top-level forms are validated in chunks on that many worker processes.
+    The results are merged in source order, and the first error in source
+    order is the one reported.  Syntax objects are expensive to send between
+    processes, so this only pays off with several cores to spare.
+    """
+    token_cache_size = 64
+    chunk_size = 1024
+
+    def __init__(self, parser:Parser, jobs:int = 1):
+        self.parser = parser
+        self.jobs = jobs
+        # (content hash, keep_comments) -> tokens, least recently used first
+        self.token_cache:Dict[Tuple[str, bool], Tuple[Token, ...]] = {}
+        self.root = os.path.abspath(parser.path) if parser.path else ""
+        self.pool:Optional[ProcessPoolExecutor] = None
+        # id of a top-level form's tokens -> (tokens, parser for its source file)
+        self.sources:Dict[int, Tuple[TokenList, Parser]] = {}
+        # absolute path -> content hash, for every file included so far
+        self.digests:Dict[str, str] = {}
+
+    def __getstate__(self):
+        assert(self.pool is None)
+        state = self.__dict__.copy()
+        state["sources"] = list(self.sources.values())
+        state["token_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.sources = {id(tokens) : (tokens, source) for (tokens, source) in state["sources"]}
+
+    def grammar_error(self, source:Parser) -> ErrorCallback:
+        def error_handler(hint:str, token:Token, ErrorType=GrammarError):
+            message = source.message(hint, *token.pos(), *token.pos())
+            raise ErrorType(message)
+        return error_handler
+
+    def validation_error(self, hint:str, token:Token, node:Optional[Syntax] = None):
+        source = self.parser
+        if node is not None:
+            for ancestor in node.lineage():
+                if id(ancestor.tokens) in self.sources:
+                    source = self.sources[id(ancestor.tokens)][1]
+                    break
+        self.grammar_error(source)(hint, token, ValidationError)
+
+    def request(self, paths:List[str]) -> List[Tuple[Parser, Callable[[], Tuple[Token, ...]]]]:
+        """
+        Start tokenizing the included files.  Returns a parser for reporting
+        errors in each file, and a function which waits for its tokens.
+        """
+        requested:List[Tuple[Parser, Tuple[str, bool], str]] = []
+        for path in paths:
+            with open(path, "r") as src:
+                raw = src.read()
+            source = Parser(self.parser.keep_comments)
+            source.open(path)
+            source.reset(raw)
+            digest = sha256(raw.encode("utf-8")).hexdigest()
+            self.digests[os.path.abspath(path)] = digest
+            requested.append((source, (digest, source.keep_comments), raw))
+
+        # starting worker processes costs more than tokenizing one file
+        uncached = [key for (source, key, raw) in requested if key not in self.token_cache]
+        parallel = self.jobs > 1 and len(uncached) > 1
+        return [(source, self.tokenizer(source, key, raw, parallel)) for (source, key, raw) in requested]
+
+    def tokenizer(self, source:Parser, key:Tuple[str, bool], raw:str, parallel:bool) -> Callable[[], Tuple[Token, ...]]:
+        if key in self.token_cache:
+            tokens = self.token_cache.pop(key)
+            self.token_cache[key] = tokens
+            return lambda: tokens
+        if parallel:
+            wait = self.executor().submit(parse_include, source.path, raw, source.keep_comments).result
+        else:
+            wait = lambda: parse_include(source.path, raw, source.keep_comments)
+        def result() -> Tuple[Token, ...]:
+            tokens = wait()
+            self.token_cache[key] = tokens
+            while len(self.token_cache) > self.token_cache_size:
+                del self.token_cache[next(iter(self.token_cache))]
+            return tokens
+        return result
+
+    def executor(self) -> ProcessPoolExecutor:
+        assert(self.jobs > 1)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.jobs)
+        return self.pool
+
+    def validated(self, source:Parser, forms:Iterable[Token]) -> Iterator[Tuple[Token, Optional[Syntax]]]:
+        """
+        Yields each form along with the syntax the grammar produced for it, in
+        source order.  Comments produce None.
+        """
+        error_handler = self.grammar_error(source)
+        forms = iter(forms)
+        chunk = list(itertools.islice(forms, self.chunk_size))
+        if self.jobs <= 1 or len(chunk) < self.chunk_size:
+            for token in itertools.chain(chunk, forms):
+                if type(token) is TokenComment:
+                    yield token, None
+                else:
+                    yield token, GRAMMAR.validate(token, error_handler)
+            return
+
+        running:Deque[Tuple[List[Token], Any]] = deque()
+        while chunk or running:
+            # keep a couple of chunks queued for each worker
+            while chunk and len(running) < self.jobs * 2:
+                running.append((chunk, self.executor().submit(validate_chunk, chunk)))
+                chunk = list(itertools.islice(forms, self.chunk_size))
+            tokens, future = running.popleft()
+            validated, error = future.result()
+            yield from zip(tokens, validated)
+            if error is not None:
+                for pending, future in running:
+                    future.cancel()
+                error_handler(error.hint, error.token)
+
+    def expand(self, source:Parser, forms:Iterable[Token], active:Tuple[str, ...] = (), seen:Optional[Set[str]] = None) -> List[List[Syntax]]:
+        """
+        Validate top-level forms from the given source.  Returns a list of the
+        syntax produced by each form.  Include forms produce their Include
+        node, followed by the syntax of everything in the included file.
+
+        "active" is the chain of files currently being expanded, and "seen"
+        is the set of files which have already been included.
+        """
+        active = active or (self.root,)
+        seen = seen if seen is not None else {self.root}
+        error_handler = self.grammar_error(source)
+        pending:List[Union[List[Syntax], Tuple[Include, str, Tuple[str, ...]]]] = []
+        try:
+            for token, validated in self.validated(source, forms):
+                if validated is None:
+                    pending.append([])
+                    continue
+                syntax = cast(Syntax, validated)
+                if source is not self.parser:
+                    self.sources[id(syntax.tokens)] = (CAST(TokenList, syntax.tokens), source)
+                if type(syntax) is not Include:
+                    pending.append([syntax])
+                    continue
+                include = cast(Include, syntax)
+                path = os.path.normpath(os.path.join(os.path.dirname(source.path), include.path))
+                include.resolved = os.path.abspath(path)
+                if include.resolved in active:
+                    chain = [os.path.relpath(p) for p in active[active.index(include.resolved):]]
+                    error_handler(f"Include cycle ({' -> '.join(chain + [path])})", token)
+                if include.resolved in seen:
+                    pending.append([include])
+                    continue
+                if not os.path.isfile(path):
+                    error_handler("Included file not found", token)
+                seen.add(include.resolved)
+                pending.append((include, path, active + (include.resolved,)))
+
+            includes = [cast(tuple, item) for item in pending if type(item) is tuple]
+            requested = iter(self.request([path for (include, path, chain) in includes]))
+            expanded:List[List[Syntax]] = []
+            for item in pending:
+                if type(item) is list:
+                    expanded.append(cast(List[Syntax], item))
+                else:
+                    include, path, chain = cast(tuple, item)
+                    included, result = next(requested)
+                    syntax = [include]
+                    for nested in self.expand(included, result(), chain, seen):
+                        syntax += nested
+                    expanded.append(syntax)
+            return expanded
+        finally:
+            if len(active) == 1:
+                self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def validate(parser:Parser, loader:Optional[IncludeLoader] = None, jobs:int = 1):
+    """
+    Validate the program's tokens against the grammar tree, and then return the
+    abstract syntax tree.  When "jobs" is more than one, large programs are
+    validated on that many processes.
+    """
+    loader = loader or IncludeLoader(parser, jobs)
     children:List[Syntax] = []
-    for token in tokens:
-        if type(token) is not TokenComment:
-            token = CAST(TokenList, token)
-            children.append(cast(Syntax, GRAMMAR.validate(token, error_handler)))
+    for syntax in loader.expand(parser, parser.iter_forms()):
+        children += syntax
+    return Program(loader.validation_error, children, GRAMMAR.constructors())
+
 
-    return Program(validation_error, children, GRAMMAR.constructors())
+def mentioned_names(token:Token) -> Set[str]:
+    """
+    Returns every word in a form.  Forms only refer to declarations by name,
+    so this includes everything the syntax built from the form depends on.
+    """
+    names:Set[str] = set()
+    pending = [token]
+    while pending:
+        token = pending.pop()
+        if type(token) is TokenWord:
+            names.add(str(token))
+        elif type(token) is TokenList:
+            pending += cast(TokenList, token).tokens
+    return names
+
+
+class IncrementalValidator:
+    """
+    Validates a program, and then revalidates it after edits to the source.
+
+    The syntax produced by the grammar for each top-level form is kept, so
+    after an edit only the forms which Parser.reparse reports as changed are
+    run through the grammar again.  The validated program is kept as well,
+    and is updated in place.  Only the syntax for the changed forms, and for
+    the forms which mention any name that they declare, is rewritten and
+    validated again.
+
+    Edits which add or remove include forms revalidate every form, since each
+    file is only included by the first form which names it.  Edits involving
+    pipeline copies or double buffered textures rebuild the whole program,
+    since those change syntax built from other forms while it is rewritten.
+    """
+    def __init__(self, parser:Parser):
+        self.parser = parser
+        self.loader = IncludeLoader(parser)
+        self.forms:Tuple[Token, ...] = ()
+        self.syntax:Optional[List[List[Syntax]]] = None
+        # the names mentioned by each form
+        self.names:List[Set[str]] = []
+        # the validated program, and the syntax attached to it for each form
+        self.env:Optional[Program] = None
+        self.live:List[List[Syntax]] = []
+
+    def program(self) -> Program:
+        """
+        Build the program from copies of the syntax for every form.
+        """
+        assert(self.syntax is not None)
+        self.env = None
+        self.live = [[syntax.clone() for syntax in form] for form in self.syntax]
+        children = [syntax for form in self.live for syntax in form]
+        self.env = Program(self.loader.validation_error, children, GRAMMAR.constructors())
+        return self.env
+
+    def validate(self) -> Program:
+        """
+        Parse and validate the whole program.
+        """
+        self.syntax = None
+        self.forms = self.parser.parse()
+        self.loader.sources.clear()
+        self.syntax = self.loader.expand(self.parser, self.forms)
+        self.names = [mentioned_names(form) for form in self.forms]
+        return self.program()
+
+    def edit(self, start:int, end:int, text:str) -> Program:
+        """
+        Replace the source text between offsets "start" and "end" with "text",
+        and return the revalidated program.
+        """
+        try:
+            reparse = self.parser.reparse(self.forms, start, end, text)
+        except ParserError:
+            # the previous tokens no longer line up with the source
+            self.forms = ()
+            self.syntax = None
+            raise
+        self.forms = reparse.tokens
+        kept = self.syntax
+        self.syntax = None
+        first = reparse.first
+        stop = first + len(reparse.removed)
+        if kept is not None and not self.includes(kept[first:stop]):
+            added = self.loader.expand(self.parser, reparse.added)
+            if not self.includes(added):
+                self.syntax = kept[:first] + added + kept[stop:]
+                self.names[first:stop] = [mentioned_names(form) for form in reparse.added]
+                env = self.update(first, stop, len(added))
+                if env is not None:
+                    return env
+        if self.syntax is None:
+            self.loader.sources.clear()
+            self.syntax = self.loader.expand(self.parser, self.forms)
+            self.names = [mentioned_names(form) for form in self.forms]
+        return self.program()
+
+    def update(self, first:int, stop:int, count:int) -> Optional[Program]:
+        """
+        Update the program after the syntax for forms "first" through "stop"
+        was replaced by the syntax for "count" new forms.  Returns None if the
+        program has to be built from scratch instead.
+        """
+        if self.env is None:
+            return None
+        env = self.env
+        syntax = cast(List[List[Syntax]], self.syntax)
+        live = self.live[:first] + [[] for form in range(count)] + self.live[stop:]
+        dropped = [node for form in self.live[first:stop] for node in form]
+
+        # Forms which mention a name declared by a rebuilt form are rebuilt
+        # too, since their syntax may depend on the node it named.
+        rebuild = set(range(first, first + count))
+        changed = {getattr(node, "name", None) for node in dropped}
+        pending = list(rebuild)
+        while pending:
+            changed |= {getattr(node, "name", None) for index in pending for node in syntax[index]}
+            pending = [index for (index, form) in enumerate(live) if form and index not in rebuild and not self.names[index].isdisjoint(changed)]
+            rebuild.update(pending)
+            dropped += [node for index in pending for node in live[index]]
+
+        for node in dropped:
+            if type(node) is Pipeline and (cast(Pipeline, node).requires_flip or cast(Pipeline, node).copies):
+                return None
+            if type(node) is Texture and cast(Texture, node).shadow_texture:
+                return None
+        for index in rebuild:
+            for node in syntax[index]:
+                if type(node) is Pipeline:
+                    pipeline = cast(Pipeline, node)
+                    if pipeline.copies or {i.resource_name for i in pipeline.inputs} & {o.resource_name for o in pipeline.outputs}:
+                        return None
+        shadows = [child for child in env.children if type(child) is Texture and cast(Texture, child).copies_from]
+        if [shadow for shadow in shadows if cast(Texture, shadow).name in changed]:
+            return None
+
+        for index in rebuild:
+            live[index] = [node.clone() for node in syntax[index]]
+        children = [node for form in live for node in form] + shadows
+        try:
+            env.replace(children, [node for index in sorted(rebuild) for node in live[index]])
+        except:
+            self.env = None
+            raise
+        self.live = live
+        return env
+
+    @staticmethod
+    def includes(forms:List[List[Syntax]]) -> bool:
+        return any(type(syntax[0]) is Include for syntax in forms if syntax)
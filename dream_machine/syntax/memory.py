@@ -0,0 +1,327 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys
+import math
+import operator
+import itertools
+from functools import reduce
+from typing import *
+from .parser import Parser
+from .grammar import *
+from .arithmetic import UnfoldedExpression
+from .constants import TEXEL_BITS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Evaluates a compiled expression for the given variable values.
+Evaluator = Callable[[Mapping[str, Any]], Any]
+
+
+def chain(fn:Callable) -> Callable:
+    """
+    Applies a binary operator left to right over any number of arguments, in
+    the same way the arithmetic module folds them.
+    """
+    return lambda *args: reduce(fn, args)
+
+
+def truncated_div(a, b):
+    """
+    Divides integers like C++ does, rounding the quotient towards zero.
+    """
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+SCALAR_OPS:Dict[str, Callable] = \
+{
+    "add" : chain(operator.add),
+    "sub" : chain(operator.sub),
+    "mul" : chain(operator.mul),
+    "div" : chain(operator.truediv),
+    "trunc_div" : chain(truncated_div),
+    "min" : chain(min),
+    "max" : chain(max),
+    "sin" : math.sin,
+    "cos" : math.cos,
+    "tan" : math.tan,
+    "floor" : math.floor,
+    "ceil" : math.ceil,
+    "pow" : operator.pow,
+    "log2" : math.log2,
+    "clamp" : lambda a, low, high: min(max(a, low), high),
+    "div_up" : lambda a, b: math.ceil(a / b),
+    "mod" : operator.mod,
+}
+
+
+VECTOR_OPS:Dict[str, Callable] = {}
+if numpy is not None:
+    VECTOR_OPS = \
+    {
+        "add" : chain(numpy.add),
+        "sub" : chain(numpy.subtract),
+        "mul" : chain(numpy.multiply),
+        "div" : chain(numpy.true_divide),
+        "trunc_div" : chain(lambda a, b: numpy.trunc(numpy.true_divide(a, b))),
+        "min" : chain(numpy.minimum),
+        "max" : chain(numpy.maximum),
+        "sin" : numpy.sin,
+        "cos" : numpy.cos,
+        "tan" : numpy.tan,
+        "floor" : numpy.floor,
+        "ceil" : numpy.ceil,
+        "pow" : numpy.power,
+        "log2" : numpy.log2,
+        "clamp" : lambda a, low, high: numpy.minimum(numpy.maximum(a, low), high),
+        "div_up" : lambda a, b: numpy.ceil(numpy.true_divide(a, b)),
+        "mod" : numpy.mod,
+    }
+
+
+# operators which produce an integer when all of their arguments are integers
+INTEGRAL_OPS = ("add", "sub", "mul", "div", "min", "max", "clamp", "div_up", "mod")
+
+
+# variables which are integers in the generated code
+INTEGRAL_VARS = ("ScreenWidth", "ScreenHeight")
+
+
+# screen size variables which don't need to be provided
+DEFAULT_VARS = \
+{
+    "ScreenScaleX" : 1.0,
+    "ScreenScaleY" : 1.0,
+}
+
+
+COMMON_RESOLUTIONS = \
+(
+    (640, 480),
+    (1280, 720),
+    (1920, 1080),
+    (2560, 1440),
+    (3840, 2160),
+)
+
+
+def is_integral(expr:Any, integral:Container[str]) -> bool:
+    """
+    Returns whether the generated code evaluates the expression as an integer.
+    "integral" names the variables which are integers.
+    """
+    if type(expr) is UnfoldedExpression:
+        return expr.cmd in INTEGRAL_OPS and all([is_integral(arg, integral) for arg in expr.args])
+    elif type(expr) is str:
+        return expr in integral
+    else:
+        return type(expr) is int
+
+
+def compile_expression(expr:Any, ops:Dict[str, Callable], integral:Container[str] = INTEGRAL_VARS) -> Evaluator:
+    """
+    Turns a folded or unfolded arithmetic expression into a function of the
+    variables it uses.  With VECTOR_OPS, the variables may be NumPy arrays,
+    which evaluates the expression for all of their elements at once.
+    Divisions between integers are truncated, as they are in the generated
+    C++ code.
+    """
+    if type(expr) is UnfoldedExpression:
+        args = [compile_expression(arg, ops, integral) for arg in expr.args]
+        if expr.cmd == "div":
+            # the generated code divides left to right, one pair at a time
+            steps:List[Callable] = []
+            lhs = is_integral(expr.args[0], integral)
+            for arg in expr.args[1:]:
+                rhs = is_integral(arg, integral)
+                steps.append(ops["trunc_div"] if lhs and rhs else ops["div"])
+                lhs = lhs and rhs
+            def divide(values:Mapping[str, Any]) -> Any:
+                acc = args[0](values)
+                for step, arg in zip(steps, args[1:]):
+                    acc = step(acc, arg(values))
+                return acc
+            return divide
+        fn = ops[expr.cmd]
+        return lambda values: fn(*[arg(values) for arg in args])
+    elif type(expr) is str:
+        return lambda values: values[expr]
+    else:
+        return lambda values: expr
+
+
+def combinations(**axes:Sequence[Union[int, float]]) -> Dict[str, Any]:
+    """
+    Returns every combination of the values given for each variable, as one
+    flat array per variable.  The result can be passed to MemoryEstimator.sweep.
+    """
+    names = list(axes.keys())
+    if numpy is not None:
+        grids = numpy.meshgrid(*[numpy.asarray(axes[name], dtype=numpy.float64) for name in names], indexing="ij")
+        return {name : grid.ravel() for (name, grid) in zip(names, grids)}
+    product = list(itertools.product(*[axes[name] for name in names]))
+    return {name : [combo[index] for combo in product] for (index, name) in enumerate(names)}
+
+
+class MemoryEstimator:
+    """
+    Estimates how much memory a program's textures need for many different
+    screen sizes and user var settings at once.  Each texture's dimensions
+    are compiled into NumPy-vectorized evaluators when NumPy is available,
+    and into plain Python functions which are called once per sample when it
+    isn't.  Textures loaded from files can't be sized without reading them,
+    so they're left out and listed in "unsized".  Buffers aren't counted.
+    """
+    def __init__(self, env:Program, vectorize:bool = True):
+        self.vectorized = vectorize and numpy is not None
+        ops = VECTOR_OPS if self.vectorized else SCALAR_OPS
+        integral = set(INTEGRAL_VARS) | {name for (name, user_var) in env.user_vars.items() if user_var.ctype in ("int", "bool")}
+
+        # texture name -> evaluators for each of its dimensions
+        self.dimensions:Dict[str, List[Evaluator]] = {}
+        self.texel_bits:Dict[str, int] = {}
+        self.unsized:List[str] = []
+        for texture in env.textures.values():
+            if texture.src:
+                self.unsized.append(texture.name)
+                continue
+            self.dimensions[texture.name] = [compile_expression(d.value, ops, integral) for d in texture.dimensions.values()]
+            self.texel_bits[texture.name] = TEXEL_BITS[texture.format.format]
+
+        # user var name -> evaluator for its initial value, and whether it is truncated to an integer
+        self.user_vars:Dict[str, Tuple[Evaluator, bool]] = \
+        {
+            name : (compile_expression(user_var.value, ops, integral), user_var.ctype in ("int", "bool"))
+            for (name, user_var) in env.user_vars.items()
+        }
+
+        # renderer name -> names of the textures its steps access, including shadow textures
+        self.renderers:Dict[str, List[str]] = {}
+        graph = env.dependencies
+        for renderer in env.renderers:
+            names:Dict[str, None] = {}
+            for step in graph.steps[renderer.name]:
+                for resource in graph.reads[step] + graph.writes[step]:
+                    if type(resource) is Texture:
+                        texture = cast(Texture, resource)
+                        names[texture.name] = None
+                        if texture.shadow_texture:
+                            names[texture.shadow_texture.name] = None
+            self.renderers[renderer.name] = [name for name in names if name in self.dimensions]
+
+    def values(self, samples:Mapping[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Returns the number of samples, and the value of every variable for
+        each sample.  User vars which aren't given use their initial values.
+        """
+        values:Dict[str, Any] = dict(DEFAULT_VARS)
+        values.update(samples)
+        missing = [name for name in self.user_vars if name not in values]
+        if self.vectorized:
+            names = list(values.keys())
+            arrays = numpy.broadcast_arrays(*[numpy.atleast_1d(numpy.asarray(values[name], dtype=numpy.float64)) for name in names])
+            values = dict(zip(names, arrays))
+            count = len(arrays[0])
+            for name in missing:
+                evaluator, integral = self.user_vars[name]
+                value = numpy.broadcast_to(evaluator(values), (count,))
+                values[name] = numpy.trunc(value) if integral else value
+        else:
+            is_sequence = lambda value: hasattr(value, "__len__") and type(value) is not str
+            lengths = {len(v) for v in values.values() if is_sequence(v)}
+            if len(lengths) > 1:
+                raise ValueError("The samples for each variable must all be the same length.")
+            count = lengths.pop() if lengths else 1
+            values = {name : list(v) if is_sequence(v) else [v] * count for (name, v) in values.items()}
+            for name in missing:
+                evaluator, integral = self.user_vars[name]
+                column = [evaluator({k : v[i] for (k, v) in values.items()}) for i in range(count)]
+                values[name] = [math.trunc(v) for v in column] if integral else column
+        return count, values
+
+    def texture_bytes(self, samples:Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the number of bytes each sized texture needs for each sample.
+        "samples" maps variable names to a value or a sequence of values.
+        """
+        return self.solve_bytes(*self.values(samples))
+
+    def solve_bytes(self, count:int, values:Dict[str, Any]) -> Dict[str, Any]:
+        found:Dict[str, Any] = {}
+        for name, dimensions in self.dimensions.items():
+            bits = self.texel_bits[name]
+            try:
+                if self.vectorized:
+                    # like the (GLsizei) casts in the generated code
+                    extents = [numpy.maximum(numpy.trunc(d(values)), 0) for d in dimensions]
+                    texels = reduce(numpy.multiply, extents, numpy.ones(count))
+                    found[name] = numpy.ceil(texels * bits / 8).astype(numpy.int64)
+                else:
+                    found[name] = []
+                    for index in range(count):
+                        sample = {k : v[index] for (k, v) in values.items()}
+                        texels = reduce(operator.mul, [max(math.trunc(d(sample)), 0) for d in dimensions], 1)
+                        found[name].append(-(-texels * bits // 8))
+            except KeyError as error:
+                raise ValueError(f'No values were given for the variable {error}, which texture "{name}" needs.')
+        return found
+
+    def sweep(self, samples:Mapping[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Returns the total number of bytes needed by every sized texture, and
+        the number of bytes needed by the textures each renderer uses, for
+        each sample.
+        """
+        count, values = self.values(samples)
+        sizes = self.solve_bytes(count, values)
+        def total(names:Iterable[str]) -> Any:
+            columns = [sizes[name] for name in names]
+            if self.vectorized:
+                return reduce(numpy.add, columns, numpy.zeros(count, dtype=numpy.int64))
+            return [sum([column[index] for column in columns]) for index in range(count)]
+        return total(sizes.keys()), {name : total(names) for (name, names) in self.renderers.items()}
+
+
+def run(path:str, resolutions:Sequence[Tuple[int, int]] = COMMON_RESOLUTIONS):
+    """
+    Print the estimated texture memory for the program at each resolution,
+    with the user vars set to their initial values.
+    """
+    parser = Parser(keep_comments=False)
+    parser.open(path)
+    estimator = MemoryEstimator(validate(parser))
+    samples = {"ScreenWidth" : [w for (w, h) in resolutions], "ScreenHeight" : [h for (w, h) in resolutions]}
+    total, renderers = estimator.sweep(samples)
+    names = list(renderers.keys())
+    print(f"{'resolution':>12} {'total':>12}" + "".join([f" {name:>12}" for name in names]))
+    mib = lambda size: f"{int(size) / (1024 * 1024):.1f} MiB"
+    for index, (width, height) in enumerate(resolutions):
+        row = [mib(total[index])] + [mib(renderers[name][index]) for name in names]
+        print(f"{f'{width}x{height}':>12}" + "".join([f" {cell:>12}" for cell in row]))
+    for name in estimator.unsized:
+        print(f'Texture "{name}" is loaded from a file, so it isn\'t counted.')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        print("Missing source file path.")
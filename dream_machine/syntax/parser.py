@@ -14,7 +14,9 @@
 # limitations under the License.
 
 
+import re
 import string
+from bisect import bisect_right
 from typing import *
 from .tokens import *
 
@@ -23,25 +25,171 @@ class ParserError(Exception):
     pass
 
 
+TOKEN_PATTERN = re.compile(r"""
+    [ \t\n\r\x0b\x0c]*
+    (?:
+        (?P<comment>;[^\n]*)\n?
+      | (?P<open>\()
+      | (?P<close>\))
+      | (?P<number>[0-9]+(?:\.[0-9]*)?)
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<string>"(?:[^"\\\n]|\\[\s\S])*"|'(?:[^'\\\n]|\\[\s\S])*')
+      | \Z
+    )
+""", re.VERBOSE)
+TOKEN_COMMENT, TOKEN_OPEN, TOKEN_CLOSE, TOKEN_NUMBER, TOKEN_WORD, TOKEN_STRING = range(1, 7)
+
+
+ESCAPE_PATTERN = re.compile(r"\\([\s\S])")
+
+
+def unescape(quote:str, text:str) -> str:
+    """
+    Apply the same escape rules as Parser.parse_string.
+    """
+    def replace(match):
+        escaped = match.group(1)
+        return escaped if escaped in (quote, "\\") else match.group(0)
+    return ESCAPE_PATTERN.sub(replace, text)
+
+
+class ScanFallback(Exception):
+    """
+    Raised internally when Parser.scan finds something it can't tokenize.
+    """
+    pass
+
+
+class Reparse:
+    """
+    The result of Parser.reparse.  The top-level tokens in "removed", which
+    began at index "first" in the previous tokens, were replaced by "added".
+    All other top-level tokens were reused as-is.
+    """
+    def __init__(self, tokens:Tuple[Token, ...], first:int, removed:Tuple[Token, ...], added:Tuple[Token, ...]):
+        self.tokens = tokens
+        self.first = first
+        self.removed = removed
+        self.added = added
+
+
+def bisect_tokens(tokens:Sequence[Token], pos:Tuple[int, int]) -> int:
+    """
+    Returns how many of the top-level tokens begin at or before "pos".  They
+    are in source order, so they can be searched without building a separate
+    index of where each one begins.
+    """
+    low, high = 0, len(tokens)
+    while low < high:
+        middle = (low + high) // 2
+        if tokens[middle].pos() <= pos:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def shift_tokens(tokens:Iterable[Token], line:int, line_delta:int, col_delta:int):
+    """
+    Move tokens by "line_delta" lines.  Tokens which were on line "line" are
+    also moved by "col_delta" columns.
+    """
+    for token in tokens:
+        if token.line == line:
+            token.col += col_delta
+        token.line += line_delta
+        if type(token) is TokenList:
+            shift_tokens(cast(TokenList, token).tokens, line, line_delta, col_delta)
+
+
 class Parser:
     """
     Implements a parser for a pseudo-lisp dsl.
+
+    When "keep_comments" is False, comments are dropped while scanning rather
+    than being returned as TokenComments.
     """
 
-    def __init__(self):
+    def __init__(self, keep_comments:bool = True):
+        self.keep_comments = keep_comments
         self.path:str = ""
-        self.raw:str = ""
+        self._raw:Optional[str] = ""
+        self._line_starts:Optional[List[int]] = None
         self.char:str = ""
-        self.text:str = ""
+        self.index:int = 0
         self.reset()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.path:
+            # the file will be read again if it is needed
+            state["_raw"] = None
+            state["_line_starts"] = None
+        return state
+
+    @property
+    def raw(self) -> str:
+        """
+        The full source text.  When a file has been opened, this is read on
+        first access.
+        """
+        if self._raw is None:
+            with open(self.path, "r") as src:
+                self._raw = src.read()
+        return self._raw
+
+    @raw.setter
+    def raw(self, raw:str):
+        if raw is not self._raw:
+            self._raw = raw
+            self._line_starts = None
+
+    @property
+    def line_starts(self) -> List[int]:
+        """
+        Offsets into the source text where each line begins.  This is built
+        the first time it is needed, and is reused for all later lookups.
+        """
+        if self._line_starts is None:
+            raw = self.raw
+            line_starts = [0]
+            newline = raw.find("\n")
+            while newline != -1:
+                line_starts.append(newline + 1)
+                newline = raw.find("\n", newline + 1)
+            self._line_starts = line_starts
+        return self._line_starts
+
+    def position(self, offset:int) -> Tuple[int, int]:
+        """
+        Returns the line and column for an offset into the source text.
+        """
+        line = bisect_right(self.line_starts, offset) - 1
+        return line, offset - self.line_starts[line]
+
+    def source_lines(self, first:int, last:int) -> List[str]:
+        """
+        Returns lines "first" through "last" of the source text, inclusive and
+        without line endings.  Lines past the end of the file are omitted.
+        """
+        line_starts = self.line_starts
+        lines = []
+        for line in range(first, min(last + 1, len(line_starts))):
+            start = line_starts[line]
+            if line + 1 < len(line_starts):
+                lines.append(self.raw[start:line_starts[line + 1] - 1])
+            else:
+                lines.append(self.raw[start:])
+        return lines
+
     def open(self, path):
         """
-        Set a specific file as the target for parsing.
+        Set a specific file as the target for parsing.  The file isn't read
+        until it is needed, so iter_forms can stream it in chunks.
         """
         self.path = path
-        with open(path, "r") as src:
-            self.raw:str = src.read()
+        self._raw = None
+        self._line_starts = None
         self.reset()
 
     def reset(self, raw:Optional[str]= None):
@@ -51,15 +199,32 @@ class Parser:
         """
         if raw is not None:
             self.raw = raw
-        if len(self.raw) > 0:
-            self.char = self.raw[0]
-            self.text = self.raw[1:]
-        else:
+        self.index = 0
+        if self._raw is None:
+            # not read yet
             self.char = ""
-            self.text = ""
+        elif len(self._raw) > 0:
+            self.char = self._raw[0]
+        else:
+            self.char = "EOF"
         self.line = 0
         self.col = 0
 
+    def read_chunks(self, chunk_size:int) -> Iterator[str]:
+        """
+        Yield the source text in pieces.  Files which haven't been read yet
+        are read "chunk_size" characters at a time.
+        """
+        if self._raw is None:
+            with open(self.path, "r") as src:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        else:
+            yield self._raw
+
     def message(self,
                 hint:str,
                 start_line:Optional[int] = None, start_col:Optional[int] = None,
@@ -81,7 +246,7 @@ class Parser:
             pad = margin - len(pre)
             return (" " * pad) + pre
 
-        lines = self.raw.split("\n")[start_line:end_line+1]
+        lines = self.source_lines(start_line, end_line)
         message = f"\n\n{hint} in file \"{self.path}\" near line {end_line} column {end_col}:\n"
 
         for index, line in enumerate(lines):
@@ -97,6 +262,14 @@ class Parser:
                 message += (" " * (end_col + ext + margin)) + "↑\n"
         return message
 
+    def messages(self, diagnostics:Iterable[Tuple]) -> List[str]:
+        """
+        Format many diagnostics at once.  Each diagnostic is a tuple of the
+        arguments accepted by "message".  The source is only indexed once, so
+        this stays cheap for thousands of warnings.
+        """
+        return [self.message(*diagnostic) for diagnostic in diagnostics]
+
     def error(self,
               hint:str, start_line:Optional[int] = None, start_col:Optional[int] = None,
               end_line:Optional[int] = None, end_col:Optional[int] = None):
@@ -109,6 +282,9 @@ class Parser:
     def advance(self):
         """
         Advance the parser's cursor.  Not meant to be called externally.
+
+        The cursor is an offset into the source text, so advancing is constant
+        time regardless of how much of the file remains.
         """
         assert(self.char != "EOF")
         if self.char == "\n":
@@ -116,9 +292,9 @@ class Parser:
             self.col = 0
         else:
             self.col += 1
-        if len(self.text) > 0:
-            self.char = self.text[0]
-            self.text = self.text[1:]
+        self.index += 1
+        if self.index < len(self.raw):
+            self.char = self.raw[self.index]
         else:
             self.char = "EOF"
 
@@ -237,7 +413,9 @@ class Parser:
                     self.skip_whitespace()
                 elif self.char == ";":
                     # comment
-                    tokens.append(self.parse_comment())
+                    comment = self.parse_comment()
+                    if self.keep_comments:
+                        tokens.append(comment)
                 elif self.char == "(":
                     # begin list
                     tokens.append(self.parse_expression())
@@ -270,16 +448,215 @@ class Parser:
                 self.error(f"Unexpected char \"{self.char}\"", *pos)
         return TokenList(tuple(tokens), *pos)
 
+    def scan(self, chunks:Iterable[str], line:int = 0, col:int = 0) -> Iterator[Token]:
+        """
+        Tokenize a stream of source text, yielding each top-level token as
+        soon as it is complete.  The "line" and "col" parameters give the
+        position of the start of the stream within the source.
+
+        This matches TOKEN_PATTERN against the buffered text and assembles
+        nested lists with an explicit stack.  A token which touches the end
+        of the buffer might continue in the next chunk, so it is held back
+        until more text arrives.  Raises ScanFallback for anything the
+        pattern doesn't accept.
+        """
+        chunks = iter(chunks)
+        buffer = ""
+        base = 0
+        offset = 0
+        line_start = -col
+        separator_needed = False
+        tokens:List[Token] = []
+        stack:List[Tuple[List[Token], int, int]] = []
+        final = False
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                base += offset
+                buffer = buffer[offset:] + chunk
+                offset = 0
+
+            for match in TOKEN_PATTERN.finditer(buffer, offset):
+                if match.start() != offset:
+                    if final:
+                        raise ScanFallback()
+                    break
+                kind = match.lastindex
+                if not final and match.end() == len(buffer) and kind not in (TOKEN_OPEN, TOKEN_CLOSE):
+                    break
+                if kind is None:
+                    # trailing whitespace
+                    offset = match.end()
+                    continue
+
+                start = match.start(kind)
+                newlines = buffer.count("\n", offset, start)
+                if newlines:
+                    line += newlines
+                    line_start = base + buffer.rfind("\n", offset, start) + 1
+                col = base + start - line_start
+                offset = match.end()
+
+                if kind == TOKEN_COMMENT:
+                    separator_needed = False
+                    if self.keep_comments:
+                        comment = TokenComment(match.group(kind)[1:], line, col)
+                        if stack:
+                            tokens.append(comment)
+                        else:
+                            yield comment
+
+                elif kind == TOKEN_OPEN:
+                    separator_needed = False
+                    stack.append((tokens, line, col))
+                    tokens = []
+
+                elif kind == TOKEN_CLOSE:
+                    if not stack:
+                        raise ScanFallback()
+                    separator_needed = False
+                    inner = tokens
+                    tokens, list_line, list_col = stack.pop()
+                    token_list = TokenList(tuple(inner), list_line, list_col)
+                    if stack:
+                        tokens.append(token_list)
+                    else:
+                        yield token_list
+
+                else:
+                    if not stack or (separator_needed and start == match.start()):
+                        raise ScanFallback()
+                    separator_needed = True
+                    atom = match.group(kind)
+                    if kind == TOKEN_NUMBER:
+                        value = float(atom) if "." in atom else int(atom)
+                        tokens.append(TokenNumber(atom, value, line, col))
+                    elif kind == TOKEN_WORD:
+                        tokens.append(TokenWord(atom, line, col))
+                    else:
+                        quote = atom[0]
+                        text = atom[1:-1]
+                        if "\\" in text:
+                            text = unescape(quote, text)
+                        tokens.append(TokenString(quote, text, line, col))
+
+                newlines = buffer.count("\n", start, offset)
+                if newlines:
+                    line += newlines
+                    line_start = base + buffer.rfind("\n", start, offset) + 1
+
+        if stack or offset != len(buffer):
+            raise ScanFallback()
+
+    def iter_forms(self, chunk_size:int = 65536) -> Iterator[Token]:
+        """
+        Parse incrementally, yielding each top-level TokenList or TokenComment
+        as soon as it is complete.  Files are read in chunks, so the whole
+        source doesn't need to be in memory unless there is an error to report.
+        """
+        count = 0
+        try:
+            for token in self.scan(self.read_chunks(chunk_size)):
+                count += 1
+                yield token
+        except ScanFallback:
+            yield from self.parse_by_char()[count:]
+        self.reset()
+
+    def reparse(self, previous:Tuple[Token, ...], start:int, end:int, text:str) -> Reparse:
+        """
+        Replace the source text between offsets "start" and "end" with "text",
+        where "previous" is what parsing the source before the edit returned.
+
+        Only the top-level forms touched by the edit are tokenized again.  The
+        rest are reused, and forms after the edit have their positions moved
+        in place to match the new source.  If the edited forms can't be
+        tokenized on their own, this falls back to parsing everything.
+        """
+        old_raw = self.raw
+        old_line_starts = self.line_starts
+        offset = lambda token: old_line_starts[token.line] + token.col
+        new_raw = old_raw[:start] + text + old_raw[end:]
+        delta = len(text) - (end - start)
+
+        # lines which began inside the replaced text are replaced by the lines
+        # which begin inside the new text, and the rest are moved
+        kept = bisect_right(old_line_starts, start)
+        moved = bisect_right(old_line_starts, end)
+        line_starts = old_line_starts[:kept]
+        newline = text.find("\n")
+        while newline != -1:
+            line_starts.append(start + newline + 1)
+            newline = text.find("\n", newline + 1)
+        line_starts += [line_start + delta for line_start in old_line_starts[moved:]] if delta else old_line_starts[moved:]
+
+        first = max(bisect_tokens(previous, self.position(start)) - 1, 0)
+        stop = bisect_tokens(previous, self.position(end))
+        if previous and offset(previous[first]) <= start:
+            region_start = offset(previous[first])
+            region_line, region_col = previous[first].pos()
+        else:
+            region_start = 0
+            region_line, region_col = 0, 0
+
+        # A comment left open at the end of the region would swallow the form
+        # after it, so keep going until the region ends cleanly.
+        while stop < len(previous):
+            region_end = offset(previous[stop]) + delta
+            line_begin = max(new_raw.rfind("\n", region_start, region_end) + 1, region_start)
+            if ";" not in new_raw[line_begin:region_end]:
+                break
+            stop += 1
+        if stop == len(previous):
+            region_end = len(new_raw)
+
+        self.raw = new_raw
+        self._line_starts = line_starts
+        try:
+            added = tuple(self.scan((new_raw[region_start:region_end],), region_line, region_col))
+        except ScanFallback:
+            tokens = self.parse()
+            return Reparse(tokens, 0, previous, tokens)
+
+        if stop < len(previous):
+            old_line, old_col = previous[stop].pos()
+            new_line, new_col = self.position(region_end)
+            if (new_line, new_col) != (old_line, old_col):
+                shift_tokens(previous[stop:], old_line, new_line - old_line, new_col - old_col)
+
+        self.reset()
+        tokens = previous[:first] + added + previous[stop:]
+        return Reparse(tokens, first, previous[first:stop], added)
+
     def parse(self) -> Tuple[Token, ...]:
         """
-        Parse everything and return a list of tokens.
+        Parse everything and return a list of tokens.  Anything the fast
+        scanner doesn't accept is handed off to parse_by_char, so malformed
+        input produces the same error messages either way.
+        """
+        try:
+            tokens = tuple(self.scan((self.raw,)))
+        except ScanFallback:
+            return self.parse_by_char()
+        self.reset()
+        return tokens
+
+    def parse_by_char(self) -> Tuple[Token, ...]:
+        """
+        Parse everything one character at a time.  This is slower than parse,
+        but is used to produce errors for malformed input.
         """
+        self.reset(self.raw)
         tokens:List[Token] = []
         while self.char != "EOF":
             if self.char in string.whitespace:
                 self.skip_whitespace()
             elif self.char == ";":
-                tokens.append(self.parse_comment())
+                comment = self.parse_comment()
+                if self.keep_comments:
+                    tokens.append(comment)
             elif self.char == "(":
                 tokens.append(self.parse_expression())
             else:
@@ -130,44 +130,81 @@ class ListRule(Rule):
     this will produce syntax objects.  This is typically used within a MatchRule,
     but may also be used as a splat.  Each instance must specify what Syntax type
     will be created, in addition to the rules list etc.
+
+    The rules are compiled into a validator closure when the ListRule is
+    created, so validating a form doesn't need to rediscover what each rule
+    expects.
     """
     def __init__(self, construct:Type[Syntax], *rules:Rule, SPLAT:Optional[Rule] = None):
         self.construct = construct
         self.rules = rules
         self.splat = SPLAT
+        head = rules[0] if rules else None
+        self.keyword = head.hint if type(head) is Exactly else None
+        # rules which match anything aren't used to pick a rule
+        self.matchers = [(index, rule.match) for (index, rule) in enumerate(rules)
+                         if type(rule) is not ArithmeticRule]
+        self.validate_list = self.compile()
 
     def constructors(self) -> List[type]:
         return [self.construct]
 
+    def compile(self) -> Callable[[TokenList, ErrorCallback], Syntax]:
+        """
+        Returns a function which validates a TokenList that has already had its
+        comments removed.
+        """
+        construct = self.construct
+        count = len(self.rules)
+        splat = self.splat
+        splat_validate = self.splat.validate if self.splat else None
+
+        # (atom type, expected word, validate) for atoms, (None, None, validate) otherwise
+        steps:List[Tuple[Optional[type], Optional[str], Callable]] = []
+        child_types:List[type] = []
+        for rule in self.rules:
+            if isinstance(rule, AtomRule):
+                steps.append((rule.atom, rule.hint if type(rule) is Exactly else None, rule.validate))
+            else:
+                steps.append((None, None, rule.validate))
+                child_types += rule.constructors()
+        if splat:
+            child_types += splat.constructors()
+
+        def validate_list(token_list:TokenList, error:ErrorCallback) -> Syntax:
+            tokens = token_list.tokens
+            if splat:
+                if len(tokens) <= count:
+                    error(f"Expected more than {count} list items, got {len(tokens)}", token_list)
+            elif len(tokens) != count:
+                error(f"Expected exactly {count} list items, got {len(tokens)}", token_list)
+            children:List[Syntax] = []
+            for (atom, word, validate), token in zip(steps, tokens):
+                if atom is None:
+                    syntax = validate(token, error)
+                    if syntax:
+                        children.append(syntax)
+                elif type(token) is not atom or (word is not None and token.word != word):
+                    # let the rule report the problem
+                    validate(token, error)
+            if splat_validate:
+                for token in tokens[count:]:
+                    syntax = splat_validate(token, error)
+                    if syntax is not None:
+                        children.append(syntax)
+            return construct(token_list, children, list(child_types))
+
+        return validate_list
+
     def validate(self, token:Token, error:ErrorCallback) -> Optional[Syntax]:
         if type(token) is not TokenList:
             error(f"Expected TokenList, got {type(token).__name__}", token)
-        token_list = cast(TokenList, token).without_comments()
-        if self.splat:
-            if len(token_list) <= len(self.rules):
-                error(f"Expected more than {len(self.rules)} list items, got {len(token_list)}", token_list)
-        elif len(token_list) != len(self.rules):
-            error(f"Expected exactly {len(self.rules)} list items, got {len(token_list)}", token_list)
-        children:List[Syntax] = []
-        child_types = []
-        for rule, token in zip(self.rules, token_list):
-            syntax = rule.validate(token, error)
-            if syntax:
-                children.append(syntax)
-                child_types += rule.constructors()
-        if self.splat:
-            remainder = cast(Tuple[Token], token_list[len(self.rules):])
-            child_types += self.splat.constructors()
-            for token in remainder:
-                syntax = self.splat.validate(token, error)
-                if syntax is not None:
-                    children.append(cast(Syntax, syntax))
-        return self.construct(token_list, children, child_types)
+        return self.validate_list(cast(TokenList, token).without_comments(), error)
 
     def match(self, token:Token) -> bool:
-        token_list = CAST(TokenList, token)
-        for rule, token in zip(self.rules, token_list):
-            if not rule.match(token):
+        tokens = CAST(TokenList, token).tokens
+        for index, match in self.matchers:
+            if index < len(tokens) and not match(tokens[index]):
                 return False
         return True
 
@@ -179,20 +216,33 @@ class MatchRule(Rule):
     """
     This will attempt to match a TokenList to one of the associated ListRule
     parameters.
+
+    Rules which begin with an Exactly rule are indexed by its keyword, so
+    only the rules which could match a form's leading word are tried.  Rules
+    are still tried in the order they were given.
     """
     def __init__(self, *rules:ListRule):
         self.rules = rules
+        self.default = [rule for rule in rules if rule.keyword is None]
+        self.table:Dict[str, List[ListRule]] = {}
+        for keyword in dedupe([rule.keyword for rule in rules if rule.keyword is not None]):
+            self.table[keyword] = [rule for rule in rules if rule.keyword in (None, keyword)]
 
     def constructors(self) -> List[type]:
         return [rule.construct for rule in self.rules]
 
     def validate(self, token:Token, error:ErrorCallback) -> Optional[Syntax]:
-        token_list = CAST(TokenList, token).without_comments()
-        if token_list.is_nil():
+        if type(token) is not TokenList:
+            error(f"Expected TokenList, got {type(token).__name__}", token)
+        token_list = cast(TokenList, token).without_comments()
+        tokens = token_list.tokens
+        if not tokens:
             error("Expected non-empty TokenList", token_list)
-        for rule in self.rules:
+        head = tokens[0]
+        candidates = self.table.get(head.word, self.default) if type(head) is TokenWord else self.default
+        for rule in candidates:
             if rule.match(token_list):
-                return rule.validate(token_list, error)
+                return rule.validate_list(token_list, error)
         error("Unkown expression", token_list)
         return None
 
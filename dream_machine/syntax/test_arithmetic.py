@@ -19,7 +19,7 @@ from ..handy import *
 from .tokens import *
 from .parser import Parser
 from .grammar import GrammarError
-from .arithmetic import fold, UnfoldedExpression
+from .arithmetic import fold, UnfoldedExpression, SharedExpressions
 
 
 def fold_src(source:str):
@@ -173,3 +173,97 @@ def test_partial_fold_4():
     assert(fnord.args[2] == 4)
     assert(fnord.args[3] == "bar")
     assert(fnord.args[4] == 6)
+
+
+def test_sub_tail():
+    src = "(sub some_var 1 2)"
+    fnord = fold_src(src)
+    assert(type(fnord) is UnfoldedExpression)
+    assert(fnord.args == ["some_var", 3])
+
+
+def test_sub_head():
+    src = "(sub 10 2 some_var)"
+    fnord = fold_src(src)
+    assert(type(fnord) is UnfoldedExpression)
+    assert(fnord.cmd == "sub")
+    assert(fnord.args == [8, "some_var"])
+
+
+def test_div_head():
+    src = "(div 8 2 some_var)"
+    fnord = fold_src(src)
+    assert(type(fnord) is UnfoldedExpression)
+    assert(fnord.cmd == "div")
+    assert(fnord.args == [4, "some_var"])
+
+
+def test_simplify():
+    assert(fold_src("(mul some_var 1)") == "some_var")
+    assert(fold_src("(add 0 some_var)") == "some_var")
+    assert(fold_src("(div some_var 1)") == "some_var")
+    assert(fold_src("(mul some_var 0 other_var)") == 0)
+    fnord = fold_src("(add (add some_var 1) 2)")
+    assert(fnord.cmd == "add")
+    assert(fnord.args == ["some_var", 3])
+    fnord = fold_src("(sub 0 some_var)")
+    assert(fnord.args == [0, "some_var"])
+
+
+def test_deep_fold():
+    depth = 5000
+    src = "(add " * depth + "some_var" + " 1)" * depth
+    fnord = fold_src(src)
+    assert(fnord.args == ["some_var", depth])
+
+
+def test_shared_expressions():
+    exprs = \
+    [
+        fold_src("(max (mul ScreenWidth ScaleFactor) 1)"),
+        fold_src("(mul ScaleFactor ScreenWidth)"),
+        fold_src("(max (mul ScreenWidth ScaleFactor) 1)"),
+        fold_src("(mul ScreenHeight ScaleFactor)"),
+        "ScreenWidth",
+    ]
+    shared = SharedExpressions(exprs)
+    assert([name for (name, expr) in shared.temporaries] == ["SharedExpr0", "SharedExpr1"])
+    assert(shared.temporaries[0][1] is exprs[0].args[0])
+    assert(shared.temporaries[1][1] is exprs[0])
+    assert(shared.name(exprs[1]) == "SharedExpr0")
+    assert(shared.name(exprs[2]) == "SharedExpr1")
+    assert(shared.name(exprs[3]) is None)
+
+
+def test_rounding():
+    assert(fold_src("(floor 2.5)") == 2)
+    assert(type(fold_src("(floor 2.5)")) is int)
+    assert(fold_src("(ceil 2.5)") == 3)
+    assert(fold_src("(div_up 1000 16)") == 63)
+    assert(fold_src("(div_up 10 2.5)") == 4)
+    assert(fold_src("(mod 7 3)") == 1)
+    assert(fold_src("(mod (sub 0 7) 3)") == 2)
+
+
+def test_pow_log2():
+    assert(fold_src("(pow 2 10)") == 1024)
+    assert(fold_src("(log2 1024)") == 10)
+    # mip count for a 1000x600 texture
+    assert(fold_src("(add (floor (log2 (max 1000 600))) 1)") == 10)
+
+
+def test_clamp():
+    assert(fold_src("(clamp 5 0 3)") == 3)
+    assert(fold_src("(clamp (sub 0 5) 0 3)") == 0)
+    fnord = fold_src("(clamp some_var 1 (pow 2 4))")
+    assert(type(fnord) is UnfoldedExpression)
+    assert(fnord.args == ["some_var", 1, 16])
+
+
+def test_fixed_op_errors():
+    for src in ("(pow 2)", "(clamp 1 2)", "(floor 1 2)", "(div_up 1 0)", "(mod 1 0)", "(log2 0)"):
+        try:
+            fold_src(src)
+            assert(False)
+        except GrammarError:
+            pass
@@ -0,0 +1,112 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from .parser import Parser
+from .grammar import *
+from .cache import cached_validate
+
+
+def test_cached_validate(tmp_path, capsys):
+    (tmp_path / "formats.data").write_text("""
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+""")
+    (tmp_path / "main.data").write_text("""
+(include "formats.data")
+(texture SomeTexture ColorFormat
+    (width (mul ScreenWidth 0.5))
+    (height 512))
+""")
+    cache_dir = str(tmp_path / "cache")
+
+    def run():
+        p = Parser()
+        p.open(str(tmp_path / "main.data"))
+        return cached_validate(p, cache_dir, verbose=True)
+
+    env = run()
+    assert("miss" in capsys.readouterr().out)
+    env = run()
+    assert("hit" in capsys.readouterr().out)
+    texture = env.textures["SomeTexture"]
+    assert(texture.height == 512)
+    assert(texture.env is env)
+    assert(texture.format is env.formats["ColorFormat"])
+
+    # errors on a cached program still point at the right file
+    try:
+        env.formats["ColorFormat"].error("Fnord")
+        assert(False)
+    except ValidationError as error:
+        assert("formats.data" in str(error))
+
+    # editing an included file invalidates the cached program
+    (tmp_path / "formats.data").write_text("""
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_3D RGBA_8_UNORM PointSampler)
+""")
+    env = run()
+    assert("miss" in capsys.readouterr().out)
+    assert(env.formats["ColorFormat"].target_str == "TEXTURE_3D")
+
+    # truncated entries are replaced
+    for entry in (tmp_path / "cache").iterdir():
+        entry.write_bytes(entry.read_bytes()[:16])
+    env = run()
+    out = capsys.readouterr().out
+    assert("unreadable" in out and "miss" in out)
+    assert(env.formats["ColorFormat"].target_str == "TEXTURE_3D")
+
+
+def test_cached_validate_deep_nesting(tmp_path):
+    depth = 150
+    expr = "ScreenWidth"
+    for i in range(depth):
+        expr = f"(add ScreenHeight (mul ScreenWidth {expr}))"
+    (tmp_path / "main.data").write_text(f"""
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture SomeTexture ColorFormat
+    (width {expr})
+    (height 512))
+""")
+    cache_dir = str(tmp_path / "cache")
+    for attempt in range(2):
+        p = Parser()
+        p.open(str(tmp_path / "main.data"))
+        env = cached_validate(p, cache_dir)
+        assert(env.textures["SomeTexture"].height == 512)
+
+
+def test_cached_validate_source_path(tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    for name, target in (("a", "TEXTURE_2D"), ("b", "TEXTURE_3D")):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "formats.data").write_text(f"""
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat {target} RGBA_8_UNORM PointSampler)
+""")
+        (tmp_path / name / "main.data").write_text("""
+(include "formats.data")
+""")
+
+    # identical sources in different directories include different files
+    for name, target in (("a", "TEXTURE_2D"), ("b", "TEXTURE_3D")):
+        p = Parser()
+        p.open(str(tmp_path / name / "main.data"))
+        env = cached_validate(p, cache_dir, verbose=True)
+        assert("miss" in capsys.readouterr().out)
+        assert(env.formats["ColorFormat"].target_str == target)
@@ -0,0 +1,61 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .parser import Parser
+from .grammar import *
+from .diff import SyntaxDiff
+
+
+def run(source:str):
+    p = Parser()
+    p.reset(source)
+    return validate(p)
+
+
+SOURCE = """
+(uservar int MiscVar 2048)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Color ColorFormat (width ScreenWidth) (height ScreenHeight))
+(pipeline Base
+    (vs "splat.vs.glsl")
+    (fs "fnord.fs.glsl"))
+(pipeline Scene
+    (copy Base)
+    (out Color))
+(renderer SomeRenderer
+    (draw Scene 3))
+"""
+
+
+def test_formatting_is_not_a_change():
+    reformatted = SOURCE.replace("(fs \"fnord.fs.glsl\"))", "; fragment shader\n(fs 'fnord.fs.glsl'))")
+    reformatted = reformatted.replace("(width ScreenWidth) (height ScreenHeight)", "\n\t(width ScreenWidth)\n\t(height ScreenHeight)")
+    assert(reformatted != SOURCE)
+    changes = SyntaxDiff(run(SOURCE), run(reformatted))
+    assert(not changes)
+
+
+def test_diff():
+    edited = SOURCE.replace("fnord.fs.glsl", "meep.fs.glsl")
+    edited = edited.replace("(uservar int MiscVar 2048)", "(texture Extra ColorFormat (width 1) (height 1))")
+    changes = SyntaxDiff(run(SOURCE), run(edited))
+    assert(changes.added == [(("textures", "Extra"),)])
+    assert(changes.removed == [(("user_vars", "MiscVar"),)])
+    # pipelines which copy a modified pipeline are modified too
+    assert(changes.changed("pipelines") == ["Base", "Scene"])
+    assert((("pipelines", "Scene"), ("shaders", "fs")) in changes.modified)
+    assert(changes.changed("renderers") == [])
+    assert(changes.changed("textures") == ["Extra"])
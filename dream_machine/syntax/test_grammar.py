@@ -115,3 +115,507 @@ def test_pipeline_outputs():
     assert(pipeline.outputs[0] in pipeline.color_targets)
     assert(pipeline.outputs[2] in pipeline.color_targets)
     assert(pipeline.outputs[1] is pipeline.depth_target)
+
+
+def test_incremental_validator():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture SomeTexture ColorFormat
+    (width ScreenWidth)
+    (height ScreenHeight))
+(texture OtherTexture ColorFormat
+    (width 512)
+    (height 512))
+"""
+    p = Parser()
+    p.reset(src)
+    validator = IncrementalValidator(p)
+    env = validator.validate()
+    assert(env.textures["OtherTexture"].width == 512)
+    kept = validator.syntax[0]
+
+    sampler = env.samplers["PointSampler"]
+    some_texture = env.textures["SomeTexture"]
+
+    start = src.index("512")
+    src = src[:start] + "(mul 2 512)" + src[start + 3:]
+    assert(validator.edit(start, start + 3, "(mul 2 512)") is env)
+    assert(env.textures["OtherTexture"].width == 1024)
+    assert(validator.syntax[0] is kept)
+    assert(env.samplers["PointSampler"] is not kept[0])
+    # only the edited form was validated again
+    assert(env.samplers["PointSampler"] is sampler)
+    assert(env.textures["SomeTexture"] is some_texture)
+
+    # forms which mention a changed declaration are rebuilt with it
+    start = src.index("RGBA_8_UNORM")
+    src = src[:start] + "RGBA_16_UNORM" + src[start + 12:]
+    env = validator.edit(start, start + 12, "RGBA_16_UNORM")
+    assert(env.samplers["PointSampler"] is sampler)
+    assert(env.textures["SomeTexture"] is not some_texture)
+    assert(env.textures["SomeTexture"].format is env.formats["ColorFormat"])
+
+    # after an error, the next edit rebuilds the program
+    start = src.index("TEXTURE_2D")
+    try:
+        validator.edit(start, start + 10, "TEXTURE_2E")
+        assert(False)
+    except ValidationError as error:
+        assert("Unknown texture type" in str(error))
+    env = validator.edit(start, start + 10, "TEXTURE_2D")
+
+    fresh = run(src)
+    assert(list(env.textures) == list(fresh.textures))
+    assert([t.handle for t in env.textures.values()] == [t.handle for t in fresh.textures.values()])
+    assert(env.textures["OtherTexture"].width == fresh.textures["OtherTexture"].width)
+
+
+def test_include(tmp_path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "samplers.data").write_text("""
+(sampler PointSampler (min POINT) (mag POINT))
+""")
+    (tmp_path / "lib" / "formats.data").write_text("""
+(include "samplers.data")
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+""")
+    (tmp_path / "main.data").write_text("""
+(include "lib/formats.data")
+(include "lib/samplers.data")
+(texture SomeTexture ColorFormat
+    (width ScreenWidth)
+    (height ScreenHeight))
+""")
+    p = Parser()
+    p.open(str(tmp_path / "main.data"))
+    env = validate(p)
+    assert([i.path for i in env.includes] == ["lib/formats.data", "samplers.data", "lib/samplers.data"])
+    assert(env.textures["SomeTexture"].format is env.formats["ColorFormat"])
+    assert("PointSampler" in env.samplers)
+
+    # errors point at the file the bad form came from
+    (tmp_path / "lib" / "samplers.data").write_text("""
+(sampler PointSampler (min POINT))
+""")
+    p.open(str(tmp_path / "main.data"))
+    try:
+        validate(p)
+        assert(False)
+    except ValidationError as error:
+        assert("samplers.data" in str(error))
+        assert("mag" in str(error))
+
+    (tmp_path / "lib" / "samplers.data").write_text("""
+(include "../main.data")
+""")
+    p.open(str(tmp_path / "main.data"))
+    try:
+        validate(p)
+        assert(False)
+    except GrammarError as error:
+        assert("Include cycle" in str(error))
+
+
+def test_include_token_cache(tmp_path):
+    for index in range(3):
+        (tmp_path / f"sampler{index}.data").write_text(f"""
+(sampler Sampler{index} (min POINT) (mag POINT))
+""")
+    (tmp_path / "main.data").write_text("".join([f'(include "sampler{index}.data")\n' for index in range(3)]))
+    p = Parser()
+    p.open(str(tmp_path / "main.data"))
+    loader = IncludeLoader(p)
+    assert(loader.token_cache is not IncludeLoader(p).token_cache)
+    loader.token_cache_size = 2
+
+    # without more than one job, includes are tokenized without a process pool
+    def no_pool():
+        assert(False)
+    loader.executor = no_pool
+    env = validate(p, loader)
+    assert(list(env.samplers) == ["Sampler0", "Sampler1", "Sampler2"])
+    assert(len(loader.token_cache) == 2)
+
+
+def test_keyword_dispatch():
+    assert(GRAMMAR.default == [])
+    assert(GRAMMAR.table["texture"] == [TEXTURE_RULE])
+    splat = STRUCT_RULE.splat
+    assert(splat.table == {})
+    assert(splat.default == [STRUCT_MEMBER_ARRAY_RULE, STRUCT_MEMBER_RULE])
+
+    env = run("""
+(struct SomeStruct
+    (Fnord array 4 vec4)
+    (Meep float))
+""")
+    members = env.structs["SomeStruct"].members
+    assert([m.name for m in members] == ["Fnord", "Meep"])
+    assert(members[0].array.value == 4)
+
+    for src in ["(fnord 1 2 3)", "(texture SomeTexture ColorFormat 512)"]:
+        try:
+            run(src)
+            assert(False)
+        except GrammarError:
+            pass
+
+
+def test_parallel_validation():
+    src = "(sampler PointSampler (min POINT) (mag POINT))\n"
+    src += "(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)\n"
+    for i in range(20):
+        src += f"; texture {i}\n(texture Texture{i} ColorFormat (width {i + 1}) (height 512))\n"
+
+    def run_parallel(src):
+        p = Parser()
+        p.reset(src)
+        loader = IncludeLoader(p, jobs=2)
+        loader.chunk_size = 4
+        return validate(p, loader)
+
+    serial = run(src)
+    parallel = run_parallel(src)
+    assert(list(parallel.textures) == list(serial.textures))
+    assert([t.width for t in parallel.textures.values()] == list(range(1, 21)))
+
+    # the first error in source order is reported
+    bad = src.replace("(width 7)", "(width)").replace("(width 15)", "(fnord)")
+    errors = []
+    for validator in (run, run_parallel):
+        try:
+            validator(bad)
+            assert(False)
+        except GrammarError as error:
+            errors.append(str(error))
+    assert(errors[0] == errors[1])
+    assert("(width)" in errors[0])
+
+
+def test_frozen_handles():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(sampler LinearSampler (min LINEAR) (mag LINEAR))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture SomeTexture1 ColorFormat
+    (width ScreenWidth)
+    (height ScreenHeight))
+(texture SomeTexture2 ColorFormat
+    (width ScreenWidth)
+    (height ScreenHeight))
+"""
+    env = run(src)
+    assert(env.frozen)
+    assert([s.handle for s in env.samplers.values()] == [0, 1])
+    assert([t.handle for t in env.textures.values()] == [0, 1])
+
+    texture = env.textures["SomeTexture1"]
+    try:
+        env.textures["Fnord"] = texture
+        assert(False)
+    except TypeError:
+        pass
+    try:
+        env.append_child(texture.create_shadow_target())
+        assert(False)
+    except TypeError:
+        pass
+
+
+def test_binding_layout():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(format DepthFormat TEXTURE_2D D_32_FLOAT PointSampler)
+(texture SomeTexture1 ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture SomeTexture2 ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture SomeTarget1 ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture SomeTarget2 ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture SomeDepth DepthFormat (width ScreenWidth) (height ScreenHeight))
+(struct SomeStruct (Fnord vec4))
+(buffer SomeBuffer1 SomeStruct)
+(buffer SomeBuffer2 SomeStruct)
+(pipeline SomePipeline
+    (vs "fnord.vs.glsl")
+    (fs "fnord.fs.glsl")
+    (in SomeTexture1)
+    (in SomeBuffer1)
+    (in SomeTexture2)
+    (in SomeBuffer2)
+    (side SomeTexture2)
+    (out SomeDepth)
+    (out SomeTarget1)
+    (out SomeTarget2))
+"""
+    env = run(src)
+    pipeline = env.pipelines["SomePipeline"]
+    layout = pipeline.layout
+    assert(pipeline.layout is layout)
+    assert([i.resource_name for i in layout.uniforms] == ["SomeBuffer1", "SomeBuffer2"])
+    assert([i.uniform_index for i in layout.uniforms] == [0, 1])
+    assert([i.resource_name for i in layout.textures] == ["SomeTexture1", "SomeTexture2"])
+    assert([i.texture_index for i in layout.textures] == [0, 1])
+    assert([s.binding_index for s in layout.images] == [0])
+    assert([o.resource_name for o in layout.color_targets] == ["SomeTarget1", "SomeTarget2"])
+    assert([o.color_index for o in layout.color_targets] == [0, 1])
+    assert(layout.depth_target.resource_name == "SomeDepth")
+
+
+def test_slotted_syntax():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture SomeTexture1 ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture SomeTexture2 ColorFormat (width 512) (height 512))
+"""
+    env = run(src)
+    textures = list(env.textures.values())
+    assert(textures[0]._plan is textures[1]._plan)
+    for node in [env] + textures + list(textures[0].dimensions.values()):
+        assert(not hasattr(node, "__dict__"))
+
+
+def test_symbol_table():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(struct SomeStruct (Fnord vec4))
+(buffer SomeBuffer SomeStruct)
+(texture SomeTexture ColorFormat (width ScreenWidth) (height ScreenHeight))
+(pipeline SomeTexture
+    (vs "fnord.vs.glsl")
+    (fs "fnord.fs.glsl")
+    (in SomeBuffer))
+"""
+    env = run(src)
+    symbol = env.lookup("SomeTexture")
+    assert(symbol.texture is env.textures["SomeTexture"])
+    assert(symbol.pipeline is env.pipelines["SomeTexture"])
+    assert(symbol.kinds == ["texture", "pipeline"])
+    assert(env.lookup("SomeStruct").kinds == ["struct"])
+    assert(env.lookup("Fnord").kinds == [])
+
+    try:
+        run(src + "(texture SomeBuffer ColorFormat (width 1) (height 1))")
+        assert(False)
+    except ValidationError as error:
+        assert("already a buffer" in str(error))
+
+
+def test_dependency_graph():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(struct WindowParams (WindowSize vec4))
+(buffer WindowBlock WindowParams)
+(texture Color ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture Blurred ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture Other ColorFormat (width ScreenWidth) (height ScreenHeight))
+(pipeline Scene
+    (vs "splat.vs.glsl")
+    (fs "scene.fs.glsl")
+    (in WindowBlock)
+    (out Color))
+(pipeline Unrelated
+    (vs "splat.vs.glsl")
+    (fs "other.fs.glsl")
+    (out Other))
+(pipeline Blur
+    (vs "splat.vs.glsl")
+    (fs "blur.fs.glsl")
+    (in Color)
+    (out Blurred))
+(pipeline Clobber
+    (vs "splat.vs.glsl")
+    (fs "scene.fs.glsl")
+    (out Color))
+(renderer SomeRenderer
+    (update WindowBlock)
+    (draw Scene 3)
+    (draw Unrelated 3)
+    (draw Blur 3)
+    (draw Clobber 3))
+"""
+    env = run(src)
+    graph = env.dependencies
+    assert(env.dependencies is graph)
+    update, scene, unrelated, blur, clobber = graph.steps["SomeRenderer"]
+
+    assert(graph.writes[update] == (env.buffers["WindowBlock"],))
+    assert(graph.reads[blur] == (env.textures["Color"],))
+    assert(graph.writers[env.textures["Color"]] == [scene, clobber])
+
+    assert(graph.depends_on[update] == ())
+    assert(graph.depends_on[scene] == (update,))
+    assert(graph.depends_on[unrelated] == ())
+    assert(graph.depends_on[blur] == (scene,))
+    # write after write and write after read
+    assert(graph.depends_on[clobber] == (scene, blur))
+    assert(graph.dependents[scene] == [blur, clobber])
+
+    assert(graph.levels("SomeRenderer") == ((update, unrelated), (scene,), (blur,), (clobber,)))
+    assert(graph.order("SomeRenderer") == (update, unrelated, scene, blur, clobber))
+
+
+def test_dependency_graph_backbuffer():
+    src = """
+(struct WindowParams (WindowSize vec4))
+(buffer WindowBlock WindowParams)
+(pipeline Background
+    (vs "splat.vs.glsl")
+    (fs "scene.fs.glsl")
+    (in WindowBlock))
+(pipeline Overlay
+    (vs "splat.vs.glsl")
+    (fs "other.fs.glsl"))
+(renderer SomeRenderer
+    (update WindowBlock)
+    (draw Background 3)
+    (draw Overlay 3))
+"""
+    env = run(src)
+    graph = env.dependencies
+    update, background, overlay = graph.steps["SomeRenderer"]
+    assert(graph.writes[background] == (BACKBUFFER,))
+    assert(graph.depends_on[overlay] == (background,))
+    assert(graph.levels("SomeRenderer") == ((update,), (background,), (overlay,)))
+    assert(graph.order("SomeRenderer") == (update, background, overlay))
+
+
+def test_prune():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(sampler UnusedSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(format UnusedFormat TEXTURE_2D RGBA_8_UNORM UnusedSampler)
+(struct Inner (Fnord vec4))
+(struct Outer (Thing Inner))
+(struct UnusedStruct (Meep float))
+(buffer SomeBuffer Outer)
+(buffer UnusedBuffer UnusedStruct)
+(texture UnusedTexture UnusedFormat (width 1) (height 1))
+(texture Color ColorFormat (width ScreenWidth) (height ScreenHeight))
+(sampler GridSampler (min POINT) (mag POINT))
+(format GridFormat TEXTURE_2D RGBA_8_UNORM GridSampler)
+(texture Grid GridFormat (width 64) (height 32))
+(pipeline UnusedPipeline
+    (vs "splat.vs.glsl")
+    (fs "fnord.fs.glsl")
+    (in UnusedBuffer)
+    (out UnusedTexture))
+(pipeline Scene
+    (vs "splat.vs.glsl")
+    (fs "fnord.fs.glsl")
+    (in SomeBuffer)
+    (out Color))
+(pipeline Sim
+    (cs "sim.cs.glsl"))
+(renderer SomeRenderer
+    (update SomeBuffer)
+    (draw Scene 3)
+    (dispatch_over Sim Grid))
+"""
+    env = run(src)
+    dispatch = env.renderers[0].dispatches[0]
+    assert(env.dependencies.reads[dispatch] == (env.textures["Grid"],))
+    removed = env.prune()
+    assert([node.name for node in removed] == ["UnusedSampler", "UnusedFormat", "UnusedStruct", "UnusedBuffer", "UnusedTexture", "UnusedPipeline"])
+    assert(list(env.structs) == ["Inner", "Outer"])
+    assert(list(env.pipelines) == ["Scene", "Sim"])
+    # textures which are only dispatched over are still used
+    assert(list(env.textures) == ["Color", "Grid"])
+    assert(dispatch.texture is env.textures["Grid"])
+    assert(dispatch.group_counts((8, 8, 1)) == [8, 4, 1])
+    assert(env.pipelines["Scene"].index == 0)
+    assert(env.textures["Color"].handle == 0)
+    assert(env.lookup("UnusedTexture").kinds == [])
+    assert(not [child for child in env.children if child in removed])
+    assert(env.prune() == [])
+
+
+def test_dispatch_counts():
+    src = """
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Fixed ColorFormat (width 1000) (height 100))
+(texture Screen ColorFormat (width ScreenWidth) (height (div ScreenHeight 2)))
+(pipeline Sim (cs "sim.cs.glsl") (side Fixed) (side Screen))
+(pipeline Splat (vs "splat.vs.glsl") (fs "splat.fs.glsl"))
+(renderer Fnord
+    (dispatch Sim (mul 2 64) (div ScreenWidth 8) 1)
+    (dispatch_over Sim Fixed)
+    (dispatch_over Sim Screen))
+"""
+    env = run(src)
+    direct, fixed, screen = env.renderers[0].dispatches
+    assert(direct.counts[0] == 128 and direct.counts[2] == 1)
+    assert(direct.counts[1].cmd == "div")
+    assert(direct.group_counts((8, 8, 1)) == direct.counts)
+    assert(fixed.texture is env.textures["Fixed"])
+    assert(fixed.group_counts((8, 8, 1)) == [125, 13, 1])
+    width, height, depth = screen.group_counts((16, 4, 1))
+    assert(width.cmd == "div_up" and width.args == ["ScreenWidth", 16])
+    assert(height.cmd == "div_up" and height.args[1] == 4)
+    assert(depth == 1)
+
+    for renderer in ["(dispatch_over Sim Nope)", "(dispatch_over Splat Fixed)", "(dispatch Nope 1 1 1)"]:
+        try:
+            run(src.replace("(dispatch_over Sim Fixed)", renderer))
+            assert(False)
+        except ValidationError:
+            pass
+
+
+def test_variable_dependencies():
+    src = """
+(uservar int Scale 2)
+(uservar int Unused 3)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Screen ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture Scaled ColorFormat (width (mul ScreenWidth Scale)) (height 256))
+(texture Tiny ColorFormat (width Scale) (height Scale))
+(texture Fixed ColorFormat (width 256) (height 256))
+(pipeline A (vs "splat.vs.glsl") (fs "a.fs.glsl") (out Screen))
+(pipeline B (vs "splat.vs.glsl") (fs "b.fs.glsl") (out Tiny) (out Fixed))
+(pipeline C (vs "splat.vs.glsl") (fs "c.fs.glsl") (out Fixed))
+(pipeline D (vs "splat.vs.glsl") (fs "d.fs.glsl") (in Scaled))
+"""
+    env = run(src)
+    variables = env.variables
+    textures = env.textures
+    assert(variables is env.variables)
+    assert(variables.textures["ScreenWidth"] == [textures["Screen"], textures["Scaled"]])
+    assert(variables.textures["Scale"] == [textures["Scaled"], textures["Tiny"]])
+    assert(variables.texture_vars[textures["Scaled"]] == ("Scale", "ScreenWidth"))
+    assert(textures["Fixed"] not in variables.texture_vars)
+    assert(variables.user_vars == ["Scale"])
+
+    resized, rebuilt = variables.affected(["ScreenWidth", "ScreenHeight"])
+    assert(resized == [textures["Screen"], textures["Scaled"]])
+    assert(rebuilt == [env.pipelines["A"]])
+    resized, rebuilt = variables.affected(["Scale"])
+    assert(resized == [textures["Scaled"], textures["Tiny"]])
+    assert(rebuilt == [env.pipelines["B"]])
+    assert(variables.affected(["Unused"]) == ([], []))
+
+
+def test_specialized_user_vars():
+    env = run("(uservar int Plain 2) (specialize int Quality 1 0 1 2) (specialize float Scale 0.5 0.5 1.0)")
+    plain, quality, scale = env.user_vars.values()
+    assert(not plain.specialized and plain.variants == ())
+    assert(quality.specialized and quality.variants == (0, 1, 2) and quality.value == 1)
+    assert(scale.variants == (0.5, 1.0))
+
+    for bad in ["(specialize int Quality 3 0 1 2)", "(specialize int Quality 1 1 1 2)", "(specialize int Quality 1 1 1.5)"]:
+        try:
+            run(bad)
+            assert(False)
+        except ValidationError:
+            pass
+    try:
+        run("(specialize int Quality 1)")
+        assert(False)
+    except GrammarError:
+        pass
@@ -0,0 +1,102 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from .parser import Parser
+from .grammar import *
+from .memory import MemoryEstimator, combinations, numpy
+
+
+def run(source:str):
+    p = Parser()
+    p.reset(source)
+    return validate(p)
+
+
+SOURCE = """
+(uservar int Levels 4)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(format DepthFormat TEXTURE_2D D_32_FLOAT PointSampler)
+(format VolumeFormat TEXTURE_3D R_16_FLOAT PointSampler)
+(texture Color ColorFormat (width ScreenWidth) (height ScreenHeight))
+(texture Depth DepthFormat (width ScreenWidth) (height ScreenHeight))
+(texture Half ColorFormat (width (div ScreenWidth 2)) (height (div_up ScreenHeight 2)))
+(texture Volume VolumeFormat (width 16) (height 16) (depth Levels))
+(texture Image ColorFormat (src "fnord.png"))
+(pipeline Scene (vs "splat.vs.glsl") (fs "scene.fs.glsl") (out Color) (out Depth))
+(pipeline Blur (vs "splat.vs.glsl") (fs "blur.fs.glsl") (in Color) (in Volume) (out Half))
+(renderer Forward
+    (draw Scene 3))
+(renderer Fancy
+    (draw Scene 3)
+    (draw Blur 3))
+"""
+
+
+def expected(width:int, height:int, levels:int = 4):
+    color = width * height * 4
+    half = (width // 2) * -(-height // 2) * 4
+    volume = 16 * 16 * levels * 2
+    return color * 2 + half + volume, color * 2, color * 2 + half + volume
+
+
+def check(estimator:MemoryEstimator):
+    samples = combinations(ScreenWidth=[640, 1920, 1001], ScreenHeight=[480, 1080, 333])
+    total, renderers = estimator.sweep(samples)
+    assert(len(total) == 9)
+    for index in range(9):
+        width = int(samples["ScreenWidth"][index])
+        height = int(samples["ScreenHeight"][index])
+        assert((total[index], renderers["Forward"][index], renderers["Fancy"][index]) == expected(width, height))
+
+    total, renderers = estimator.sweep({"ScreenWidth" : 100, "ScreenHeight" : 100, "Levels" : [1, 8]})
+    assert(list(total) == [expected(100, 100, 1)[0], expected(100, 100, 8)[0]])
+    assert(estimator.unsized == ["Image"])
+
+    try:
+        estimator.sweep({"ScreenWidth" : 100})
+        assert(False)
+    except ValueError as error:
+        assert("ScreenHeight" in str(error))
+
+
+def test_memory_estimate():
+    env = run(SOURCE)
+    check(MemoryEstimator(env, vectorize=False))
+    if numpy is not None:
+        estimator = MemoryEstimator(env)
+        assert(estimator.vectorized)
+        check(estimator)
+
+
+def test_integer_division():
+    env = run("""
+(uservar int Half 2)
+(uservar float Scale 1.5)
+(sampler PointSampler (min POINT) (mag POINT))
+(format ColorFormat TEXTURE_2D RGBA_8_UNORM PointSampler)
+(texture Even ColorFormat (width (mul (div ScreenWidth Half) 2)) (height 1))
+(texture Scaled ColorFormat (width (mul (div ScreenWidth 2) Scale)) (height 1))
+(texture Exact ColorFormat (width (mul (div ScreenWidth 2.0) 2)) (height 1))
+""")
+    # like C++, integers are divided with truncation and everything else isn't
+    expected = {"Even" : 1000 * 4, "Scaled" : 750 * 4, "Exact" : 1001 * 4}
+    estimators = [MemoryEstimator(env, vectorize=False)]
+    if numpy is not None:
+        estimators.append(MemoryEstimator(env))
+    for estimator in estimators:
+        sizes = estimator.texture_bytes({"ScreenWidth" : 1001, "ScreenHeight" : 1})
+        assert({name : int(size[0]) for (name, size) in sizes.items()} == expected)
@@ -129,3 +129,113 @@ def test_valid_expressions():
     validate(t, (TokenNumber, TokenNumber, TokenNumber, (TokenNumber, TokenNumber, TokenNumber)))
     numbers = tuple([n.value for n in t.tokens[:3]] + [n.value for n in t.tokens[3]])
     assert(numbers == (1, 2, 3, 4, 5, 6))
+
+
+def test_positions():
+    tokens = run("; hail eris\n(fnord\n\t(meep 1 'moop'))\n")
+    assert(len(tokens) == 2)
+    assert(tokens[0].pos() == (0, 0))
+    assert(tokens[1].pos() == (1, 0))
+    fnord, meep = tokens[1]
+    assert(fnord.pos() == (1, 1))
+    assert(meep.pos() == (2, 1))
+    assert([t.pos() for t in meep] == [(2, 2), (2, 7), (2, 9)])
+
+
+def test_parse_by_char_equivalence():
+    src = """
+; hail eris
+(fnord 1 2.5 3.
+    (meep 'moop\\'s' "bl\\\\oop\\n") ; trailing comment
+    ((nested) (lists)))
+(fnord)"""
+    fast = run(src)
+    slow = reset(src).parse_by_char()
+    assert(repr(fast) == repr(slow))
+
+
+def test_parse_errors():
+    for src in ("(fnord", "(fnord))", "(1fnord)", "(fnord -1)", "fnord", "(fnord 'meep)"):
+        messages = []
+        for method in ("parse", "parse_by_char"):
+            try:
+                getattr(reset(src), method)()
+            except ParserError as error:
+                messages.append(str(error))
+        assert(len(messages) == 2)
+        assert(messages[0] == messages[1])
+
+
+def test_iter_forms(tmp_path):
+    src = "; hail eris\n(fnord 'meep moop' 12.5)\n(frob (frob bloop))\t; ribbit\n(1 2 3)"
+    path = tmp_path / "forms.data"
+    path.write_text(src)
+    expected = repr(run(src))
+    for chunk_size in (1, 2, 7, 65536):
+        p = Parser()
+        p.open(str(path))
+        forms = p.iter_forms(chunk_size)
+        first = next(forms)
+        assert(type(first) is TokenComment)
+        assert(repr((first,) + tuple(forms)) == expected)
+
+
+def test_strip_comments():
+    src = "; hail eris\n(fnord ; meep\n    (moop) ; bloop\n    1)"
+    p = Parser(keep_comments=False)
+    p.reset(src)
+    stripped = p.parse()
+    assert(len(stripped) == 1)
+    assert(repr(stripped) == repr(p.parse_by_char()))
+    assert(repr(stripped[0]) == repr(run(src)[1].without_comments()))
+    assert(stripped[0].without_comments() is stripped[0])
+    assert([type(t) for t in stripped[0]] == [TokenWord, TokenList, TokenNumber])
+
+
+def test_interned_words():
+    first, second = run("(fnord_meep fnord_meep)")[0]
+    assert(first.word is second.word)
+
+
+def test_messages():
+    src = "(fnord\n\t(meep 1)\n\t(moop 2))"
+    p = reset(src)
+    assert(p.source_lines(1, 5) == ["\t(meep 1)", "\t(moop 2))"])
+    assert(p.position(src.index("moop")) == (2, 2))
+    message = p.message("Oh no", 1, 2, 2, 2)
+    assert("\n 1: " in message)
+    assert("\n 2:     (moop 2))" in message)
+    many = p.messages([("Oh no", 1, 2, 2, 2)] * 3)
+    assert(many == [message] * 3)
+
+
+def test_reparse():
+    src = "(fnord 1)\n(meep\n    (moop 2)) (bloop 3)\n; ribbit\n(frob 4)"
+    p = reset(src)
+    previous = p.parse()
+    start = src.index("moop")
+    result = p.reparse(previous, start, start + 4, "moop\n\n")
+    edited = src[:start] + "moop\n\n" + src[start + 4:]
+    assert(repr(result.tokens) == repr(run(edited)))
+    assert(result.first == 1)
+    assert(len(result.removed) == 1)
+    assert(len(result.added) == 1)
+    assert(result.tokens[0] is previous[0])
+    assert(result.tokens[-1] is previous[-1])
+    assert(result.tokens[-1].pos() == (6, 0))
+    # line starts are moved rather than found again
+    assert(p.line_starts == reset(edited).line_starts)
+
+
+def test_reparse_edits():
+    src = "(fnord 1)\n(meep\n    (moop 2)) (bloop 3)\n; ribbit\n(frob 4)"
+    edits = [("moop", "moop\n\n"), ("(bloop", "\n(bloop"), ("bloop 3", "bloop 30"), ("4)", "4) (five 5)"), ("(fnord 1)\n", "")]
+    p = reset(src)
+    tokens = p.parse()
+    for old, new in edits:
+        start = src.index(old)
+        tokens = p.reparse(tokens, start, start + len(old), new).tokens
+        src = src[:start] + new + src[start + len(old):]
+        assert(repr(tokens) == repr(run(src)))
+        assert([t.pos() for t in tokens] == [t.pos() for t in run(src)])
+        assert(p.line_starts == reset(src).line_starts)
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import sys
 from typing import *
 
 
@@ -21,6 +22,8 @@ class Token:
     """
     Abstract base class representing a token returned by the parser.
     """
+    __slots__ = ("line", "col")
+
     def __init__(self, line:int, col:int):
         self.line = line
         self.col = col
@@ -45,6 +48,8 @@ class TokenNumber(Token):
     """
     A token containing a number.
     """
+    __slots__ = ("original", "value")
+
     def __init__(self, original:str, value:Union[int, float], line:int, col:int):
         Token.__init__(self, line, col)
         self.original = original
@@ -59,11 +64,18 @@ class TokenNumber(Token):
 
 class TokenWord(Token):
     """
-    A token representing an indentifier.
+    A token representing an indentifier.  Words are interned, since the same
+    few names tend to appear over and over again.
     """
+    __slots__ = ("word",)
+
     def __init__(self, word:str, line:int, col:int):
         Token.__init__(self, line, col)
-        self.word = word
+        self.word = sys.intern(word)
+
+    def __reduce__(self):
+        # rebuild through __init__ so words are interned again after unpickling
+        return (TokenWord, (self.word, self.line, self.col))
 
     def __repr__(self) -> str:
         return f"<TokenWord at {self.line}:{self.col} → {self.word}>"
@@ -76,6 +88,8 @@ class TokenString(Token):
     """
     A token representing a string.
     """
+    __slots__ = ("quote", "text")
+
     def __init__(self, quote:str, text:str, line:int, col:int):
         Token.__init__(self, line, col)
         self.quote = quote
@@ -96,6 +110,8 @@ class TokenComment(Token):
     """
     A token representing a comment.
     """
+    __slots__ = ("text",)
+
     def __init__(self, text:str, line:int, col:int):
         Token.__init__(self, line, col)
         self.text = text
@@ -114,18 +130,27 @@ class TokenList(Token):
     """
     A list of tokens.
     """
+    __slots__ = ("tokens", "_bare")
+
     def __init__(self, tokens:Tuple[Token, ...], line:int, col:int):
         Token.__init__(self, line, col)
         self.tokens = tokens
+        self._bare:Optional[Tuple[Token, ...]] = None
 
     def is_nil(self):
         return len(self.tokens) == 0
 
     def without_comments(self):
         """
-        Used for validation.
+        Used for validation.  The filtered tokens are cached, and when the list
+        has no comments in it to begin with, this returns the list itself.
         """
-        return TokenList(tuple([t for t in self.tokens if type(t) is not TokenComment]), *self.pos())
+        if self._bare is None:
+            bare = tuple([t for t in self.tokens if type(t) is not TokenComment])
+            self._bare = self.tokens if len(bare) == len(self.tokens) else bare
+        if self._bare is self.tokens:
+            return self
+        return TokenList(self._bare, *self.pos())
 
     def __len__(self):
         return len(self.tokens)
@@ -134,9 +159,7 @@ class TokenList(Token):
         return self.tokens[key]
 
     def __iter__(self):
-        tokens = list(self.tokens)
-        while len(tokens) > 0:
-            yield tokens.pop(0)
+        return iter(self.tokens)
 
     def __repr__(self) -> str:
         return f"<TokenList at {self.line}:{self.col} → {self.tokens}>"
@@ -16,6 +16,7 @@
 
 from ..opengl.glsl_types import *
 from ..syntax.abstract import Program, PipelineInput, Buffer, Struct
+from ..opengl.specialization import ProgramVariants
 
 
 upload_variants = {
@@ -62,15 +63,16 @@ class UploadUniformBlock(SyntaxExpander):
 """.strip()
     indent = ("wrapped",)
 
-    def __init__(self, env:Program, buffer:Buffer, struct:StructType):
+    def __init__(self, env:Program, variants:ProgramVariants, buffer:Buffer, struct:StructType):
         SyntaxExpander.__init__(self)
         self.name = buffer.name
 
-        programs = []
+        # every variant of every pipeline using the buffer needs the upload
+        programs:Dict[int, None] = {}
         for pipeline in env.pipelines.values():
             for input in pipeline.uniforms:
                 if input.buffer == buffer:
-                    programs.append(pipeline.index)
+                    programs.update(dict.fromkeys(variants.pipeline_programs(pipeline)))
 
         wrapped:List[Union[str, SyntaxExpander]] = []
         for program in programs:
@@ -3,6 +3,18 @@
 let ScreenWidth = null;
 let ScreenHeight = null;
 
+const Arithmetic = {
+	Clamp : function(Value, Low, High) {
+		return Math.min(Math.max(Value, Low), High);
+	},
+	DivUp : function(Numerator, Denominator) {
+		return Math.ceil(Numerator / Denominator);
+	},
+	Mod : function(Numerator, Denominator) {
+		return Numerator - Denominator * Math.floor(Numerator / Denominator);
+	},
+};
+
 const CompileShader = function(Source, ShaderType) {
 	const Handle = gl.createShader(ShaderType);
 	gl.shaderSource(Handle, Source);
@@ -54,6 +66,7 @@ const DrawFrame = function(FrameIndex, CurrentTime, DeltaTime) {
 		WindowResized();
 		WindowIsDirty = false;
 	}
+	UpdateUserVars();
 	gl.viewport(0, 0, ScreenWidth, ScreenHeight);
 「draw_frame_hook」
 };
@@ -62,6 +75,10 @@ const WindowResized = function() {
 「resize_hook」
 };
 
+const UpdateUserVars = function() {
+「user_vars_hook」
+};
+
 let FrameIndex = 0;
 let LastTime = null;
 let WindowIsDirty = true;
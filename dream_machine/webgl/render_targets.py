@@ -15,7 +15,8 @@
 
 
 from .textures import *
-from ..syntax.grammar import Pipeline, PipelineOutput
+from .shaders import SelectVariant
+from ..syntax.grammar import Pipeline, PipelineOutput, UserVar, COMMON_VARS
 
 
 class FrameBufferHandles(SyntaxExpander):
@@ -47,12 +48,12 @@ class FrameBufferAttachment(SyntaxExpander):
 
 class DepthAttachment(FrameBufferAttachment):
     def __init__(self, pipeline:Pipeline, mip:int = 0):
-        FrameBufferAttachment.__init__(self, pipeline, CAST(PipelineOutput, pipeline.depth_target), "gl.DEPTH_ATTACHMENT", mip)
+        FrameBufferAttachment.__init__(self, pipeline, CAST(PipelineOutput, pipeline.layout.depth_target), "gl.DEPTH_ATTACHMENT", mip)
 
 
 class ColorAttachment(FrameBufferAttachment):
     def __init__(self, pipeline:Pipeline, output:PipelineOutput, mip:int = 0):
-        assert(output in pipeline.color_targets)
+        assert(output in pipeline.layout.color_attachments)
         FrameBufferAttachment.__init__(self, pipeline, output, f"gl.COLOR_ATTACHMENT{str(output.color_index)}", mip)
 
 
@@ -67,9 +68,9 @@ gl.drawBuffers([
     def __init__(self, pipeline:Pipeline):
         SyntaxExpander.__init__(self)
         attachments = []
-        if pipeline.depth_target:
+        if pipeline.layout.depth_target:
             attachments.append("gl.DEPTH_ATTACHMENT")
-        attachments += ["gl.COLOR_ATTACHMENT{str(i)}" for i in range(len(pipeline.color_targets))]
+        attachments += ["gl.COLOR_ATTACHMENT{str(i)}" for i in range(len(pipeline.layout.color_targets))]
         self.attachments = attachments
 
 
@@ -87,11 +88,11 @@ class CreateFrameBuffer(SyntaxExpander):
         self.handle = pipeline.index
         self.expanders:List[SyntaxExpander] = []
         self.expanders.append(BindFrameBuffer(pipeline))
-        for color_target in pipeline.color_targets:
+        for color_target in pipeline.layout.color_targets:
             self.expanders.append(ColorAttachment(pipeline, color_target))
-        if pipeline.depth_target:
+        if pipeline.layout.depth_target:
             self.expanders.append(DepthAttachment(pipeline))
-        if len(pipeline.color_targets) > 1:
+        if len(pipeline.layout.color_targets) > 1:
             self.expanders.append(DrawBuffers(pipeline))
         self.expanders.append(BindBackBuffer())
 
@@ -119,6 +120,10 @@ class SetupFrameBuffers(SyntaxExpander):
 
 
 class ResizeFrameBuffers(SyntaxExpander):
+    """
+    Reallocates the textures with dimensions that depend on the screen size,
+    and rebuilds the framebuffers which use them.
+    """
     template = """
 「wrapped」
 """.strip()
@@ -127,12 +132,101 @@ class ResizeFrameBuffers(SyntaxExpander):
         SyntaxExpander.__init__(self)
         self.wrapped:List[SyntaxExpander] = []
 
-        pipelines = [p for p in env.pipelines.values() if not p.uses_backbuffer]
-        texture_names = sorted({out.texture.name for p in pipelines for out in p.outputs})
+        textures, pipelines = env.variables.affected(COMMON_VARS)
+        shared = shared_dimensions(textures)
+        self.wrapped += solve_temporaries(shared)
+        for texture in textures:
+            self.wrapped.append(ResizeTexture(texture, shared))
 
-        for texture in env.all_target_textures:
-            self.wrapped.append(ResizeTexture(texture))
+        for pipeline in pipelines:
+            self.wrapped.append(RebuildFrameBuffer(pipeline))
 
-        for pipeline in env.pipelines.values():
-            if not pipeline.uses_backbuffer:
-                self.wrapped.append(RebuildFrameBuffer(pipeline))
+
+class UserVarCache(SyntaxExpander):
+    template = """
+let UserVarCache = {
+「cached」
+};
+""".strip()
+    indent = ("cached",)
+
+    def __init__(self, names:List[str]):
+        SyntaxExpander.__init__(self)
+        self.cached = [f'"{name}" : UserVars.{name},' for name in names]
+
+
+class UserVarDirtyFlag(SyntaxExpander):
+    template = "const 「name:str」IsDirty = UserVars.「name:str」 !== UserVarCache.「name:str」;"
+
+
+class UpdateUserVarCache(SyntaxExpander):
+    template = "UserVarCache.「name:str」 = UserVars.「name:str」;"
+
+
+def dirty_condition(names:Iterable[str]) -> str:
+    return " || ".join([f"{name}IsDirty" for name in names])
+
+
+class WhenDirty(SyntaxExpander):
+    template = """
+if (「condition:str」) {
+「wrapped」
+}
+""".strip()
+    indent = ("wrapped",)
+
+    def __init__(self, names:Iterable[str], wrapped:List[SyntaxExpander]):
+        SyntaxExpander.__init__(self)
+        self.condition = dirty_condition(names)
+        self.wrapped = wrapped
+
+
+def tracked_user_vars(env:Program, specialized:List[UserVar] = []) -> List[str]:
+    """
+    Returns the names of the user vars which texture dimensions depend on,
+    along with the specialized user vars which pick shader program variants.
+    """
+    return sorted(set(env.variables.user_vars) | {v.name for v in specialized})
+
+
+class UpdateUserVars(SyntaxExpander):
+    """
+    Compares each user var which texture dimensions use against the value it
+    had when those textures were last allocated, and only reallocates the
+    textures and framebuffers that use the vars which have changed.
+    Specialized user vars switch the program variants that use them.
+    """
+    template = """
+「flags」
+if (「condition:str」) {
+「wrapped」
+}
+""".strip()
+    indent = ("wrapped",)
+
+    def __init__(self, env:Program, specialized:List[UserVar] = []):
+        SyntaxExpander.__init__(self)
+        names = tracked_user_vars(env, specialized)
+        self.flags:List[SyntaxExpander] = [UserVarDirtyFlag(name=name) for name in names]
+        self.condition = dirty_condition(names)
+
+        dirty = lambda uses: [name for name in names if name in uses]
+        textures, pipelines = env.variables.affected(names)
+        shared = shared_dimensions(textures)
+        self.wrapped:List[SyntaxExpander] = solve_temporaries(shared)
+        for texture in textures:
+            self.wrapped += self.when_dirty(dirty(env.variables.texture_vars[texture]), [ResizeTexture(texture, shared)])
+        for pipeline in pipelines:
+            self.wrapped += self.when_dirty(dirty(env.variables.pipeline_vars[pipeline]), [RebuildFrameBuffer(pipeline)])
+        for user_var in specialized:
+            self.wrapped += self.when_dirty([user_var.name], [SelectVariant(user_var)])
+        self.wrapped += [UpdateUserVarCache(name=name) for name in names]
+
+    def when_dirty(self, names:List[str], wrapped:List[SyntaxExpander]) -> List[SyntaxExpander]:
+        """
+        Guards the wrapped expanders with a dirty check, unless it is the same
+        as the check which is already around them.
+        """
+        if dirty_condition(names) == self.condition:
+            return wrapped
+        return [WhenDirty(names, wrapped)]
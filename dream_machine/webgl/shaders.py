@@ -21,7 +21,8 @@ from hashlib import md5
 from ..handy import *
 from ..opengl.glsl_types import *
 from ..expanders import SyntaxExpander, external
-from ..syntax.abstract import Pipeline
+from ..syntax.abstract import Pipeline, UserVar
+from ..opengl.specialization import ProgramVariants
 
 
 class ShaderHandles(SyntaxExpander):
@@ -97,6 +98,51 @@ class ChangeProgram(SyntaxExpander):
 """.strip()
 
 
+class ProgramVariantTable(SyntaxExpander):
+    template = "const ProgramVariants = [「indices:str」];"
+
+    def __init__(self, variants:ProgramVariants):
+        SyntaxExpander.__init__(self)
+        self.indices = ", ".join(map(str, variants.table))
+
+
+class SpecializedVarIndices(SyntaxExpander):
+    """
+    The index of the current value of each specialized user var, which picks
+    the program variant that each pipeline uses.
+    """
+    template = """
+let SpecializedVars = {
+「indices」
+};
+""".strip()
+    indent = ("indices",)
+
+    def __init__(self, user_vars:List[UserVar]):
+        SyntaxExpander.__init__(self)
+        self.indices = [f'"{v.name}" : {v.variants.index(v.value)},' for v in user_vars]
+
+
+class SelectVariant(SyntaxExpander):
+    """
+    Finds the index of a specialized user var's new value.  Values which the
+    var wasn't specialized for keep the previous variant.
+    """
+    template = """
+{
+	const Index = [「values:str」].indexOf(Number(UserVars.「name:str」));
+	if (Index !== -1) {
+		SpecializedVars.「name:str」 = Index;
+	}
+}
+""".strip()
+
+    def __init__(self, user_var:UserVar):
+        SyntaxExpander.__init__(self)
+        self.values = ", ".join(map(str, user_var.variants))
+        self.name = user_var.name
+
+
 class ShaderStage:
     """
     Immutable data corresponding roughly to the parameters for the OpenGL API
@@ -137,7 +183,7 @@ class ShaderProgram:
     """
     def __init__(self, pipeline:Pipeline, shaders: List[ShaderStage]) -> None:
         self.name = pipeline.name
-        self.textures = [t.binding_name for t in pipeline.textures]
-        self.uniforms = pipeline.uniforms
+        self.textures = [t.binding_name for t in pipeline.layout.textures]
+        self.uniforms = pipeline.layout.uniforms
         self.shaders = dedupe(shaders)
         self.stages = tuple(sorted([shader.stage for shader in self.shaders]))
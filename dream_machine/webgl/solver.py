@@ -26,7 +26,7 @@ from .window import *
 from .glsl_interfaces import *
 from .js_interfaces import *
 from .js_expressions import *
-from ..opengl.solver import solve_struct
+from ..opengl.solver import solve_structs
 
 
 splat_vs = ShaderStage("vertex", "splat.vs", [], source = """
@@ -50,12 +50,13 @@ Upload["「buffer_name」"]({
         self.buffer_name = buffer.name
 
 
-def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[ShaderHandles, List[SyntaxExpander]]:
+def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[ShaderHandles, List[SyntaxExpander], ProgramVariants]:
     """
     This function returns a ShaderHandles expander (which should go in the
-    generated program's global scope), and a list of CompileShader and
+    generated program's global scope), a list of CompileShader and
     LinkShaders expanders (which produce code that should be called after the
-    OpenGL context is initialized, but before the shaders are to be used).
+    OpenGL context is initialized, but before the shaders are to be used),
+    and the program variants which each pipeline may switch between.
     """
 
     def solve_shader_compilation(shaders: List[ShaderStage]):
@@ -69,27 +70,30 @@ def solve_shaders(env:Program, solved_structs:Dict[str,StructType]) -> Tuple[Sha
             links.append(LinkShaders(program, index, shader_handles))
         return links
 
-    def solve_shader_fs(pipeline:Pipeline) -> ShaderStage:
+    def solve_shader_fs(pipeline:Pipeline, defines:List[SyntaxExpander]) -> ShaderStage:
         shader = pipeline.shaders["fs"]
         structs:List[SyntaxExpander] = [GlslStruct(solved_structs[use.struct]) for use in pipeline.structs]
-        uniforms:List[SyntaxExpander] = [UniformInterface(solved_structs[u.struct], u) for u in pipeline.uniforms]
-        textures:List[SyntaxExpander] = [TextureInterface(t) for t in pipeline.textures]
-        return ShaderStage("fragment", shader.path, structs + uniforms + textures)
+        uniforms:List[SyntaxExpander] = [UniformInterface(solved_structs[u.struct], u) for u in pipeline.layout.uniforms]
+        textures:List[SyntaxExpander] = [TextureInterface(t) for t in pipeline.layout.textures]
+        return ShaderStage("fragment", shader.path, defines + structs + uniforms + textures)
 
+    def solve_pipeline_stages(pipeline:Pipeline, defines:Dict[str, List[SyntaxExpander]]) -> List[ShaderStage]:
+        return [splat_vs, solve_shader_fs(pipeline, defines["fs"])]
+
+    variants = ProgramVariants(env, solve_pipeline_stages)
     shaders:List[ShaderStage] = []
     programs:List[ShaderProgram] = []
-    for pipeline in env.pipelines.values():
-        stages:List[ShaderStage] = [splat_vs, solve_shader_fs(pipeline)]
+    for pipeline, label, stages in variants.programs:
         programs.append(ShaderProgram(pipeline, stages))
         shaders += stages
 
     shaders = dedupe(shaders)
     compiles: List[SyntaxExpander] = solve_shader_compilation(shaders)
     links: List[SyntaxExpander] = solve_shader_linking(shaders, programs)
-    return ShaderHandles(shader_count = len(shaders), program_count=len(programs)), compiles + links
+    return ShaderHandles(shader_count = len(shaders), program_count=len(programs)), compiles + links, variants
 
 
-def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], SyntaxExpander]:
+def solve_renderers(env:Program, variants:ProgramVariants) -> Tuple[List[SyntaxExpander], SyntaxExpander]:
     """
     """
 
@@ -101,7 +105,7 @@ def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], SyntaxExpander]:
         pipeline = event.pipeline
         setup:List[SyntaxExpander] = \
         [
-            ChangeProgram(pipeline.index),
+            ChangeProgram(variants.program_index(pipeline, "SpecializedVars.")),
         ]
 
         if pipeline.uses_backbuffer:
@@ -109,7 +113,7 @@ def solve_renderers(env:Program) -> Tuple[List[SyntaxExpander], SyntaxExpander]:
         else:
             setup.append(BindFrameBuffer(pipeline))
 
-        setup += [BindTexture(t) for t in pipeline.textures]
+        setup += [BindTexture(t) for t in pipeline.layout.textures]
 
         return Drawspatch(
             setup = setup,
@@ -185,7 +189,7 @@ def solve_extensions(env:Program) -> List[str]:
             optional += dependencies[ext]
 
     for pipeline in env.pipelines.values():
-        if len(pipeline.color_targets) > 1:
+        if len(pipeline.layout.color_targets) > 1:
             optional.append("WEBGL_draw_buffers")
             break
 
@@ -198,10 +202,11 @@ def solve(env:Program) -> SyntaxExpander:
     """
 
     # structs
-    solved_structs:Dict[str,StructType] = {k:solve_struct(v, env) for (k,v) in env.structs.items()}
+    solved_structs:Dict[str,StructType] = solve_structs(env)
 
     # expanders for shaders
-    shader_handles, build_shaders = solve_shaders(env, solved_structs)
+    shader_handles, build_shaders, variants = solve_shaders(env, solved_structs)
+    specialized = variants.specialized
 
     # expanders for struct definitions
     structs:List[SyntaxExpander] = []
@@ -215,12 +220,22 @@ def solve(env:Program) -> SyntaxExpander:
     if env.pipelines:
         globals.append(FrameBufferHandles(len(env.pipelines)))
 
+    # program variants for the specialized user vars' current values
+    if specialized:
+        globals.append(ProgramVariantTable(variants))
+        globals.append(SpecializedVarIndices(specialized))
+
+    # user vars which textures need to be reallocated for when they change
+    tracked = tracked_user_vars(env, specialized)
+    if tracked:
+        globals.append(UserVarCache(tracked))
+
     # expanders for buffer uploaders
     uploaders:List[SyntaxExpander] = []
     if env.buffers:
         for buffer in env.buffers.values():
             struct = solved_structs[buffer.struct]
-            uploaders.append(UploadUniformBlock(env, buffer, struct))
+            uploaders.append(UploadUniformBlock(env, variants, buffer, struct))
 
     # user-defined variables
     user_vars:List[SyntaxExpander] = [ExternUserVar(v) for v in env.user_vars.values()]
@@ -243,8 +258,13 @@ def solve(env:Program) -> SyntaxExpander:
     if env.pipelines:
         reallocate.append(ResizeFrameBuffers(env))
 
+    # expanders for when user vars are changed at run time
+    update_user_vars:List[SyntaxExpander] = []
+    if tracked:
+        update_user_vars.append(UpdateUserVars(env, specialized))
+
     # expanders defining the available renderers
-    renderers, switch = solve_renderers(env)
+    renderers, switch = solve_renderers(env, variants)
 
     # required WebGL Extensions
     extensions = solve_extensions(env)
@@ -256,6 +276,7 @@ def solve(env:Program) -> SyntaxExpander:
     program.uploaders = uploaders
     program.initial_setup_hook = setup
     program.resize_hook = reallocate
+    program.user_vars_hook = update_user_vars
     program.renderers = renderers
     program.draw_frame_hook = switch
     program.extensions = extensions
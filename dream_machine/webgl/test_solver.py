@@ -0,0 +1,58 @@
+
+# Copyright 2020 Aeva Palecek
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+from ..syntax.parser import Parser
+from ..syntax.grammar import validate
+from .solver import solve
+
+
+def run(source:str):
+    p = Parser()
+    p.reset(source)
+    return validate(p)
+
+
+def test_upload_uniform_block_variants():
+    with tempfile.TemporaryDirectory() as tmp:
+        shaders = \
+        {
+            "splat.vs.glsl" : "#version 300 es\n「interfaces」\nvoid main() {}\n",
+            "plain.fs.glsl" : "#version 300 es\n「interfaces」\nvoid main() {}\n",
+            "lit.fs.glsl" : "#version 300 es\n「interfaces」\nvoid main() { if (Quality > 1) {} }\n",
+        }
+        for name, source in shaders.items():
+            with open(os.path.join(tmp, name), "w", encoding="utf-8") as shader:
+                shader.write(source)
+        path = lambda name: os.path.join(tmp, name)
+        src = f"""
+(specialize int Quality 1 0 1 2)
+(struct WindowParams (WindowSize vec4))
+(buffer WindowBlock WindowParams)
+(pipeline Lit (vs "{path("splat.vs.glsl")}") (fs "{path("lit.fs.glsl")}") (in WindowBlock))
+(pipeline Plain (vs "{path("splat.vs.glsl")}") (fs "{path("plain.fs.glsl")}"))
+(pipeline Copy (vs "{path("splat.vs.glsl")}") (fs "{path("plain.fs.glsl")}") (in WindowBlock))
+(renderer Draw (update WindowBlock) (draw Lit 3) (draw Plain 3) (draw Copy 3))
+"""
+        program = str(solve(run(src)))
+
+    # each of Lit's three variants and Copy's program, but not Plain's
+    uploader = program[program.index('"WindowBlock" : function'):]
+    uploader = uploader[:uploader.index("},")]
+    for index in (0, 1, 2, 4):
+        assert(uploader.count(f"gl.useProgram(ShaderPrograms[{index}]);") == 1)
+    assert("ShaderPrograms[3]" not in uploader)
@@ -17,10 +17,11 @@
 from typing import *
 from enum import IntEnum
 from ..expanders import SyntaxExpander
-from .js_expressions import solve_expression
+from .js_expressions import solve_expression, solve_temporaries
 from ..handy import CAST
 from ..syntax.grammar import Texture, Format, TextureDimension, PipelineInput, Program
 from ..syntax.constants import TextureType, TextureFormats
+from ..syntax.arithmetic import SharedExpressions
 from ..syntax.constants import SamplerFilterType
 
 
@@ -112,11 +113,11 @@ class Texture2DClearData(SyntaxExpander):
 	}
     """.strip()
 
-    def __init__(self, texture:Texture):
+    def __init__(self, texture:Texture, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         assert(texture.format.target == TextureType.TEXTURE_2D)
-        self.width = solve_expression(texture.width)
-        self.height = solve_expression(texture.height)
+        self.width = solve_expression(texture.width, shared)
+        self.height = solve_expression(texture.height, shared)
         self.channels = FORMAT_CHANNELS[texture.format.format]
         self.writes = [WritePixelChannel(i, c) for (i, c) in enumerate(texture.clear.channels)]
 
@@ -131,15 +132,15 @@ class Texture2DSetup(SyntaxExpander):
 }
 """.strip()
 
-    def __init__(self, texture:Texture):
+    def __init__(self, texture:Texture, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         assert(texture.format.target == TextureType.TEXTURE_2D)
         self.name = texture.name
         self.handle = texture.handle
         self.format = WebGLFormat(texture.format)
-        self.width = solve_expression(texture.width)
-        self.height = solve_expression(texture.height)
-        self.upload = Texture2DClearData(texture) if texture.clear else "let Upload = null;";
+        self.width = solve_expression(texture.width, shared)
+        self.height = solve_expression(texture.height, shared)
+        self.upload = Texture2DClearData(texture, shared) if texture.clear else "let Upload = null;";
 
 
 class Texture3DSetup(SyntaxExpander):
@@ -151,15 +152,15 @@ class Texture3DSetup(SyntaxExpander):
 }
 """.strip()
 
-    def __init__(self, texture:Texture):
+    def __init__(self, texture:Texture, shared:Optional[SharedExpressions] = None):
         SyntaxExpander.__init__(self)
         assert(texture.format.target == TextureType.TEXTURE_3D)
         self.name = texture.name
         self.handle = texture.handle
         self.format = WebGLFormat(texture.format)
-        self.width = solve_expression(texture.width)
-        self.height = solve_expression(texture.height)
-        self.depth = solve_expression(texture.depth)
+        self.width = solve_expression(texture.width, shared)
+        self.height = solve_expression(texture.height, shared)
+        self.depth = solve_expression(texture.depth, shared)
 
 
 class ResizeTexture2D(Texture2DSetup):
@@ -185,12 +186,19 @@ class ResizeTexture3D(Texture3DSetup):
 """.strip()
 
 
-def ResizeTexture(texture:Texture) -> SyntaxExpander:
+def ResizeTexture(texture:Texture, shared:Optional[SharedExpressions] = None) -> SyntaxExpander:
     if texture.format.target == TextureType.TEXTURE_2D:
-        return ResizeTexture2D(texture)
+        return ResizeTexture2D(texture, shared)
     else:
         assert(texture.format.target == TextureType.TEXTURE_3D)
-        return ResizeTexture3D(texture)
+        return ResizeTexture3D(texture, shared)
+
+
+def shared_dimensions(textures:Iterable[Texture]) -> SharedExpressions:
+    """
+    Finds the size expressions which are repeated among the given textures.
+    """
+    return SharedExpressions([d.value for t in textures for d in t.dimensions.values()])
 
 
 class BindTexture(SyntaxExpander):
@@ -218,16 +226,17 @@ class SetupTextures(SyntaxExpander):
 
     def __init__(self, env:Program):
         SyntaxExpander.__init__(self)
-        self.wrapped:List[SyntaxExpander] = []
+        shared = shared_dimensions(env.textures.values())
+        self.wrapped:List[SyntaxExpander] = solve_temporaries(shared)
         for texture in env.textures.values():
             if texture.src:
                 if texture.format.target != TextureType.TEXTURE_2D:
                     texture.format.error(f'Textures loaded must use a TEXTURE_2D format."')
                 self.wrapped.append(PngTextureSetup(texture))
             elif texture.format.target == TextureType.TEXTURE_2D:
-                self.wrapped.append(Texture2DSetup(texture))
+                self.wrapped.append(Texture2DSetup(texture, shared))
             elif texture.format.target == TextureType.TEXTURE_3D:
-                self.wrapped.append(Texture3DSetup(texture))
+                self.wrapped.append(Texture3DSetup(texture, shared))
 
 
 class SwitchTextureHandles(SyntaxExpander):
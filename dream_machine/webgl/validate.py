@@ -19,6 +19,8 @@ from ..syntax.abstract import *
 
 
 def validate(env:Program):
+    if env.live_user_vars:
+        env.live_user_vars.error("WebGL does not support live user vars.")
     for pipeline in env.pipelines.values():
         if "cs" in pipeline.shaders:
             pipeline.error("WebGL does not support compute shaders.")
@@ -24,6 +24,12 @@ extern void UserSetupCallback(SDL_Window* Window);
 extern void UserFrameCallback(unsigned int FrameIndex, double StartTime, double DeltaTime);
 
 
+namespace UserVars
+{
+
+}
+
+
 SDL_GLContext GLContext;
 GLuint Shaders[3] = { 0 };
 GLuint ShaderPrograms[2] = { 0 };
@@ -240,6 +246,12 @@ void WindowResized()
 }
 
 
+void UpdateUserVars()
+{
+
+}
+
+
 int main()
 {
 	SDL_SetMainReady();
@@ -332,6 +344,7 @@ int main()
 			const double StartTime = (double)StartTimeTicks / 1000.0;
 			const double DeltaTime = (double)DeltaTimeTicks / 1000.0;
 			UserFrameCallback(FrameIndex, StartTime, DeltaTime);
+			UpdateUserVars();
 			DrawFrame(FrameIndex, StartTime, DeltaTime);
 			SDL_GL_SwapWindow(Window);
 		}
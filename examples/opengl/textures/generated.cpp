@@ -24,6 +24,12 @@ extern void UserSetupCallback(SDL_Window* Window);
 extern void UserFrameCallback(unsigned int FrameIndex, double StartTime, double DeltaTime);
 
 
+namespace UserVars
+{
+	extern int MiscVar = 2048;
+}
+
+
 SDL_GLContext GLContext;
 GLuint Shaders[7] = { 0 };
 GLuint ShaderPrograms[4] = { 0 };
@@ -329,13 +335,6 @@ void DrawFrame(int FrameIndex, double CurrentTime, double DeltaTime)
 
 void WindowResized()
 {
-	{
-		// resize texture "BlueColorTarget"
-		glDeleteTextures(1, &TextureHandles[2]);
-		glCreateTextures(GL_TEXTURE_2D, 1, &TextureHandles[2]);
-		glTextureStorage2D(TextureHandles[2], 1, GL_RGBA8, (GLsizei)ScreenWidth, (GLsizei)ScreenHeight);
-		glObjectLabel(GL_TEXTURE, TextureHandles[2], -1, "BlueColorTarget");
-	}
 	{
 		// resize texture "RedColorTarget"
 		glDeleteTextures(1, &TextureHandles[1]);
@@ -343,6 +342,13 @@ void WindowResized()
 		glTextureStorage2D(TextureHandles[1], 1, GL_RGBA8, (GLsizei)ScreenWidth, (GLsizei)ScreenHeight);
 		glObjectLabel(GL_TEXTURE, TextureHandles[1], -1, "RedColorTarget");
 	}
+	{
+		// resize texture "BlueColorTarget"
+		glDeleteTextures(1, &TextureHandles[2]);
+		glCreateTextures(GL_TEXTURE_2D, 1, &TextureHandles[2]);
+		glTextureStorage2D(TextureHandles[2], 1, GL_RGBA8, (GLsizei)ScreenWidth, (GLsizei)ScreenHeight);
+		glObjectLabel(GL_TEXTURE, TextureHandles[2], -1, "BlueColorTarget");
+	}
 	{
 		// resize texture "SomeDepthTarget"
 		glDeleteTextures(1, &TextureHandles[3]);
@@ -365,6 +371,12 @@ void WindowResized()
 }
 
 
+void UpdateUserVars()
+{
+
+}
+
+
 int main()
 {
 	SDL_SetMainReady();
@@ -457,6 +469,7 @@ int main()
 			const double StartTime = (double)StartTimeTicks / 1000.0;
 			const double DeltaTime = (double)DeltaTimeTicks / 1000.0;
 			UserFrameCallback(FrameIndex, StartTime, DeltaTime);
+			UpdateUserVars();
 			DrawFrame(FrameIndex, StartTime, DeltaTime);
 			SDL_GL_SwapWindow(Window);
 		}
@@ -46,7 +46,7 @@ namespace Glsl
 
 namespace UserVars
 {
-
+	extern int MiscVar;
 }
 
 
@@ -15,6 +15,18 @@ let gl = null;
 	let ScreenWidth = null;
 	let ScreenHeight = null;
 
+	const Arithmetic = {
+		Clamp : function(Value, Low, High) {
+			return Math.min(Math.max(Value, Low), High);
+		},
+		DivUp : function(Numerator, Denominator) {
+			return Math.ceil(Numerator / Denominator);
+		},
+		Mod : function(Numerator, Denominator) {
+			return Numerator - Denominator * Math.floor(Numerator / Denominator);
+		},
+	};
+
 	const CompileShader = function(Source, ShaderType) {
 		const Handle = gl.createShader(ShaderType);
 		gl.shaderSource(Handle, Source);
@@ -193,6 +205,7 @@ let gl = null;
 			WindowResized();
 			WindowIsDirty = false;
 		}
+		UpdateUserVars();
 		gl.viewport(0, 0, ScreenWidth, ScreenHeight);
 		switch (CurrentRenderer) {
 		case 0:
@@ -219,6 +232,10 @@ let gl = null;
 		}
 	};
 
+	const UpdateUserVars = function() {
+
+	};
+
 	let FrameIndex = 0;
 	let LastTime = null;
 	let WindowIsDirty = true;